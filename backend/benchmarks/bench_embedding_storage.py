@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Recall vs. memory of the embedding storage modes in utils/embedding_storage.py.
+
+Ground truth is exact float64 cosine top-k over the sampled chunks. Each mode is
+simulated with an exact scan over what it stores: float32 vectors, int8 vectors,
+or a truncated index vector (optionally followed by int8 rescoring of the top
+--candidates). Truncation is only meaningful for text-embedding-3 models.
+
+Vectors are sampled from Neo4j, or generated with --synthetic. Questions are
+random held-out chunks, or lines from --questions, embedded with the configured model.
+
+    python benchmarks/bench_embedding_storage.py --sample 20000
+    python benchmarks/bench_embedding_storage.py --synthetic --sample 50000 --dims 1536
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from utils.embedding_storage import bytes_per_chunk, dequantize_int8, quantize_int8
+
+SAMPLE_QUERY = """
+    MATCH (c:Chunk)
+    WHERE c.textEmbedding IS NOT NULL
+    RETURN c.textEmbedding AS embedding, c.textEmbeddingInt8 AS embedding_q, c.textEmbeddingScale AS embedding_scale
+    LIMIT $sample
+"""
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(matrix, queries, k):
+    scores = queries @ matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def load_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        # Low-rank structure so neighbours are meaningful, like real embeddings
+        basis = rng.normal(size=(64, args.dims))
+        vectors = rng.normal(size=(args.sample, 64)) @ basis + 0.3 * rng.normal(size=(args.sample, args.dims))
+        return vectors.astype(np.float64)
+
+    from utils.knowledge_graph import safe_kg_query
+    rows = safe_kg_query(SAMPLE_QUERY, params={'sample': args.sample})
+    vectors = [dequantize_int8(r['embedding_q'], r['embedding_scale']) if r['embedding_q'] is not None
+               else r['embedding'] for r in rows]
+    dims = max(len(v) for v in vectors)
+    return np.array([v for v in vectors if len(v) == dims], dtype=np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=10000, help="Chunks to sample")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out chunks used as questions")
+    parser.add_argument("--questions", default=None, help="Text file with one question per line")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--dims", type=int, default=1536, help="Dimension of synthetic vectors")
+    parser.add_argument("--index-dims", type=int, nargs="*", default=[768, 512, 256])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=40, help="Top candidates rescored at full dimension")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    if args.questions:
+        from utils.knowledge_graph import get_embeddings
+        with open(args.questions) as fh:
+            questions = [line.strip() for line in fh if line.strip()]
+        queries, corpus = np.array(get_embeddings().embed_documents(questions)), vectors
+    else:
+        queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    n, dims = corpus.shape
+    queries = normalize(queries)
+    truth = top_k(normalize(corpus), queries, args.k)
+
+    quantized = np.stack([dequantize_int8(*quantize_int8(v)) for v in corpus])
+    results = [
+        ("float64", bytes_per_chunk("float64", dims), recall(truth, truth)),
+        ("float32", bytes_per_chunk("float32", dims),
+         recall(top_k(normalize(corpus.astype(np.float32)), queries.astype(np.float32), args.k), truth)),
+        ("int8 scan", dims + 8, recall(top_k(normalize(quantized), queries, args.k), truth)),
+    ]
+    for index_dims in sorted({d for d in args.index_dims if d < dims} | {dims}, reverse=True):
+        truncated = normalize(corpus[:, :index_dims].astype(np.float32))
+        first_pass = top_k(truncated, normalize(queries[:, :index_dims]), max(args.k, args.candidates))
+        results.append((f"index {index_dims}d", 4 * index_dims, recall(first_pass[:, :args.k], truth)))
+
+        # Rescore the candidates with the full-dimension int8 vectors
+        rescored = []
+        full = normalize(quantized)
+        for query, candidates in zip(queries, first_pass):
+            scores = full[candidates] @ query
+            rescored.append(candidates[np.argsort(-scores)[:args.k]])
+        results.append((f"index {index_dims}d + int8 rescore", bytes_per_chunk("int8", dims, index_dims),
+                        recall(rescored, truth)))
+
+    print(f"\n{n} chunks, {dims} dimensions, {len(queries)} questions, recall@{args.k} vs exact float64")
+    print(f"{'storage':<30} {'bytes/chunk':>12} {'total MB':>9} {'recall@k':>9}")
+    for name, size, value in results:
+        print(f"{name:<30} {size:>12} {size * n / 1e6:>9.1f} {value:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
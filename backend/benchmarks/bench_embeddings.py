@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Embedding throughput per provider and batch size, over generated chunk-sized texts.
+
+    python benchmarks/bench_embeddings.py --provider local --texts 5000
+    python benchmarks/bench_embeddings.py --provider openai --texts 500 --batch-sizes 16 64 256
+"""
+import argparse
+import os
+import random
+import sys
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embeddings import create_embeddings, PROVIDERS
+
+WORDS = ("graph knowledge chunk document section neo4j vector index query answer "
+         "retrieval embedding question file upload relationship entity pipeline").split()
+
+
+def generate_texts(count, chars=2000, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chars:
+            words.append(rng.choice(WORDS) + (str(rng.randint(0, 999)) if rng.random() < 0.1 else ""))
+        texts.append(" ".join(words))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=PROVIDERS, default="local")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--chars", type=int, default=2000, help="Characters per text (split_text chunk size)")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 32, 256])
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts, args.chars)
+    print(f"\n{args.texts} texts of ~{args.chars} chars, provider={args.provider}")
+    print(f"{'batch':>6} {'requests':>9} {'seconds':>9} {'texts/s':>9} {'chars/s':>11}")
+    for batch_size in args.batch_sizes:
+        embeddings = create_embeddings(args.provider, batch_size=batch_size)
+        embeddings.embed_documents(texts)
+        stats = embeddings.stats()
+        print(f"{batch_size:>6} {stats['requests']:>9} {stats['seconds']:>9.2f} "
+              f"{stats['texts_per_second']:>9.1f} {stats['chars_per_second']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Ingestion throughput benchmark: create_file_knowledge_graph over generated text,
+PDF and image corpora, against an in-memory graph (benchmarks/in_memory_graph.py)
+and, by default, the offline hashing embedder. Nothing leaves the machine.
+
+Reports per corpus: documents, pages, chunks, pages/s, chunks/s, MB/s, the time
+spent in each stage (extract, ocr, split, graph_write, embed; ocr is part of
+extract) and memory high-water marks.
+
+    python benchmarks/bench_ingestion.py
+    python benchmarks/bench_ingestion.py --pdf-docs 10 --pdf-pages 50 --save baseline.json
+    python benchmarks/bench_ingestion.py --baseline baseline.json --threshold 1.25   # exits 1 on regression
+
+OCR needs the tesseract binary; without it the ocr stage times the failure path.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = ("extract", "ocr", "split", "graph_write", "embed")
+WORDS = ("graph knowledge chunk document section neo4j vector index query answer retrieval "
+         "embedding question file upload relationship entity pipeline invoice warranty").split()
+
+# Regressions smaller than this are treated as timer noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def words(rng, chars):
+    out, size = [], 0
+    while size < chars:
+        word = rng.choice(WORDS) + (f"-{rng.randint(0, 9999)}" if rng.random() < 0.05 else "")
+        out.append(word)
+        size += len(word) + 1
+    return " ".join(out)
+
+
+def text_corpus(count, chars, seed=0):
+    rng = random.Random(seed)
+    return [(f"bench_{i}.txt", words(rng, chars).encode("utf-8")) for i in range(count)]
+
+
+def image_bytes(rng, width=800, height=300):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(6):
+        draw.text((20, 20 + line * 45), words(rng, 60), fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def image_corpus(count, seed=0):
+    rng = random.Random(seed)
+    return [(f"bench_{i}.png", image_bytes(rng)) for i in range(count)]
+
+
+def pdf_corpus(count, pages, chars_per_page, images_per_page, seed=0):
+    import fitz
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(40, 40, 560, 520), words(rng, chars_per_page), fontsize=9)
+            for j in range(images_per_page):
+                page.insert_image(fitz.Rect(40, 540 + j * 40, 400, 575 + j * 40), stream=image_bytes(rng))
+        corpus.append((f"bench_{i}.pdf", doc.tobytes()))
+        doc.close()
+    return corpus
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_corpus(name, corpus, graph, user_id):
+    from utils.knowledge_graph import create_file_knowledge_graph
+    from utils.instrumentation import record_stage_timings
+
+    chunks_before = len(graph.chunks)
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    failures = 0
+    start = time.perf_counter()
+    with record_stage_timings() as timings:
+        for filename, contents in corpus:
+            result = create_file_knowledge_graph(user_id, filename, contents)
+            failures += result.get("status") != "success"
+    seconds = time.perf_counter() - start
+
+    filenames = {filename for filename, _ in corpus}
+    pages = sum(props.get('pages_processed') or 0 for (user, filename), props in graph.files.items()
+                if user == user_id and filename in filenames)
+    chunks = len(graph.chunks) - chunks_before
+    mb = sum(len(contents) for _, contents in corpus) / 1e6
+    return {
+        "corpus": name,
+        "docs": len(corpus),
+        "failures": failures,
+        "pages": pages,
+        "chunks": chunks,
+        "mb": mb,
+        "seconds": seconds,
+        "pages_per_s": pages / seconds if seconds else 0.0,
+        "chunks_per_s": chunks / seconds if seconds else 0.0,
+        "mb_per_s": mb / seconds if seconds else 0.0,
+        "stages": {stage: timings.get(stage, {}).get("seconds", 0.0) for stage in STAGES},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_traced_mb": tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc.is_tracing() else None,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """Stages and totals that got slower than baseline * threshold, per corpus"""
+    if baseline.get("config") != results["config"]:
+        raise SystemExit("Baseline was recorded with a different corpus configuration; re-record it")
+    previous = {run["corpus"]: run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get(run["corpus"])
+        if before is None:
+            continue
+        pairs = [("total", before["seconds"], run["seconds"])]
+        pairs += [(stage, before["stages"].get(stage, 0.0), run["stages"][stage]) for stage in STAGES]
+        for stage, old, new in pairs:
+            if new - old > MIN_REGRESSION_SECONDS and new > old * threshold:
+                regressions.append(f"{run['corpus']}/{stage}: {old:.3f}s -> {new:.3f}s ({new / max(old, 1e-9):.2f}x)")
+    return regressions
+
+
+def print_results(results):
+    print(f"\nprovider={results['config']['provider']}  ocr={'tesseract' if results['ocr_available'] else 'unavailable'}")
+    print(f"{'corpus':<7} {'docs':>5} {'pages':>6} {'chunks':>7} {'sec':>7} {'pages/s':>8} {'chunks/s':>9} "
+          f"{'MB/s':>6} " + " ".join(f"{stage:>11}" for stage in STAGES) + f" {'RSS MB':>7} {'traced MB':>9}")
+    for run in results["runs"]:
+        traced = f"{run['peak_traced_mb']:>9.1f}" if run["peak_traced_mb"] is not None else f"{'-':>9}"
+        print(f"{run['corpus']:<7} {run['docs']:>5} {run['pages']:>6} {run['chunks']:>7} {run['seconds']:>7.2f} "
+              f"{run['pages_per_s']:>8.1f} {run['chunks_per_s']:>9.1f} {run['mb_per_s']:>6.2f} "
+              + " ".join(f"{run['stages'][stage]:>11.3f}" for stage in STAGES)
+              + f" {run['peak_rss_mb']:>7.0f} {traced}")
+        if run["failures"]:
+            print(f"        {run['failures']} document(s) failed to ingest")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=("local", "openai"), default="local", help="Embedding provider")
+    parser.add_argument("--text-docs", type=int, default=20)
+    parser.add_argument("--text-chars", type=int, default=50000, help="Characters per text document")
+    parser.add_argument("--pdf-docs", type=int, default=5)
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--pdf-chars", type=int, default=2500, help="Characters of text per PDF page")
+    parser.add_argument("--pdf-images", type=int, default=1, help="Embedded images per PDF page")
+    parser.add_argument("--image-docs", type=int, default=5)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python heap high-water marks (slower)")
+    parser.add_argument("--save", default=None, help="Write results as JSON (a baseline for --baseline)")
+    parser.add_argument("--baseline", default=None, help="Fail if a stage is slower than this run by --threshold")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    # Configuration is read at import time
+    os.environ["EMBEDDING_PROVIDER"] = args.provider
+
+    import utils.knowledge_graph as knowledge_graph
+    from benchmarks.in_memory_graph import InMemoryGraph
+
+    graph = InMemoryGraph()
+    knowledge_graph.kg = graph
+
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        ocr_available = True
+    except Exception:
+        ocr_available = False
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "threshold", "tracemalloc")}
+    corpora = [
+        ("text", text_corpus(args.text_docs, args.text_chars)),
+        ("pdf", pdf_corpus(args.pdf_docs, args.pdf_pages, args.pdf_chars, args.pdf_images)),
+        ("image", image_corpus(args.image_docs)),
+    ]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    runs = [run_corpus(name, corpus, graph, user_id="bench-user") for name, corpus in corpora if corpus]
+    results = {"config": config, "ocr_available": ocr_available, "runs": runs}
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions (> {args.threshold}x baseline):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo stage slower than {args.threshold}x baseline")
+
+
+if __name__ == "__main__":
+    main()
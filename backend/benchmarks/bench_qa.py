@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+QA latency benchmark: drives ask_question (plus the traversal the /qa endpoint
+adds) over a question set and reports p50/p95/p99 per stage for each retrieval
+strategy:
+
+    question_embedding  embedding the question
+    retrieval           retrieve_chunks end to end
+    retrieval_cypher    Neo4j time of the retrieval statements (part of retrieval)
+    assembly            context packing and source list
+    llm                 Claude completion
+    traversal           graph traversal path
+    total
+
+Claude is replaced by a record/replay client (benchmarks/llm_replay.py): record
+once against the API, then replay offline and deterministically. --offline also
+swaps Neo4j for the in-memory graph and embeddings for the local hashing embedder,
+ingesting a generated corpus (or --corpus) first.
+
+    python benchmarks/bench_qa.py --offline                                  # everything local
+    python benchmarks/bench_qa.py --questions q.txt --llm record --cassette qa.json
+    python benchmarks/bench_qa.py --questions q.txt --cassette qa.json --strategies vector hybrid hybrid+window
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = ("question_embedding", "retrieval", "retrieval_cypher", "assembly", "llm", "traversal", "total")
+
+# Overrides of utils.retrieval settings per strategy
+STRATEGIES = {
+    "vector": {"QA_RETRIEVAL_MODE": "vector", "QA_DIVERSITY": "none", "QA_NEXT_WINDOW": 0},
+    "vector+mmr": {"QA_RETRIEVAL_MODE": "vector", "QA_DIVERSITY": "mmr", "QA_NEXT_WINDOW": 0},
+    "hybrid": {"QA_RETRIEVAL_MODE": "hybrid", "QA_DIVERSITY": "none", "QA_NEXT_WINDOW": 0},
+    "hybrid+mmr": {"QA_RETRIEVAL_MODE": "hybrid", "QA_DIVERSITY": "mmr", "QA_NEXT_WINDOW": 0},
+    "hybrid+window": {"QA_RETRIEVAL_MODE": "hybrid", "QA_DIVERSITY": "mmr", "QA_NEXT_WINDOW": 1},
+}
+
+# Statements whose Neo4j time counts as retrieval Cypher
+RETRIEVAL_STATEMENTS = ("qa.vector_retrieval", "qa.exact_retrieval", "qa.fulltext_retrieval",
+                        "qa.hybrid_retrieval", "qa.neighbor_window")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_corpus(path):
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if os.path.isfile(full):
+            with open(full, "rb") as fh:
+                corpus.append((name, fh.read()))
+    return corpus
+
+
+def generate_questions(graph, user_id, count, seed=0):
+    """Questions built from phrases of ingested chunks, so every one has an answer"""
+    rng = random.Random(seed)
+    texts = sorted(chunk['text'] for chunk in graph.chunks.values() if chunk['user_id'] == user_id)
+    questions = []
+    for _ in range(count):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 6))
+        questions.append(f"What does the document say about {' '.join(words[start:start + 6])}?")
+    return questions
+
+
+async def run_question(user_id, question, filenames):
+    from utils.knowledge_graph import ask_question, get_graph_traversal_path
+    from utils.instrumentation import record_stage_timings
+    from utils.query_registry import query_stats, reset_query_stats
+
+    reset_query_stats()
+    with record_stage_timings() as timings:
+        start = time.perf_counter()
+        result = await ask_question(user_id=user_id, question=question, filenames=filenames)
+        if result.get("status") == "success" and result.get("sources"):
+            await asyncio.to_thread(get_graph_traversal_path, result["sources"], user_id)
+        total = time.perf_counter() - start
+
+    stats = query_stats()
+    sample = {stage: timings.get(stage, {}).get("seconds", 0.0) * 1000 for stage in STAGES}
+    sample["retrieval_cypher"] = sum(stats.get(name, {}).get("total_ms", 0.0) for name in RETRIEVAL_STATEMENTS)
+    sample["total"] = total * 1000
+    return result, sample
+
+
+async def run_strategy(name, questions, args):
+    samples, errors, tokens = [], 0, []
+    with patch.multiple("utils.retrieval", **STRATEGIES[name]):
+        for _ in range(args.repeat):
+            for question in questions:
+                result, sample = await run_question(args.user_id, question, args.filenames)
+                if result.get("status") != "success":
+                    errors += 1
+                    continue
+                samples.append(sample)
+                if result.get("context"):
+                    tokens.append(result["context"]["tokens"])
+    return samples, errors, tokens
+
+
+def print_report(name, samples, errors, tokens):
+    print(f"\n{name}: {len(samples)} answered, {errors} errors"
+          + (f", {statistics.mean(tokens):.0f} context tokens on average" if tokens else ""))
+    if not samples:
+        return
+    print(f"  {'stage':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in STAGES:
+        values = [sample[stage] for sample in samples]
+        print(f"  {stage:<20} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} {percentile(values, 99):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=None, help="Text file with one question per line")
+    parser.add_argument("--user-id", default="local-test-user")
+    parser.add_argument("--filenames", nargs="*", default=None)
+    parser.add_argument("--strategies", nargs="*", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the question set per strategy")
+    parser.add_argument("--llm", choices=("replay", "record", "live"), default="replay")
+    parser.add_argument("--cassette", default="qa_cassette.json", help="Recorded Claude responses")
+    parser.add_argument("--llm-latency", choices=("recorded", "zero"), default="recorded",
+                        help="Replay with the recorded completion latency or none")
+    parser.add_argument("--offline", action="store_true", help="In-memory graph and local embedder")
+    parser.add_argument("--corpus", default=None, help="Directory of documents to ingest with --offline")
+    parser.add_argument("--docs", type=int, default=10, help="Generated documents with --offline and no --corpus")
+    parser.add_argument("--num-questions", type=int, default=50, help="Generated questions when --questions is absent")
+    args = parser.parse_args()
+
+    if args.offline:
+        # Configuration is read at import time
+        os.environ["EMBEDDING_PROVIDER"] = "local"
+
+    import utils.knowledge_graph as knowledge_graph
+
+    if args.offline:
+        from benchmarks.in_memory_graph import InMemoryGraph
+        from benchmarks.bench_ingestion import text_corpus
+        graph = InMemoryGraph()
+        knowledge_graph.kg = graph
+        corpus = load_corpus(args.corpus) if args.corpus else text_corpus(args.docs, 20000)
+        for filename, contents in corpus:
+            knowledge_graph.create_file_knowledge_graph(args.user_id, filename, contents)
+        print(f"Ingested {len(corpus)} documents, {len(graph.chunks)} chunks into the in-memory graph")
+
+    if args.questions:
+        with open(args.questions) as fh:
+            questions = [line.strip() for line in fh if line.strip()]
+    elif args.offline:
+        questions = generate_questions(graph, args.user_id, args.num_questions)
+    else:
+        parser.error("--questions is required unless --offline generates them")
+
+    client = None
+    if args.llm != "live":
+        from benchmarks.llm_replay import ReplayLLMClient
+        from utils.llm_clients import get_llm_client
+        upstream = get_llm_client() if args.llm == "record" else None
+        client = ReplayLLMClient(args.cassette, mode=args.llm, upstream=upstream, latency=args.llm_latency)
+
+    print(f"{len(questions)} questions x {args.repeat}, llm={args.llm}, answer cache off")
+    llm_patch = patch("utils.knowledge_graph.get_llm_client", return_value=client) if client else nullcontext()
+    with patch("utils.knowledge_graph.QA_CACHE_ENABLED", False), llm_patch:
+        for name in args.strategies:
+            samples, errors, tokens = asyncio.run(run_strategy(name, questions, args))
+            print_report(name, samples, errors, tokens)
+
+    if client is not None:
+        if args.llm == "record":
+            client.save()
+        stats = client.stats()
+        print(f"\nLLM {stats['mode']}: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['recorded']} recorded, {stats['entries']} in {args.cassette}")
+
+
+if __name__ == "__main__":
+    main()
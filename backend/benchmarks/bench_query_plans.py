@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Query plan cache benchmark: retrieval Cypher with user_id and filenames spliced into
+the query text (the previous behaviour) against the registered parameterized template.
+
+Spliced queries produce a new statement per tenant/file selection, so Neo4j has to
+plan every one of them; the template is planned once and the cached plan is reused.
+Planning cost shows up in the driver's result_available_after, so that is reported
+alongside wall time. Requires a running Neo4j instance; tenants need not exist.
+
+    python benchmarks/bench_query_plans.py --tenants 500 --clear-cache
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.knowledge_graph import get_neo4j_connection
+from utils.retrieval import PREFIX_RETRIEVAL_QUERY
+
+
+def spliced_query(user_id, filenames):
+    """The same statement with the values pasted into the text, as the old QA setup did"""
+    quoted = "[" + ", ".join(f"'{name}'" for name in filenames) + "]"
+    query = PREFIX_RETRIEVAL_QUERY.replace("$user_id", f"'{user_id}'").replace("$filenames", quoted)
+    return query, {}
+
+
+def parameterized_query(user_id, filenames):
+    return PREFIX_RETRIEVAL_QUERY, {'user_id': user_id, 'filenames': filenames}
+
+
+def run(driver, build, workload):
+    """Execute the workload, returning (wall ms, result_available_after ms) per statement"""
+    wall, available_after = [], []
+    with driver.session() as session:
+        for user_id, filenames in workload:
+            query, params = build(user_id, filenames)
+            start = time.perf_counter()
+            summary = session.run(query, params).consume()
+            wall.append((time.perf_counter() - start) * 1000)
+            available_after.append(summary.result_available_after or 0)
+    return wall, available_after
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=200, help="Distinct user ids")
+    parser.add_argument("--selections", type=int, default=3, help="File selections per tenant")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Run CALL db.clearQueryCaches() before each strategy")
+    args = parser.parse_args()
+
+    workload = [
+        (f"bench-tenant-{t}", [f"doc_{t}_{s}.pdf", f"notes_{s}.txt"])
+        for t in range(args.tenants)
+        for s in range(args.selections)
+    ]
+    driver = get_neo4j_connection()._driver
+
+    strategies = {"spliced literals": spliced_query, "parameterized": parameterized_query}
+    print(f"\n{len(workload)} statements across {args.tenants} tenants")
+    print(f"{'strategy':<18} {'wall p50':>9} {'wall p95':>9} {'plan+exec p50':>14} {'total s':>8}")
+    for name, build in strategies.items():
+        if args.clear_cache:
+            with driver.session() as session:
+                session.run("CALL db.clearQueryCaches()").consume()
+        wall, available_after = run(driver, build, workload)
+        print(f"{name:<18} {statistics.median(wall):>9.2f} {percentile(wall, 95):>9.2f} "
+              f"{statistics.median(available_after):>14.2f} {sum(wall) / 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
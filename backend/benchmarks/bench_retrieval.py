@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark: latency and recall@k of the previous prefix-based retrieval
+against vector top-k retrieval (plain and diversified) and hybrid full-text +
+vector retrieval with reciprocal rank fusion, and a small seed top-k expanded
+along NEXT edges. The tokens column is the packed prompt context per question.
+
+Ground truth for recall@k is the exact cosine top-k over the user's chunks, unless
+--qrels gives labelled relevant chunks (needed to judge exact-term questions such
+as part numbers and error codes, which cosine ground truth cannot reward).
+Requires a populated Neo4j instance and the embedding provider the chunks were
+embedded with (EMBEDDING_PROVIDER).
+
+    python benchmarks/bench_retrieval.py --user-id local-test-user --questions questions.txt
+    python benchmarks/bench_retrieval.py --questions codes.txt --qrels codes.tsv
+
+The qrels file has one line per question: question<TAB>chunk_id,chunk_id,...
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.knowledge_graph import safe_kg_query, get_embeddings
+from utils.retrieval import EXACT_RETRIEVAL_QUERY, retrieve_chunks, retrieve_prefix_chunks
+from utils.context_packer import pack_context
+from utils.embedding_versions import active_version
+from utils.embedding_storage import index_vector
+
+
+def exact_top_k(user_id, embedding, filenames, k):
+    # Same vector property and index space as retrieve_chunks uses for the user
+    version = active_version(user_id)
+    rows = safe_kg_query(EXACT_RETRIEVAL_QUERY, params={
+        **version.params(),
+        'user_id': user_id,
+        'filenames': filenames,
+        'embedding': index_vector(embedding, version.index_dims()),
+        'candidate_k': k,
+    })
+    return {row['chunk_id'] for row in rows}
+
+
+def load_qrels(path):
+    qrels = {}
+    with open(path) as fh:
+        for line in fh:
+            if "\t" not in line:
+                continue
+            question, chunk_ids = line.rstrip("\n").split("\t", 1)
+            qrels[question.strip()] = {c.strip() for c in chunk_ids.split(",") if c.strip()}
+    return qrels
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", default="local-test-user")
+    parser.add_argument("--questions", required=True, help="Text file with one question per line")
+    parser.add_argument("--filenames", nargs="*", default=None)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per question and strategy")
+    parser.add_argument("--qrels", default=None, help="TSV of labelled relevant chunk ids per question")
+    parser.add_argument("--window", type=int, default=1, help="NEXT neighbours per side for the window strategy")
+    parser.add_argument("--seed-k", type=int, default=4, help="Seed chunks for the window strategy")
+    args = parser.parse_args()
+
+    qrels = load_qrels(args.qrels) if args.qrels else None
+    if qrels:
+        questions = list(qrels)
+    else:
+        with open(args.questions) as fh:
+            questions = [line.strip() for line in fh if line.strip()]
+
+    def vector(strategy):
+        return lambda question, emb: retrieve_chunks(
+            args.user_id, emb, args.filenames, k=args.k, strategy=strategy, mode="vector")
+
+    def hybrid(strategy):
+        return lambda question, emb: retrieve_chunks(
+            args.user_id, emb, args.filenames, k=args.k, strategy=strategy, question=question, mode="hybrid")
+
+    strategies = {
+        "prefix (previous)": lambda question, emb: retrieve_prefix_chunks(args.user_id, args.filenames, args.k),
+        "vector top-k": vector("none"),
+        "vector + quota": vector("quota"),
+        "vector + mmr": vector("mmr"),
+        "hybrid rrf": hybrid("none"),
+        "hybrid + mmr": hybrid("mmr"),
+        "hybrid + NEXT window": lambda question, emb: retrieve_chunks(
+            args.user_id, emb, args.filenames, strategy="mmr", question=question, mode="hybrid",
+            window=args.window, seed_k=args.seed_k),
+    }
+    latencies = {name: [] for name in strategies}
+    recalls = {name: [] for name in strategies}
+    tokens = {name: [] for name in strategies}
+
+    question_embeddings = get_embeddings().embed_documents(questions)
+
+    for question, embedding in zip(questions, question_embeddings):
+        truth = qrels[question] if qrels else exact_top_k(args.user_id, embedding, args.filenames, args.k)
+        if not truth:
+            continue
+        for name, run in strategies.items():
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                chunks = run(question, embedding)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+            hits = {chunk['chunk_id'] for chunk in chunks}
+            recalls[name].append(len(hits & truth) / len(truth))
+            tokens[name].append(pack_context(chunks, budget=10 ** 9)['stats']['tokens'])
+
+    print(f"\n{len(questions)} questions, k={args.k}, user={args.user_id}, "
+          f"ground truth: {'qrels' if qrels else 'exact cosine top-k'}")
+    print(f"{'strategy':<20} {'p50 ms':>9} {'p95 ms':>9} {'recall@k':>9} {'tokens':>7}")
+    for name in strategies:
+        if not latencies[name]:
+            continue
+        print(f"{name:<20} {statistics.median(latencies[name]):>9.1f} "
+              f"{percentile(latencies[name], 95):>9.1f} {statistics.mean(recalls[name]):>9.3f} "
+              f"{statistics.mean(tokens[name]):>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: imports `main` in fresh interpreters with `python -X importtime`
+and reports the median wall time of the import, the slowest modules (cumulative
+time, median over runs) and heavy optional dependencies that were loaded eagerly.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --top 30
+    python benchmarks/bench_startup.py --budget 1.5   # exits 1 if the median import is slower
+
+Each run is a new process, so the numbers include bytecode loading but not the
+interpreter start itself.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must stay out of `import main`: they load on first use or with their subsystem
+LAZY_MODULES = ("langchain_neo4j", "langchain_openai", "langchain_community", "langchain_text_splitters",
+                "fitz", "pytesseract", "PIL", "discord", "google.oauth2", "tqdm", "numpy", "tiktoken")
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "print('IMPORT_SECONDS', time.perf_counter() - start)\n"
+    "print('LOADED', ' '.join(m for m in {lazy!r} if m in sys.modules))\n"
+)
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds per module from `-X importtime` output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        cumulative[name] = max(cumulative.get(name, 0), int(cumulative_us))
+    return cumulative
+
+
+def run_once(env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(lazy=LAZY_MODULES)],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import main failed:\n{result.stderr[-2000:]}")
+    seconds, loaded = None, []
+    for line in result.stdout.splitlines():
+        if line.startswith("IMPORT_SECONDS"):
+            seconds = float(line.split()[1])
+        elif line.startswith("LOADED"):
+            loaded = line.split()[1:]
+    return seconds, parse_importtime(result.stderr), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list")
+    parser.add_argument("--budget", type=float, default=None, help="Fail if the median import takes longer (seconds)")
+    parser.add_argument("--disable", nargs="*", choices=("discord", "ocr", "crud", "metrics"), default=[],
+                        help="Subsystems to switch off for the measurement")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for subsystem in args.disable:
+        env[f"{subsystem.upper()}_ENABLED"] = "false"
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    seconds = [run[0] for run in runs]
+    modules = {}
+    for _, cumulative, _ in runs:
+        for name, micros in cumulative.items():
+            modules.setdefault(name, []).append(micros)
+    slowest = sorted(((statistics.median(values) / 1e6, name) for name, values in modules.items()), reverse=True)
+    loaded = sorted({name for run in runs for name in run[2]})
+
+    median = statistics.median(seconds)
+    print(f"\nimport main: median {median:.3f}s  min {min(seconds):.3f}s  max {max(seconds):.3f}s  ({args.runs} runs)")
+    print(f"\n{'cumulative s':>12}  module")
+    for module_seconds, name in slowest[:args.top]:
+        print(f"{module_seconds:>12.3f}  {name}")
+    if loaded:
+        print(f"\nLoaded eagerly (expected lazy): {', '.join(loaded)}")
+
+    if args.budget is not None and median > args.budget:
+        print(f"\nStartup budget exceeded: {median:.3f}s > {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+In-memory stand-in for the Neo4jGraph connection, covering the ingestion statements,
+the QA retrieval and traversal statements, embedding jobs, embedding versions and
+the crawl dedupe lookup.
+
+Statements are recognised by their registered name (utils/query_registry.py) and
+applied to plain dicts, so ingestion and QA can be exercised and timed without a
+database. Vector search is an exact cosine scan and full-text search a plain term
+count, so relative timings say nothing about Neo4j's indexes.
+Schema statements and unregistered Cypher are accepted and ignored (vector indexes
+are always ONLINE); any other registered statement raises so the stand-in never
+silently drops writes.
+"""
+import re
+import threading
+from collections import defaultdict
+import numpy as np
+from utils.query_registry import statement_name, UNREGISTERED
+
+
+class InMemoryGraph:
+    def __init__(self):
+        self.users = {}            # user id -> properties
+        self.files = {}            # (user_id, filename) -> properties
+        self.chunks = {}           # chunk id -> properties
+        self.file_chunks = defaultdict(list)  # (user_id, filename) -> chunk ids
+        self.next_edges = set()    # (from chunk id, to chunk id)
+        self.jobs = {}             # embedding job id -> properties
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+        self._handlers = {
+            "ingest.merge_user": self._merge_user,
+            "ingest.upsert_file": self._upsert_file,
+            "ingest.link_uploaded": lambda params: [],
+            "ingest.clear_file_chunks": self._clear_file_chunks,
+            "ingest.store_chunks": self._store_chunks,
+            "ingest.link_file_chunks": self._link_file_chunks,
+            "ingest.link_all_chunks": self._link_all_chunks,
+            "embed.file_chunks_missing_embeddings": self._file_chunks_missing_embeddings,
+            "embed.all_chunks_missing_embeddings": self._all_chunks_missing_embeddings,
+            "embed.set_chunk_embedding": self._set_chunk_embedding,
+            "embed.set_chunk_vector": self._set_chunk_vector,
+            "qa.vector_retrieval": self._vector_retrieval,
+            "qa.exact_retrieval": self._vector_retrieval,
+            "qa.fulltext_retrieval": self._fulltext_retrieval,
+            "qa.hybrid_retrieval": self._hybrid_retrieval,
+            "qa.neighbor_window": self._neighbor_window,
+            "qa.traversal": self._traversal,
+            "embed_job.chunk_page": self._job_chunk_page,
+            "embed_job.count_chunks": lambda params: [{'total': len(self._job_chunks(params))}],
+            "embed_job.write_embeddings": self._write_embeddings,
+            "embed_job.write_vectors": self._write_vectors,
+            "embed_job.save": self._save_job,
+            "embed_job.get": lambda params: [{'job': dict(self.jobs[params['id']])}] if params['id'] in self.jobs else [],
+            "embed_job.list": self._list_jobs,
+            "embed_version.user_version": self._user_version,
+            "embed_version.tenants": self._tenants_by_version,
+            "embed_version.coverage": self._coverage,
+            "embed_version.index_state": lambda params: [{'state': "ONLINE", 'population': 100.0}],
+            "embed_version.switch": self._switch_version,
+            "embed_version.gc_page": self._gc_page,
+            "crawl.file_by_hash": self._file_by_hash,
+            "url.file_lookup": self._url_file_lookup,
+        }
+
+    def query(self, query, params=None):
+        name = statement_name(query)
+        with self._lock:
+            self.calls[name] += 1
+            if name == UNREGISTERED or name.startswith("schema."):
+                return []
+            handler = self._handlers.get(name)
+            if handler is None:
+                raise NotImplementedError(f"InMemoryGraph does not support statement '{name}'")
+            return handler(params or {})
+
+    def nbytes(self):
+        """Rough size of what Neo4j would store: text plus embedding payloads"""
+        total = 0
+        for chunk in self.chunks.values():
+            total += len(chunk.get('text') or '')
+            for value in chunk.values():
+                # Embeddings of every version: float lists and int8 bytes
+                if isinstance(value, list):
+                    total += 4 * len(value)
+                elif isinstance(value, bytes):
+                    total += len(value)
+        return total
+
+    def _merge_user(self, params):
+        if params['user_id'] not in self.users:
+            self.users[params['user_id']] = {'embedding_version': params.get('embedding_version')}
+        return []
+
+    def _upsert_file(self, params):
+        key = (params['user_id'], params['filename'])
+        self.files[key] = {'total_chunks': params['total_chunks'], **(params.get('metadata') or {})}
+        return []
+
+    def _file_by_hash(self, params):
+        return [{'filename': filename} for (user_id, filename), props in self.files.items()
+                if user_id == params['user_id'] and props.get('content_hash') == params['content_hash']][:1]
+
+    def _url_file_lookup(self, params):
+        return [{'filename': filename, 'total_chunks': props.get('total_chunks')}
+                for (user_id, filename), props in self.files.items()
+                if user_id == params['user_id'] and props.get('original_url') == params['original_url']]
+
+    def _clear_file_chunks(self, params):
+        key = (params['user_id'], params['filename'])
+        for chunk_id in self.file_chunks.pop(key, []):
+            self.chunks.pop(chunk_id, None)
+        self.next_edges = {edge for edge in self.next_edges if edge[0] in self.chunks}
+        return []
+
+    def _store_chunks(self, params):
+        key = (params['user_id'], params['filename'])
+        for chunk in params['params']:
+            self.chunks[chunk['id']] = dict(chunk)
+            self.file_chunks[key].append(chunk['id'])
+        return []
+
+    def _link(self, keys):
+        for key in keys:
+            by_index = {self.chunks[chunk_id]['chunk_index']: chunk_id for chunk_id in self.file_chunks[key]}
+            for index, chunk_id in by_index.items():
+                if index + 1 in by_index:
+                    self.next_edges.add((chunk_id, by_index[index + 1]))
+        return []
+
+    def _link_file_chunks(self, params):
+        return self._link([key for key in self.file_chunks if key == (params['user_id'], params['filename'])])
+
+    def _link_all_chunks(self, params):
+        return self._link(list(self.file_chunks))
+
+    def _missing(self, keys, params):
+        return [{'id': chunk_id, 'text': self.chunks[chunk_id]['text'], 'filename': key[1]}
+                for key in keys for chunk_id in self.file_chunks[key]
+                if self.chunks[chunk_id].get(params['embedding_property']) is None]
+
+    def _file_chunks_missing_embeddings(self, params):
+        return self._missing([key for key in self.file_chunks if key[1] == params['filename']
+                              and params.get('user_id') in (None, key[0])], params)
+
+    def _all_chunks_missing_embeddings(self, params):
+        return self._missing(list(self.file_chunks), params)
+
+    @staticmethod
+    def _set_props(node, props):
+        # SET += with a null removes the property
+        for key, value in props.items():
+            if value is None:
+                node.pop(key, None)
+            else:
+                node[key] = value
+
+    def _set_chunk_embedding(self, params):
+        chunk = self.chunks.get(params['id'])
+        if chunk is not None:
+            self._set_props(chunk, params['props'])
+        return []
+
+    def _set_chunk_vector(self, params):
+        chunk = self.chunks.get(params['id'])
+        if chunk is not None:
+            chunk[params['embedding_property']] = params['embedding']
+            self._set_props(chunk, params['props'])
+        return []
+
+    def _job_chunks(self, params):
+        return [chunk_id for chunk_id in sorted(self.chunks)
+                if chunk_id > params['after']
+                and params['user_id'] in (None, self.chunks[chunk_id].get('user_id'))
+                and (params['force'] or self.chunks[chunk_id].get(params['embedding_property']) is None)]
+
+    def _job_chunk_page(self, params):
+        return [{'id': chunk_id, 'text': self.chunks[chunk_id]['text'], 'user_id': self.chunks[chunk_id].get('user_id')}
+                for chunk_id in self._job_chunks(params)[:params['limit']]]
+
+    def _write_embeddings(self, params):
+        for row in params['rows']:
+            self._set_chunk_embedding(row)
+        return []
+
+    def _write_vectors(self, params):
+        for row in params['rows']:
+            self._set_chunk_vector({**row, 'embedding_property': params['embedding_property']})
+        return []
+
+    def _save_job(self, params):
+        self._set_props(self.jobs.setdefault(params['job']['id'], {}), params['job'])
+        return []
+
+    def _list_jobs(self, params):
+        jobs = [job for job in self.jobs.values() if params['owner_id'] in (None, job.get('owner_id'))]
+        jobs.sort(key=lambda job: job['created_at'], reverse=True)
+        return [{'job': dict(job)} for job in jobs[:params['limit']]]
+
+    def _user_chunks(self, params):
+        filenames = params.get('filenames')
+        for (user_id, filename), chunk_ids in self.file_chunks.items():
+            if user_id != params['user_id'] or (filenames and filename not in filenames):
+                continue
+            for chunk_id in chunk_ids:
+                yield filename, self.chunks[chunk_id]
+
+    def _row(self, filename, chunk, score, params):
+        props = self.files.get((chunk['user_id'], filename), {})
+        return {
+            'text': chunk['text'], 'score': score, 'chunk_id': chunk['id'], 'filename': filename,
+            'section': chunk['section'], 'chunk_index': chunk['chunk_index'], 'user_id': chunk['user_id'],
+            'original_url': props.get('original_url'),
+            'embedding': chunk.get(params.get('embedding_property')),
+            'embedding_q': chunk.get(params.get('int8_property')),
+            'embedding_scale': chunk.get(params.get('scale_property')),
+        }
+
+    def _vector_ranked(self, params):
+        prop = params['embedding_property']
+        embedded = [(filename, chunk) for filename, chunk in self._user_chunks(params)
+                    if chunk.get(prop) is not None]
+        if not embedded:
+            return []
+        query = np.asarray(params['embedding'], dtype=np.float32)
+        matrix = np.asarray([chunk[prop] for _, chunk in embedded], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        # Same (1 + cos) / 2 scale as Neo4j's cosine index
+        scores = (1.0 + matrix @ query / np.where(norms == 0, 1.0, norms)) / 2.0
+        order = np.argsort(-scores, kind="stable")[:params['candidate_k']]
+        return [self._row(*embedded[i], float(scores[i]), params) for i in order]
+
+    def _vector_retrieval(self, params):
+        return self._vector_ranked(params)
+
+    def _fulltext_ranked(self, params):
+        terms = [term.strip('"') for term in (params.get('text_query') or '').split(" OR ") if term.strip('"')]
+        scored = []
+        for filename, chunk in self._user_chunks(params):
+            text = (chunk['text'] or '').lower()
+            score = sum(len(re.findall(rf"(?<!\w){re.escape(term)}(?!\w)", text)) for term in terms)
+            if score:
+                scored.append(self._row(filename, chunk, float(score), params))
+        scored.sort(key=lambda row: -row['score'])
+        return scored[:params['candidate_k']]
+
+    def _fulltext_retrieval(self, params):
+        return self._fulltext_ranked(params)
+
+    def _hybrid_retrieval(self, params):
+        from utils.retrieval import reciprocal_rank_fusion
+        vector = self._vector_ranked(params)
+        fused = reciprocal_rank_fusion([vector, self._fulltext_ranked(params)], params['rrf_k'])
+        return [{**row, 'vector_count': len(vector)} for row in fused[:params['candidate_k']]]
+
+    def _neighbor_window(self, params):
+        by_position = {(chunk['filename'], chunk['chunk_index']): chunk for chunk in self.chunks.values()
+                       if chunk['user_id'] == params['user_id']}
+        rows = []
+        for seed_id in params['seed_ids']:
+            seed = self.chunks.get(seed_id)
+            if seed is None or seed['user_id'] != params['user_id']:
+                continue
+            for offset in range(-params['window'], params['window'] + 1):
+                chunk = by_position.get((seed['filename'], seed['chunk_index'] + offset))
+                if offset == 0 or chunk is None:
+                    continue
+                row = self._row(seed['filename'], chunk, None, params)
+                rows.append({key: row[key] for key in ('text', 'chunk_id', 'filename', 'section', 'chunk_index',
+                                                       'user_id', 'original_url')}
+                            | {'seed_id': seed_id, 'offset': offset})
+        return rows
+
+    def _traversal(self, params):
+        successors = dict(self.next_edges)
+        rows = []
+        for chunk_id in params['chunk_ids']:
+            chunk = self.chunks.get(chunk_id)
+            if chunk is None or chunk['user_id'] != params['user_id']:
+                continue
+            props = self.files.get((chunk['user_id'], chunk['filename']), {})
+            following = self.chunks.get(successors.get(chunk_id))
+            next_chunks = [] if following is None else [{
+                'id': following['id'], 'label': following.get('label'), 'preview': following.get('preview'),
+                'index': following['chunk_index'], 'text': None,
+            }]
+            rows.append({
+                'id': chunk_id, 'index': chunk['chunk_index'], 'section': chunk['section'],
+                'label': chunk.get('label'), 'preview': chunk.get('preview'), 'text': None,
+                'filename': chunk['filename'], 'total_chunks': props.get('total_chunks'),
+                'next_chunks': next_chunks,
+            })
+        return rows
+
+    def _user_version(self, params):
+        user = self.users.get(params['user_id'])
+        return [] if user is None else [{'version': user.get('embedding_version')}]
+
+    def _tenants_by_version(self, params):
+        counts = defaultdict(int)
+        for user in self.users.values():
+            counts[user.get('embedding_version') or params['legacy']] += 1
+        return [{'version': version, 'tenants': tenants} for version, tenants in counts.items()]
+
+    def _coverage(self, params):
+        chunks = [chunk for chunk in self.chunks.values() if params['user_id'] in (None, chunk.get('user_id'))]
+        return [{'chunks': len(chunks),
+                 'embedded': sum(chunk.get(params['embedding_property']) is not None for chunk in chunks)}]
+
+    def _switch_version(self, params):
+        user = self.users.get(params['user_id'])
+        if user is None:
+            return []
+        missing = sum(chunk.get('user_id') == params['user_id'] and chunk.get(params['embedding_property']) is None
+                      for chunk in self.chunks.values())
+        if missing == 0:
+            user.update(embedding_version=params['version'], embedding_version_since=params['now'])
+        return [{'missing': missing, 'version': user.get('embedding_version') or params['legacy']}]
+
+    def _gc_page(self, params):
+        def collectable(chunk):
+            user = self.users.get(chunk.get('user_id'))
+            return user is None or ((user.get('embedding_version') or params['legacy']) != params['version']
+                                    and (user.get('embedding_version_since') or 0) < params['settled_before'])
+
+        page = [chunk for chunk in self.chunks.values()
+                if chunk.get(params['embedding_property']) is not None and collectable(chunk)][:params['limit']]
+        for chunk in page:
+            self._set_props(chunk, params['clear'])
+        return [{'cleared': len(page)}]
@@ -0,0 +1,166 @@
+"""
+Record/replay stand-in for the Anthropic client used by QA (messages.create and
+messages.stream), so QA benchmarks are deterministic and run offline.
+
+    record  forward every request to a real client and store the answer, usage and
+            latency in a JSON cassette keyed by a hash of the request
+    replay  answer from the cassette without network access; requests that were
+            never recorded get a fixed placeholder answer and count as misses
+
+Replayed calls can sleep for the recorded latency (latency="recorded") so that
+end-to-end numbers stay realistic, or return immediately (latency="zero").
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+MISS_ANSWER = "[no recorded answer for this request]"
+
+
+def request_key(request):
+    """Stable hash of the parts of a messages request that determine the answer"""
+    relevant = {key: request.get(key) for key in ("model", "max_tokens", "system", "messages", "temperature")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _message(text, usage=None):
+    usage = usage or {}
+    return SimpleNamespace(
+        content=[SimpleNamespace(type="text", text=text)],
+        usage=SimpleNamespace(input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0)),
+        stop_reason="end_turn",
+    )
+
+
+class _ReplayStream:
+    def __init__(self, text, delay):
+        self._text = text
+        self._delay = delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        pieces = self._text.split(" ")
+        for i, piece in enumerate(pieces):
+            if self._delay:
+                await asyncio.sleep(self._delay / len(pieces))
+            yield piece if i == 0 else " " + piece
+
+
+class _RecordingStream:
+    def __init__(self, client, request):
+        self._client = client
+        self._request = request
+        self._inner = None
+
+    async def __aenter__(self):
+        self._start = time.perf_counter()
+        self._parts = []
+        self._inner = self._client.upstream.messages.stream(**self._request)
+        self._stream = await self._inner.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        result = await self._inner.__aexit__(*exc)
+        if exc[0] is None:
+            self._client._store(self._request, "".join(self._parts), None, time.perf_counter() - self._start)
+        return result
+
+    @property
+    async def text_stream(self):
+        async for text in self._stream.text_stream:
+            self._parts.append(text)
+            yield text
+
+
+class _Messages:
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, **request):
+        return await self._client._create(request)
+
+    def stream(self, **request):
+        return self._client._stream(request)
+
+
+class ReplayLLMClient:
+    """Drop-in for get_llm_client() in benchmarks"""
+    def __init__(self, cassette_path, mode="replay", upstream=None, latency="recorded"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', not {mode!r}")
+        if mode == "record" and upstream is None:
+            raise ValueError("record mode needs an upstream client")
+        self.cassette_path = cassette_path
+        self.mode = mode
+        self.upstream = upstream
+        self.latency = latency
+        self.messages = _Messages(self)
+        self.hits = self.misses = self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(cassette_path):
+            with open(cassette_path) as fh:
+                self._entries = json.load(fh)
+
+    def _delay(self, entry):
+        return entry.get("latency_s", 0.0) if self.latency == "recorded" else 0.0
+
+    def _lookup(self, request):
+        entry = self._entries.get(request_key(request))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def _store(self, request, text, usage, latency_s):
+        with self._lock:
+            self._entries[request_key(request)] = {"text": text, "usage": usage, "latency_s": latency_s}
+            self.recorded += 1
+
+    async def _create(self, request):
+        if self.mode == "record":
+            start = time.perf_counter()
+            message = await self.upstream.messages.create(**request)
+            usage = getattr(message, "usage", None)
+            self._store(request, message.content[0].text,
+                        {"input_tokens": getattr(usage, "input_tokens", 0), "output_tokens": getattr(usage, "output_tokens", 0)},
+                        time.perf_counter() - start)
+            return message
+
+        entry = self._lookup(request)
+        if entry is None:
+            return _message(MISS_ANSWER)
+        if self._delay(entry):
+            await asyncio.sleep(self._delay(entry))
+        return _message(entry["text"], entry.get("usage"))
+
+    def _stream(self, request):
+        if self.mode == "record":
+            return _RecordingStream(self, request)
+        entry = self._lookup(request)
+        if entry is None:
+            return _ReplayStream(MISS_ANSWER, 0.0)
+        return _ReplayStream(entry["text"], self._delay(entry))
+
+    def save(self):
+        """Write the cassette (record mode)"""
+        with self._lock:
+            entries = dict(self._entries)
+        with open(self.cassette_path, "w") as fh:
+            json.dump(entries, fh, indent=1, sort_keys=True)
+
+    def stats(self):
+        return {"mode": self.mode, "entries": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "recorded": self.recorded}
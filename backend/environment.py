@@ -19,6 +19,11 @@ ENV = os.getenv("ENV", "test_db")
 
 DISCORD_BOT_TOKEN=os.getenv("DISCORD_BOT_TOKEN")
 
+# Optional subsystems (disabled ones are never imported)
+DISCORD_ENABLED = os.getenv("DISCORD_ENABLED", "true" if DISCORD_BOT_TOKEN else "false").lower() == "true"
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"  # pytesseract OCR of images and PDF images
+CRUD_ENABLED = os.getenv("CRUD_ENABLED", "true").lower() == "true"  # /crud and /file_handler routers
+
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASS = os.getenv("NEO4J_PASS")
@@ -26,4 +31,95 @@ NEO4J_PASS = os.getenv("NEO4J_PASS")
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Question answering retrieval
+QA_TOP_K = int(os.getenv("QA_TOP_K", "10"))
+QA_FETCH_K = int(os.getenv("QA_FETCH_K", "200"))
+QA_CANDIDATE_K = int(os.getenv("QA_CANDIDATE_K", "40"))
+QA_DIVERSITY = os.getenv("QA_DIVERSITY", "mmr")  # mmr | quota | none
+QA_MMR_LAMBDA = float(os.getenv("QA_MMR_LAMBDA", "0.7"))
+QA_PER_FILE_QUOTA = int(os.getenv("QA_PER_FILE_QUOTA", "5"))
+QA_RETRIEVER_CACHE_SIZE = int(os.getenv("QA_RETRIEVER_CACHE_SIZE", "256"))
+QA_RETRIEVER_CACHE_TTL = int(os.getenv("QA_RETRIEVER_CACHE_TTL", "900"))  # seconds
+QA_RETRIEVAL_MODE = os.getenv("QA_RETRIEVAL_MODE", "hybrid")  # hybrid | vector
+QA_RRF_K = int(os.getenv("QA_RRF_K", "60"))  # reciprocal rank fusion constant
+QA_NEXT_WINDOW = int(os.getenv("QA_NEXT_WINDOW", "0"))  # NEXT neighbours added on each side of a seed chunk (0 = off)
+QA_SEED_K = int(os.getenv("QA_SEED_K", "4"))  # seed chunks retrieved when QA_NEXT_WINDOW > 0
+QA_CONTEXT_TOKEN_BUDGET = int(os.getenv("QA_CONTEXT_TOKEN_BUDGET", "5000"))  # prompt context, after overlap removal
+
+# In-process per-tenant vector cache (optional tier in front of Neo4j vector search)
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "false").lower() == "true"
+VECTOR_CACHE_MAX_MB = int(os.getenv("VECTOR_CACHE_MAX_MB", "512"))  # global memory budget
+VECTOR_CACHE_MAX_TENANT_CHUNKS = int(os.getenv("VECTOR_CACHE_MAX_TENANT_CHUNKS", "50000"))
+VECTOR_CACHE_HNSW_THRESHOLD = int(os.getenv("VECTOR_CACHE_HNSW_THRESHOLD", "20000"))  # needs hnswlib
+
+# Shared LLM HTTP client (connection pool used by /chat and /qa)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds, per request
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+
+# Shared URL fetch client (/url-upload); bodies are streamed and cut off at URL_FETCH_MAX_MB decoded
+URL_FETCH_MAX_MB = float(os.getenv("URL_FETCH_MAX_MB", "100"))
+URL_FETCH_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "30"))  # seconds, per read
+URL_FETCH_CONNECT_TIMEOUT = float(os.getenv("URL_FETCH_CONNECT_TIMEOUT", "10"))
+URL_FETCH_MAX_CONNECTIONS = int(os.getenv("URL_FETCH_MAX_CONNECTIONS", "100"))
+URL_FETCH_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("URL_FETCH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+URL_FETCH_MAX_PER_HOST = int(os.getenv("URL_FETCH_MAX_PER_HOST", "4"))  # concurrent requests per host
+URL_FETCH_MAX_REDIRECTS = int(os.getenv("URL_FETCH_MAX_REDIRECTS", "5"))
+URL_FETCH_USER_AGENT = os.getenv("URL_FETCH_USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
+
+# Crawl ingestion (/crawl): pages share the URL fetch pool and its per-host limit
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "1000"))  # pages fetched per crawl, at most
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))  # link hops from the seed URLs, at most
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))  # pages in flight per crawl
+CRAWL_PAGE_MAX_MB = float(os.getenv("CRAWL_PAGE_MAX_MB", "10"))
+CRAWL_MAX_JOBS = int(os.getenv("CRAWL_MAX_JOBS", "2"))  # crawls running at once
+CRAWL_MAX_DELAY = float(os.getenv("CRAWL_MAX_DELAY", "10"))  # cap on a robots.txt Crawl-delay, seconds
+
+# QA answer cache
+QA_CACHE_ENABLED = os.getenv("QA_CACHE_ENABLED", "true").lower() == "true"
+QA_CACHE_SIZE = int(os.getenv("QA_CACHE_SIZE", "1024"))
+QA_CACHE_TTL = int(os.getenv("QA_CACHE_TTL", "3600"))  # seconds
+QA_CACHE_SIMILARITY = float(os.getenv("QA_CACHE_SIMILARITY", "0.95"))  # cosine; > 1 disables near-duplicate hits
+
+# Prometheus metrics at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Slow Cypher capture (GET /knowledge-graph/admin/slow-queries)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))  # 0 captures every statement
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+SLOW_QUERY_PROFILE = os.getenv("SLOW_QUERY_PROFILE", "true").lower() == "true"  # re-run with PROFILE, rolled back
+SLOW_QUERY_PROFILE_INTERVAL = float(os.getenv("SLOW_QUERY_PROFILE_INTERVAL", "300"))  # seconds between profiles of one statement
+SLOW_QUERY_PROFILE_WRITES = os.getenv("SLOW_QUERY_PROFILE_WRITES", "false").lower() == "true"
+
+# Comma-separated user ids allowed on /admin endpoints (everyone in ENV=dev)
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# Batch QA (/qa/batch)
+QA_BATCH_MAX_QUESTIONS = int(os.getenv("QA_BATCH_MAX_QUESTIONS", "1000"))
+QA_BATCH_LLM_CONCURRENCY = int(os.getenv("QA_BATCH_LLM_CONCURRENCY", "8"))  # Claude calls in flight per batch
+
+# Embeddings: model, output size and how vectors are stored in Neo4j
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")  # openai | local (offline hashing embedder)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # texts per embedding request
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))  # text-embedding-3-* can return fewer
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")  # float64 | float32 | int8
+EMBEDDING_INDEX_DIMENSIONS = int(os.getenv("EMBEDDING_INDEX_DIMENSIONS", os.getenv("EMBEDDING_DIMENSIONS", "1536")))  # int8 mode only
+EMBEDDING_INDEX_QUANTIZATION = os.getenv("EMBEDDING_INDEX_QUANTIZATION", "false").lower() == "true"  # Neo4j 5.23+
+
+# Background embedding regeneration jobs (/embedding-jobs)
+EMBEDDING_JOB_PAGE_SIZE = int(os.getenv("EMBEDDING_JOB_PAGE_SIZE", "1000"))  # chunks read per page, ordered by id
+EMBEDDING_RATE_LIMIT_RPM = int(os.getenv("EMBEDDING_RATE_LIMIT_RPM", "0"))  # embedding requests per minute, 0 = unlimited
+EMBEDDING_RATE_LIMIT_TPM = int(os.getenv("EMBEDDING_RATE_LIMIT_TPM", "0"))  # estimated tokens per minute, 0 = unlimited
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))  # retries of a rate-limited (429) batch
+
+# Versioned embeddings (/admin/embedding-versions). A version id is "provider:model:dimensions";
+# setting EMBEDDING_LEGACY_VERSION to the model that filled textEmbedding turns on per-tenant versions
+EMBEDDING_LEGACY_VERSION = os.getenv("EMBEDDING_LEGACY_VERSION", "")  # e.g. openai:text-embedding-ada-002:1536
+EMBEDDING_VERSION_CACHE_TTL = int(os.getenv("EMBEDDING_VERSION_CACHE_TTL", "30"))  # seconds a tenant's active version is cached
@@ -2,37 +2,71 @@
 from fastapi import FastAPI
 # import database.tables as tables
 # from database.postgres import engine
-from routers import auth, chat, notify, ping , crud, knowledge_graph, file_handler
+from routers import auth, chat, ping, knowledge_graph, metrics
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from environment import SESSION_SECRET_KEY, FRONTEND_URL, PROJECT_NAME, ENV
+from environment import SESSION_SECRET_KEY, FRONTEND_URL, PROJECT_NAME, ENV, METRICS_ENABLED, DISCORD_ENABLED, CRUD_ENABLED
 # from routers.crud import  get_crud_router
 # from routers.knowledge_graph import  get_crud_router_kg
 from logger import setup_logger
 logger = setup_logger(__name__)
 
 import asyncio
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
-from routers.notify import bot, TOKEN
+from utils.llm_clients import startup_llm_clients, shutdown_llm_clients
+from utils.http_fetch import shutdown_fetcher
+from utils.metrics import HTTP_REQUEST_SECONDS
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    bot_task = asyncio.create_task(bot.start(TOKEN))
+    await startup_llm_clients()
+    bot = bot_task = None
+    if DISCORD_ENABLED and notify.TOKEN:
+        bot = notify.get_bot()
+        bot_task = asyncio.create_task(bot.start(notify.TOKEN))
     yield
-    await bot.close()
-    bot_task.cancel()
+    if bot is not None:
+        await bot.close()
+        bot_task.cancel()
+    await shutdown_llm_clients()
+    await shutdown_fetcher()
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET_KEY)
 
 app.include_router(ping.router, prefix="", tags=["ping"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"]) #Tag in Swagger UI
-app.include_router(crud.router, prefix=f"/crud", tags=[f"crud"])
-app.include_router(file_handler.router, prefix=f"/file_handler", tags=[f"file_handler"])
 app.include_router(knowledge_graph.router, prefix=f"/knowledge-graph", tags=[f"knowledge-graph"])
 app.include_router(chat.router, tags=["chat_ai"]) #Tag in Swagger UI
-app.include_router(notify.router, prefix="/notify", tags=["notify"])
+
+# Optional subsystems: disabled routers are not even imported
+if CRUD_ENABLED:
+    from routers import crud, file_handler
+    app.include_router(crud.router, prefix=f"/crud", tags=[f"crud"])
+    app.include_router(file_handler.router, prefix=f"/file_handler", tags=[f"file_handler"])
+
+if DISCORD_ENABLED:
+    from routers import notify
+    app.include_router(notify.router, prefix="/notify", tags=["notify"])
+
+if METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["metrics"])
+
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        """Latency per route template (not raw path, to keep label cardinality bounded)"""
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         route=getattr(route, "path", "unmatched"), status=status)
 
 # app.include_router(analyze.router, prefix="/analyze", tags=["analyze"]) #Tag in Swagger UI
 # app.include_router(manage.router, prefix="/manage", tags=["manage"])
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # --- Pydantic Models ---
 class ResourceCreate(BaseModel):
@@ -19,4 +19,16 @@ class Document(BaseModel):
 class QARequest(BaseModel):
     question: str
     filename: Optional[str] = None
-    top_k: int = 5
\ No newline at end of file
+    top_k: int = 5
+
+class BatchQARequest(BaseModel):
+    questions: List[str]
+    filenames: Optional[List[str]] = None
+    include_traversal: bool = False
+
+class CrawlRequest(BaseModel):
+    urls: List[str] = []
+    sitemaps: List[str] = []
+    max_depth: int = 0
+    max_pages: Optional[int] = None
+    allowed_domains: Optional[List[str]] = None
@@ -6,8 +6,6 @@ from starlette.config import Config
 from jose import jwt
 from logger import setup_logger
 from fastapi import Body
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
 
 
 logger = setup_logger(__name__)
@@ -68,6 +66,8 @@ async def verify_google_token(data: dict = Body(...)):
 
     try:
         # Verify the token with Google
+        from google.oauth2 import id_token as google_id_token
+        from google.auth.transport import requests as google_requests
         idinfo = google_id_token.verify_oauth2_token(
             id_token_str, google_requests.Request(), GOOGLE_CLIENT_ID
         )
@@ -4,10 +4,9 @@ from fastapi.responses import StreamingResponse
 from io import BytesIO
 from datetime import datetime
 from bson import ObjectId, Binary
-from motor.motor_asyncio import AsyncIOMotorClient
+from utils.metrics import mongo_pool_listener
 import environment
 from models.crud_models import ResourceCreate, ResourceUpdate
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from typing import List
 
 
@@ -33,9 +32,6 @@ def serialize_doc(doc):
 
 
 # --- Auth Dependency ---
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-
 GOOGLE_CLIENT_ID = f"{environment.GOOGLE_CLIENT_ID}.apps.googleusercontent.com"
 
 
@@ -47,6 +43,8 @@ def get_current_user(authorization: str = Depends(lambda: None)):
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = authorization.split(" ")[1]
     try:
+        from google.oauth2 import id_token
+        from google.auth.transport import requests as google_requests
         idinfo = id_token.verify_oauth2_token(
             token, google_requests.Request(), GOOGLE_CLIENT_ID
         )
@@ -55,19 +53,26 @@ def get_current_user(authorization: str = Depends(lambda: None)):
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
 
-# --- Motor Client Initialization ---
-client = AsyncIOMotorClient(environment.MONGO_URI)
-db = client[environment.DB_NAME]
-fs = AsyncIOMotorGridFSBucket(db)
-router = APIRouter()
-collection = db[environment.PROJECT_NAME]  # Motor async collection
+# --- Motor Client Initialization (Lazy-loaded) ---
+client = None
+collection = None
 
-# Motor async collection
+def get_collection():
+    """Motor async collection, created on first use"""
+    global client, collection
+    if collection is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(environment.MONGO_URI, event_listeners=[mongo_pool_listener])
+        collection = client[environment.DB_NAME][environment.PROJECT_NAME]
+    return collection
+
+router = APIRouter()
 
 @router.get("/items")
 async def list_items(
     page: int = 1, limit: int = 10, user=Depends(get_current_user)
 ):
+    collection = get_collection()
     skip = (page - 1) * limit
     cursor = collection.find({"user_id": user["user_id"]}).skip(skip).limit(limit)
     docs = await cursor.to_list(length=limit)
@@ -81,6 +86,7 @@ async def list_items(
 
 @router.post("/item")
 async def create_item(data: ResourceCreate, user=Depends(get_current_user)):
+    collection = get_collection()
     doc = data.dict()
     doc["user_id"] = user["user_id"]
     doc["created_at"] = datetime.utcnow()
@@ -92,6 +98,7 @@ async def create_item(data: ResourceCreate, user=Depends(get_current_user)):
 async def update_item(
     item_id: str, data: ResourceUpdate, user=Depends(get_current_user)
 ):
+    collection = get_collection()
     update_data = {k: v for k, v in data.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     result = await collection.update_one(
@@ -105,6 +112,7 @@ async def update_item(
 
 @router.delete("/{item_id}")
 async def delete_item(item_id: str, user=Depends(get_current_user)):
+    collection = get_collection()
     result = await collection.delete_one(
         {"_id": ObjectId(item_id), "user_id": user["user_id"]}
     )
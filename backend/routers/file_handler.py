@@ -3,12 +3,10 @@ from fastapi import UploadFile, File, APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from datetime import datetime
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from utils.metrics import mongo_pool_listener
 from typing import List
 import environment
 from models.crud_models import ResourceCreate, ResourceUpdate
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 from services.file_service import (
     upload_file_to_gridfs,
     download_file_from_gridfs,
@@ -28,6 +26,8 @@ def get_current_user(authorization: str = Depends(lambda: None)):
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = authorization.split(" ")[1]
     try:
+        from google.oauth2 import id_token
+        from google.auth.transport import requests as google_requests
         idinfo = id_token.verify_oauth2_token(
             token, google_requests.Request(), GOOGLE_CLIENT_ID
         )
@@ -35,20 +35,32 @@ def get_current_user(authorization: str = Depends(lambda: None)):
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
-# --- Motor Initialization ---
-client = AsyncIOMotorClient(environment.MONGO_URI)
-db = client[environment.DB_NAME]
-fs = AsyncIOMotorGridFSBucket(db)
+# --- Motor Initialization (Lazy-loaded) ---
+client = None
+db = None
+fs = None
+
+def get_gridfs():
+    """Motor database and GridFS bucket, created on first use"""
+    global client, db, fs
+    if client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+        client = AsyncIOMotorClient(environment.MONGO_URI, event_listeners=[mongo_pool_listener])
+        db = client[environment.DB_NAME]
+        fs = AsyncIOMotorGridFSBucket(db)
+    return db, fs
+
 router = APIRouter()
-collection = db[environment.PROJECT_NAME]
 
 # --- CRUD APIs ---
 @router.get("/files", response_model=List[dict])
 async def list_files(user=Depends(get_current_user)):
+    db, fs = get_gridfs()
     return await list_files_from_gridfs(db, user["user_id"])
 
 @router.get("/file-download/{filename}")
 async def download_file(filename: str, user=Depends(get_current_user)):
+    db, fs = get_gridfs()
     file_info, stream = await download_file_from_gridfs(fs, db, filename, user["user_id"])
     return StreamingResponse(
         stream,
@@ -58,15 +70,18 @@ async def download_file(filename: str, user=Depends(get_current_user)):
 
 @router.post("/file-upload")
 async def upload_file(file: UploadFile = File(...), user=Depends(get_current_user)):
+    db, fs = get_gridfs()
     file_id, _ = await upload_file_to_gridfs(fs, file, user["user_id"])
     return {"message": "Uploaded", "id": str(file_id)}
 
 @router.delete("/files/{filename}")
 async def delete_file(filename: str, user=Depends(get_current_user)):
+    db, fs = get_gridfs()
     await delete_file_from_gridfs(fs, db, filename, user["user_id"])
     return {"status": "success", "message": f"File '{filename}' deleted successfully"}
 
 @router.delete("/files")
 async def delete_all_files(user=Depends(get_current_user)):
+    db, fs = get_gridfs()
     deleted_count = await delete_all_files_from_gridfs(fs, db, user["user_id"])
     return {"status": "success", "message": f"Deleted {deleted_count} file(s) successfully"}
@@ -1,11 +1,11 @@
 # routers/knowledge_graph.py
 from fastapi import UploadFile, File, Query, APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+import asyncio
+import json
+from utils.metrics import mongo_pool_listener
 from typing import List
 import environment
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 from services.file_service import (
     upload_file_to_gridfs,
     download_file_from_gridfs,
@@ -13,7 +13,16 @@ from services.file_service import (
     delete_file_from_gridfs,
     delete_all_files_from_gridfs,
 )
-from utils.knowledge_graph import create_file_knowledge_graph, delete_file_knowledge_graph, ask_question, get_graph_traversal_path
+from utils.knowledge_graph import create_file_knowledge_graph, delete_file_knowledge_graph, ask_question, ask_questions_batch, stream_question, get_graph_traversal_path, count_graph_queries
+from models.crud_models import BatchQARequest, CrawlRequest
+from utils.query_registry import register_query
+from utils.slow_queries import slow_query_log
+from utils.http_fetch import ContentTooLarge
+from utils.crawler import start_crawl, get_crawl, cancel_crawl, CrawlError, CrawlBusy
+from utils.progress import progress_bus, track_ingestion, new_ingestion_id
+from utils.embedding_jobs import embedding_jobs, EmbeddingJobError, EmbeddingJobUnavailable
+from utils.embedding_versions import (get_version, versions_status, switch_version, start_collect_garbage,
+                                      require_versions, EmbeddingVersionError, InvalidEmbeddingVersion)
 
 # --- Auth Dependency ---
 GOOGLE_CLIENT_ID = f"{environment.GOOGLE_CLIENT_ID}.apps.googleusercontent.com"
@@ -26,6 +35,8 @@ def get_current_user(authorization: str = None):
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = authorization.split(" ")[1]
     try:
+        from google.oauth2 import id_token
+        from google.auth.transport import requests as google_requests
         idinfo = id_token.verify_oauth2_token(
             token, google_requests.Request(), GOOGLE_CLIENT_ID
         )
@@ -33,6 +44,15 @@ def get_current_user(authorization: str = None):
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
+def is_admin(user):
+    return environment.ENV == "dev" or user["user_id"] in environment.ADMIN_USER_IDS
+
+def require_admin(user=Depends(get_current_user)):
+    """Allow only ADMIN_USER_IDS (any user in dev)"""
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 # --- Motor Initialization (Lazy-loaded) ---
 client = None
 db = None
@@ -47,7 +67,8 @@ def get_mongodb_connection():
                 print("MongoDB URI not provided. File storage features will be disabled.")
                 return None, None
             
-            client = AsyncIOMotorClient(environment.MONGO_URI)
+            from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+            client = AsyncIOMotorClient(environment.MONGO_URI, event_listeners=[mongo_pool_listener])
             db = client[environment.DB_NAME]
             fs = AsyncIOMotorGridFSBucket(db)
             print("MongoDB connection established successfully")
@@ -60,6 +81,40 @@ def get_mongodb_connection():
 
 router = APIRouter()
 
+# --- Cypher statements ---
+URL_LIST_QUERY = register_query("url.list", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
+    WHERE f.filename STARTS WITH 'url_' AND f.original_url IS NOT NULL
+    RETURN f.filename as filename,
+           f.total_chunks as total_chunks,
+           f.processed_date as processed_date,
+           f.source as source,
+           f.original_url as original_url
+    ORDER BY f.processed_date DESC
+""")
+
+URL_INFO_QUERY = register_query("url.info", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
+    WHERE f.original_url = $original_url
+    RETURN f.filename as filename,
+           f.total_chunks as total_chunks,
+           f.processed_date as processed_date,
+           f.source as source,
+           f.pages_processed as pages_processed,
+           f.images_processed as images_processed,
+           f.successful_ocr as successful_ocr,
+           f.failed_ocr as failed_ocr,
+           f.extraction_errors as extraction_errors,
+           f.original_url as original_url
+""")
+
+URL_SAMPLE_CHUNKS_QUERY = register_query("url.sample_chunks", """
+    MATCH (f:File {filename: $filename, user_id: $user_id})-[:HAS_CHUNK]->(c:Chunk)
+    RETURN c.text as text, c.chunk_index as index, c.section as section
+    ORDER BY c.chunk_index
+    LIMIT 3
+""")
+
 # --- Knowledge Graph APIs ---
 @router.get("/file-download/{filename}")
 async def download_file(filename: str, user=Depends(get_current_user)):
@@ -98,23 +153,35 @@ async def list_files(user=Depends(get_current_user)):
         else:
             return []  # Return empty list instead of raising error
 
+def _run_ingestion(ingestion_id, user_id, filename, ingest, **kwargs):
+    """Run an ingestion function (in a worker thread) with its progress published under ingestion_id"""
+    with track_ingestion(ingestion_id, user_id, filename) as tracker:
+        result = ingest(user_id=user_id, filename=filename, **kwargs)
+        if isinstance(result, dict) and result.get("status") == "error":
+            tracker.fail(result.get("message"))
+        return result
+
 @router.post("/file-upload")
-async def upload_file(file: UploadFile = File(...), user=Depends(get_current_user)):
+async def upload_file(file: UploadFile = File(...), ingestion_id: str = Query(None), user=Depends(get_current_user)):
+    """
+    Store a file and build its knowledge graph. Pass your own `ingestion_id` to follow
+    progress on /ingestions/{ingestion_id}/events while the upload is running.
+    """
     db, fs = get_mongodb_connection()
     if db is None or fs is None:
         raise HTTPException(status_code=503, detail="File storage service unavailable")
     
+    ingestion_id = ingestion_id or new_ingestion_id()
     file_id, contents = await upload_file_to_gridfs(fs, file, user["user_id"])
     try:
-        kg_result = create_file_knowledge_graph(
-            user_id=user["user_id"],
-            filename=file.filename,
+        kg_result = await asyncio.to_thread(
+            _run_ingestion, ingestion_id, user["user_id"], file.filename, create_file_knowledge_graph,
             file_contents=contents,
             content_type=file.content_type,
         )
-        return {"message": "Uploaded", "id": str(file_id), "knowledge_graph": kg_result}
+        return {"message": "Uploaded", "id": str(file_id), "ingestion_id": ingestion_id, "knowledge_graph": kg_result}
     except Exception as kg_error:
-        return {"message": "Uploaded", "id": str(file_id), "knowledge_graph": {"status": "error", "message": str(kg_error)}}
+        return {"message": "Uploaded", "id": str(file_id), "ingestion_id": ingestion_id, "knowledge_graph": {"status": "error", "message": str(kg_error)}}
 
 @router.delete("/files/{filename}")
 async def delete_file_endpoint(filename: str, user=Depends(get_current_user)):
@@ -134,22 +201,77 @@ async def delete_all_files(user=Depends(get_current_user)):
 async def qa_endpoint(
     question: str = Query(...),
     filenames: list = Query(None),
+    debug: bool = False,
     user=Depends(get_current_user),
 ):
     if not question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     try:
-        result = ask_question(user_id=user["user_id"], question=question, filenames=filenames)
-        
-        # Add graph traversal path if available
-        if result.get("status") == "success" and result.get("sources"):
-            traversal_path = get_graph_traversal_path(result["sources"], user["user_id"])
-            result["traversal_path"] = traversal_path
-            
+        with count_graph_queries() as graph_queries:
+            result = await ask_question(user_id=user["user_id"], question=question, filenames=filenames)
+
+            # Add graph traversal path if available
+            if result.get("status") == "success" and result.get("sources"):
+                traversal_path = await asyncio.to_thread(get_graph_traversal_path, result["sources"], user["user_id"])
+                result["traversal_path"] = traversal_path
+
+        if debug:
+            result["debug"] = {"graph_queries": graph_queries["queries"]}
+
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"QA error: {str(e)}")
 
+def _sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/qa/stream")
+async def qa_stream_endpoint(
+    question: str = Query(...),
+    filenames: list = Query(None),
+    user=Depends(get_current_user),
+):
+    """
+    Streaming variant of /qa (text/event-stream). Emits a `sources` event as soon
+    as retrieval finishes, `token` events while the answer is generated, then
+    `traversal` and `done` (or a single `error`).
+    """
+    if not question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    async def events():
+        async for event, data in stream_question(user["user_id"], question, filenames):
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/qa/batch")
+async def qa_batch_endpoint(request: BatchQARequest, user=Depends(get_current_user)):
+    """
+    Answer many questions in one call (application/x-ndjson). One JSON line per
+    question, in completion order; `index` is the question's position in the request.
+    A failed question gets a line with status "error", the rest still complete.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(request.questions) > environment.QA_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {environment.QA_BATCH_MAX_QUESTIONS} questions per batch")
+    if any(not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+
+    async def lines():
+        async for index, result in ask_questions_batch(user["user_id"], request.questions, request.filenames):
+            if request.include_traversal and result.get("status") == "success" and result.get("sources"):
+                result["traversal_path"] = await asyncio.to_thread(get_graph_traversal_path, result["sources"], user["user_id"])
+            yield json.dumps({"index": index, **result}, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 @router.get("/graph-traversal/{question_id}")
 async def get_graph_traversal(question_id: str, user=Depends(get_current_user)):
     """Get the graph traversal path for a specific question"""
@@ -161,7 +283,7 @@ async def get_graph_traversal(question_id: str, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error fetching traversal: {str(e)}")
 
 @router.post("/url-upload")
-async def upload_url(url: str = Query(...), user=Depends(get_current_user)):
+async def upload_url(url: str = Query(...), ingestion_id: str = Query(None), user=Depends(get_current_user)):
     """Process a URL and add it to the knowledge graph"""
     
     # Validate URL format
@@ -173,23 +295,19 @@ async def upload_url(url: str = Query(...), user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
     
     try:
-        from utils.url_extractor import extract_text_from_url
+        from utils.url_extractor import extract_text_from_url, stored_url_filename
         
         # Extract text from URL
-        text_content, metadata = extract_text_from_url(url)
+        text_content, metadata = await extract_text_from_url(url)
         
-        # Create filename from URL
-        from urllib.parse import urlparse
-        parsed_url = urlparse(url)
-        filename = f"url_{parsed_url.netloc}_{parsed_url.path.replace('/', '_')}.txt"
-        if len(filename) > 100:  # Truncate if too long
-            filename = filename[:100] + ".txt"
+        # Create filename from URL, keeping the name of an earlier upload of it
+        filename = await asyncio.to_thread(stored_url_filename, user["user_id"], url)
         
         # Process the extracted text with original URL metadata
         from utils.knowledge_graph import create_url_knowledge_graph
-        kg_result = create_url_knowledge_graph(
-            user_id=user["user_id"],
-            filename=filename,
+        ingestion_id = ingestion_id or new_ingestion_id()
+        kg_result = await asyncio.to_thread(
+            _run_ingestion, ingestion_id, user["user_id"], filename, create_url_knowledge_graph,
             file_contents=text_content.encode('utf-8'),
             original_url=url,
             content_type='text/plain'
@@ -198,10 +316,13 @@ async def upload_url(url: str = Query(...), user=Depends(get_current_user)):
         return {
             "message": "URL processed successfully",
             "filename": filename,
+            "ingestion_id": ingestion_id,
             "knowledge_graph": kg_result,
             "metadata": metadata
         }
         
+    except ContentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -209,7 +330,7 @@ async def upload_url(url: str = Query(...), user=Depends(get_current_user)):
         logger.error(f"Error details: {type(e).__name__}: {str(e)}")
         
         # Provide more specific error messages
-        if "requests" in str(e).lower():
+        if "network error" in str(e).lower() or "http " in str(e).lower():
             error_detail = "Network error - unable to fetch URL content"
         elif "beautifulsoup" in str(e).lower():
             error_detail = "HTML parsing error - unable to extract text from URL"
@@ -220,6 +341,41 @@ async def upload_url(url: str = Query(...), user=Depends(get_current_user)):
         
         raise HTTPException(status_code=500, detail=error_detail)
 
+@router.post("/crawl")
+async def crawl_urls(request: CrawlRequest, user=Depends(get_current_user)):
+    """
+    Crawl a list of URLs and/or sitemaps (following links up to max_depth within allowed_domains)
+    and ingest the pages as one background job. Follow progress at /ingestions/{crawl_id}/events.
+    """
+    try:
+        crawl = start_crawl(user["user_id"], request.urls, request.sitemaps, request.max_depth,
+                            request.max_pages, request.allowed_domains)
+    except CrawlBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except CrawlError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "started", "crawl_id": crawl["crawl_id"], "ingestion_id": crawl["crawl_id"], "crawl": crawl}
+
+def _get_own_crawl(crawl_id, user):
+    """A crawl the caller started (admins see all crawls)"""
+    crawl = get_crawl(crawl_id)
+    if crawl is None or (crawl["owner_id"] != user["user_id"] and not is_admin(user)):
+        raise HTTPException(status_code=404, detail="Unknown crawl")
+    return crawl
+
+@router.get("/crawls/{crawl_id}")
+async def get_crawl_endpoint(crawl_id: str, user=Depends(get_current_user)):
+    """Page counts by outcome and per-page errors of a running or recently finished crawl"""
+    return _get_own_crawl(crawl_id, user)
+
+@router.post("/crawls/{crawl_id}/cancel")
+async def cancel_crawl_endpoint(crawl_id: str, user=Depends(get_current_user)):
+    """Stop a running crawl; pages already ingested are kept"""
+    _get_own_crawl(crawl_id, user)
+    if not cancel_crawl(crawl_id):
+        raise HTTPException(status_code=409, detail="Crawl is not running")
+    return {"status": "cancelling", "crawl_id": crawl_id}
+
 @router.delete("/url-delete")
 async def delete_url(url: str = Query(...), user=Depends(get_current_user)):
     """Delete a previously uploaded URL from the knowledge graph"""
@@ -235,11 +391,8 @@ async def delete_url(url: str = Query(...), user=Depends(get_current_user)):
     try:
         # Check if file exists in Neo4j knowledge graph by original URL
         from utils.knowledge_graph import safe_kg_query
-        file_check = safe_kg_query("""
-            MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
-            WHERE f.original_url = $original_url
-            RETURN f.filename as filename, f.total_chunks as total_chunks
-        """, params={'user_id': user["user_id"], 'original_url': url})
+        from utils.url_extractor import URL_FILE_LOOKUP_QUERY
+        file_check = safe_kg_query(URL_FILE_LOOKUP_QUERY, params={'user_id': user["user_id"], 'original_url': url})
         
         if not file_check:
             raise HTTPException(status_code=404, detail=f"URL not found in knowledge graph: {url}")
@@ -279,16 +432,7 @@ async def list_urls(user=Depends(get_current_user)):
         from utils.knowledge_graph import safe_kg_query
         
         # Query all URL files for this user
-        url_files = safe_kg_query("""
-            MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
-            WHERE f.filename STARTS WITH 'url_' AND f.original_url IS NOT NULL
-            RETURN f.filename as filename, 
-                   f.total_chunks as total_chunks,
-                   f.processed_date as processed_date,
-                   f.source as source,
-                   f.original_url as original_url
-            ORDER BY f.processed_date DESC
-        """, params={'user_id': user["user_id"]})
+        url_files = safe_kg_query(URL_LIST_QUERY, params={'user_id': user["user_id"]})
         
         if not url_files:
             return {
@@ -345,20 +489,7 @@ async def get_url_info(url: str = Query(...), user=Depends(get_current_user)):
         from utils.knowledge_graph import safe_kg_query
         
         # Get file information by original URL instead of filename
-        file_info = safe_kg_query("""
-            MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
-            WHERE f.original_url = $original_url
-            RETURN f.filename as filename,
-                   f.total_chunks as total_chunks, 
-                   f.processed_date as processed_date,
-                   f.source as source,
-                   f.pages_processed as pages_processed,
-                   f.images_processed as images_processed,
-                   f.successful_ocr as successful_ocr,
-                   f.failed_ocr as failed_ocr,
-                   f.extraction_errors as extraction_errors,
-                   f.original_url as original_url
-        """, params={'user_id': user["user_id"], 'original_url': url})
+        file_info = safe_kg_query(URL_INFO_QUERY, params={'user_id': user["user_id"], 'original_url': url})
         
         if not file_info:
             raise HTTPException(status_code=404, detail=f"URL not found: {url}")
@@ -367,12 +498,7 @@ async def get_url_info(url: str = Query(...), user=Depends(get_current_user)):
         filename = file_data["filename"]  # Get filename from query result
         
         # Get sample chunks
-        sample_chunks = safe_kg_query("""
-            MATCH (f:File {filename: $filename, user_id: $user_id})-[:HAS_CHUNK]->(c:Chunk)
-            RETURN c.text as text, c.chunk_index as index, c.section as section
-            ORDER BY c.chunk_index
-            LIMIT 3
-        """, params={'filename': filename, 'user_id': user["user_id"]})
+        sample_chunks = safe_kg_query(URL_SAMPLE_CHUNKS_QUERY, params={'filename': filename, 'user_id': user["user_id"]})
         
         return {
             "status": "success",
@@ -406,31 +532,147 @@ async def get_url_info(url: str = Query(...), user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Error getting URL info: {str(e)}")
 
 @router.post("/regenerate-embeddings")
-async def regenerate_embeddings(user=Depends(get_current_user)):
-    """Regenerate embeddings for all chunks to fix search bias issues"""
-    
+async def regenerate_embeddings(force: bool = Query(False), all_users: bool = Query(False), user=Depends(get_current_user)):
+    """
+    Start a background job embedding the caller's chunks that have no embedding (all of them with force).
+    all_users covers every tenant and is admin-only. Follow progress at /ingestions/{job_id}/events.
+    """
+    if all_users:
+        require_admin(user)
     try:
-        from utils.knowledge_graph import regenerate_all_embeddings
-        
-        # Regenerate embeddings for missing ones first
-        result = regenerate_all_embeddings(force=False)
-        
-        if result:
-            return {
-                "status": "success",
-                "message": "Embeddings regenerated successfully",
-                "action": "Generated missing embeddings"
-            }
-        else:
-            # If no missing embeddings, check if we should force regenerate all
-            return {
-                "status": "info", 
-                "message": "No missing embeddings found. All chunks already have embeddings.",
-                "suggestion": "If search bias persists, you may need to force regenerate all embeddings"
-            }
-        
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Embedding regeneration error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error regenerating embeddings: {str(e)}")
+        job = await asyncio.to_thread(embedding_jobs.create, user["user_id"], None if all_users else user["user_id"], force)
+        embedding_jobs.start(job)
+    except EmbeddingJobUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except EmbeddingJobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "job_id": job["id"], "ingestion_id": job["id"], "job": job}
+
+async def _get_own_job(job_id, user):
+    """An embedding job the caller started (admins see all jobs)"""
+    job = await asyncio.to_thread(embedding_jobs.get, job_id)
+    if job is None or (job["owner_id"] != user["user_id"] and not is_admin(user)):
+        raise HTTPException(status_code=404, detail="Unknown embedding job")
+    return job
+
+@router.get("/embedding-jobs")
+async def list_embedding_jobs(limit: int = Query(50, ge=1, le=500), user=Depends(get_current_user)):
+    """The caller's embedding jobs, newest first"""
+    jobs = await asyncio.to_thread(embedding_jobs.list, user["user_id"], limit)
+    return {"jobs": jobs}
+
+@router.get("/embedding-jobs/{job_id}")
+async def get_embedding_job(job_id: str, user=Depends(get_current_user)):
+    """Status and checkpoint of one embedding job"""
+    return await _get_own_job(job_id, user)
+
+@router.post("/embedding-jobs/{job_id}/cancel")
+async def cancel_embedding_job(job_id: str, user=Depends(get_current_user)):
+    """Stop a running job after its current batch; it can be resumed later"""
+    await _get_own_job(job_id, user)
+    if not embedding_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not running")
+    return {"status": "cancelling", "job_id": job_id}
+
+@router.post("/embedding-jobs/{job_id}/resume")
+async def resume_embedding_job(job_id: str, user=Depends(get_current_user)):
+    """Continue a cancelled, failed or interrupted job from its last checkpoint"""
+    await _get_own_job(job_id, user)
+    try:
+        job = await asyncio.to_thread(embedding_jobs.prepare_resume, job_id)
+        embedding_jobs.start(job)
+    except EmbeddingJobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "resumed", "job_id": job_id, "job": job}
+
+
+@router.get("/admin/embedding-versions")
+async def embedding_versions_endpoint(user=Depends(require_admin)):
+    """Default and legacy embedding versions, tenants on each and how many chunks have vectors of each"""
+    return await asyncio.to_thread(versions_status)
+
+@router.post("/admin/embedding-versions/backfill")
+async def backfill_embedding_version(version: str, user_id: str = None, user=Depends(require_admin)):
+    """
+    Start a background job writing `version` vectors for one tenant (all tenants without user_id)
+    while questions keep using each tenant's active version
+    """
+    try:
+        require_versions()
+        get_version(version)
+        job = await asyncio.to_thread(embedding_jobs.create, user["user_id"], user_id, False, version)
+        embedding_jobs.start(job)
+    except InvalidEmbeddingVersion as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EmbeddingJobUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (EmbeddingJobError, EmbeddingVersionError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "job_id": job["id"], "ingestion_id": job["id"], "job": job}
+
+@router.post("/admin/embedding-versions/switch")
+async def switch_embedding_version(version: str, user_id: str, user=Depends(require_admin)):
+    """Make a backfilled version the tenant's active one; refused while any of its chunks lacks a vector"""
+    try:
+        return await asyncio.to_thread(switch_version, user_id, version, user["user_id"])
+    except InvalidEmbeddingVersion as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EmbeddingJobUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (EmbeddingJobError, EmbeddingVersionError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/admin/embedding-versions/gc")
+async def collect_embedding_version(version: str, user=Depends(require_admin)):
+    """Remove a version's vectors from tenants that left it, and its index once unused, in the background"""
+    try:
+        gc_id = start_collect_garbage(user["user_id"], version)
+    except InvalidEmbeddingVersion as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EmbeddingVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "version": version, "ingestion_id": gc_id}
+
+
+@router.get("/ingestions/events")
+async def ingestion_events(user=Depends(get_current_user)):
+    """Progress of all of the caller's ingestions as server-sent `progress` events"""
+    return _progress_stream(user["user_id"], None)
+
+@router.get("/ingestions/{ingestion_id}/events")
+async def ingestion_events_by_id(ingestion_id: str, user=Depends(get_current_user)):
+    """Progress of one ingestion as server-sent `progress` events; the stream ends with `done` or `failed`"""
+    return _progress_stream(user["user_id"], ingestion_id)
+
+@router.get("/ingestions/{ingestion_id}")
+async def ingestion_status(ingestion_id: str, user=Depends(get_current_user)):
+    """Latest progress event of one ingestion"""
+    event = progress_bus.latest(user["user_id"], ingestion_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion")
+    return event
+
+def _progress_stream(user_id, ingestion_id):
+    async def events():
+        async for event in progress_bus.subscribe(user_id, ingestion_id, heartbeat=15):
+            yield ": keep-alive\n\n" if event is None else _sse("progress", event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/admin/slow-queries")
+async def slow_queries_endpoint(limit: int = Query(50, ge=1, le=1000), statement: str = None, user=Depends(require_admin)):
+    """Recently captured slow Cypher statements, newest first, with their PROFILE plans when available"""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "profile": slow_query_log.profile,
+        "queries": slow_query_log.entries(limit=limit, statement=statement),
+    }
+
+@router.delete("/admin/slow-queries")
+async def clear_slow_queries(user=Depends(require_admin)):
+    slow_query_log.clear()
+    return {"status": "success"}
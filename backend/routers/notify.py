@@ -1,6 +1,4 @@
 from fastapi import APIRouter
-import discord
-from discord.ext import commands
 import environment
 from logger import setup_logger
 logger = setup_logger(__name__)
@@ -8,20 +6,31 @@ logger = setup_logger(__name__)
 TOKEN = environment.DISCORD_BOT_TOKEN
 CHANNEL_ID = environment.DISCORD_BOT_TOKEN
 
-intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
+# discord.py is only imported when the bot is first needed
+bot = None
 
-@bot.event
-async def on_ready():
-    logger.info(f"Discord bot logged in as {bot.user}")
+def get_bot():
+    """Shared Discord bot (lazy-loaded)"""
+    global bot
+    if bot is None:
+        import discord
+        from discord.ext import commands
+
+        intents = discord.Intents.default()
+        bot = commands.Bot(command_prefix="!", intents=intents)
+
+        @bot.event
+        async def on_ready():
+            logger.info(f"Discord bot logged in as {bot.user}")
+    return bot
 
 async def send_discord_notification(message: str, channel_id: str):
-    channel = bot.get_channel(channel_id)
+    channel = get_bot().get_channel(channel_id)
     if channel:
         await channel.send(message)
 
 async def send_dm_to_self(message: str, self_id: str):
-    user = await bot.fetch_user(self_id)
+    user = await get_bot().fetch_user(self_id)
     if user:
         await user.send(message)
 
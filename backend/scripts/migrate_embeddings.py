@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Rewrite stored Chunk embeddings in another storage mode (see utils/embedding_storage.py)
+without calling the embedding API again.
+
+    float64  plain float list, 8 bytes per dimension (original format)
+    float32  vector property written with db.create.setNodeVectorProperty
+    int8     float32 index vector (optionally truncated to --index-dims) plus a
+             full-dimension int8 copy used to rescore the top candidates
+
+The vector index is dropped and recreated when its dimension changes. Going from a
+truncated index back to full dimension needs the int8 copy. Chunks that only have
+a truncated vector are skipped and counted.
+
+    python scripts/migrate_embeddings.py --to float32
+    python scripts/migrate_embeddings.py --to int8 --index-dims 512 --recreate-index
+    python scripts/migrate_embeddings.py --to int8 --dry-run
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from environment import EMBEDDING_STORAGE, EMBEDDING_DIMENSIONS, EMBEDDING_INDEX_DIMENSIONS, EMBEDDING_INDEX_QUANTIZATION
+from utils.knowledge_graph import safe_kg_query, VECTOR_INDEX_NAME, VECTOR_NODE_LABEL, VECTOR_EMBEDDING_PROPERTY
+from utils.embedding_storage import STORAGE_MODES, bytes_per_chunk, dequantize_int8, index_vector, quantize_int8
+from utils.query_registry import register_query
+
+PAGE_QUERY = register_query("migrate.embedding_page", """
+    MATCH (c:Chunk)
+    WHERE c.id > $after AND c.textEmbedding IS NOT NULL
+    RETURN c.id AS id,
+           c.textEmbedding AS embedding,
+           c.textEmbeddingInt8 AS embedding_q,
+           c.textEmbeddingScale AS embedding_scale
+    ORDER BY c.id
+    LIMIT $batch_size
+""")
+
+WRITE_FLOAT64_QUERY = register_query("migrate.write_float64", """
+    UNWIND $rows AS row
+    MATCH (c:Chunk {id: row.id})
+    SET c.textEmbedding = row.embedding,
+        c.textEmbeddingInt8 = null,
+        c.textEmbeddingScale = null
+""")
+
+WRITE_VECTOR_QUERY = register_query("migrate.write_vector", """
+    UNWIND $rows AS row
+    MATCH (c:Chunk {id: row.id})
+    CALL db.create.setNodeVectorProperty(c, 'textEmbedding', row.embedding)
+    SET c.textEmbeddingInt8 = row.embedding_q,
+        c.textEmbeddingScale = row.embedding_scale
+""")
+
+INDEX_DIMENSIONS_QUERY = register_query("migrate.index_dimensions", """
+    SHOW VECTOR INDEXES YIELD name, options
+    WHERE name = $index_name
+    RETURN options.indexConfig['vector.dimensions'] AS dimensions
+""")
+
+
+def full_vector(row):
+    """Full-precision (or best available) vector of a stored chunk, or None"""
+    if row['embedding_q'] is not None:
+        return dequantize_int8(row['embedding_q'], row['embedding_scale'])
+    vector = np.asarray(row['embedding'], dtype=np.float32)
+    return vector if len(vector) >= EMBEDDING_DIMENSIONS else None
+
+
+def convert(row, target, index_dims):
+    vector = full_vector(row)
+    if vector is None:
+        return None
+    if target == "int8":
+        quantized, scale = quantize_int8(vector)
+        return {'id': row['id'], 'embedding': index_vector(vector, index_dims),
+                'embedding_q': quantized, 'embedding_scale': scale}
+    return {'id': row['id'], 'embedding': vector.tolist(), 'embedding_q': None, 'embedding_scale': None}
+
+
+def create_index_statement(dims):
+    quantization = ", `vector.quantization.enabled`: true" if EMBEDDING_INDEX_QUANTIZATION else ""
+    return f"""
+        CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS
+        FOR (c:{VECTOR_NODE_LABEL}) ON (c.{VECTOR_EMBEDDING_PROPERTY})
+        OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dims}, `vector.similarity_function`: 'cosine'{quantization} }} }}
+    """
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", choices=STORAGE_MODES, default=EMBEDDING_STORAGE)
+    parser.add_argument("--index-dims", type=int, default=EMBEDDING_INDEX_DIMENSIONS,
+                        help="Indexed dimension in int8 mode (default: EMBEDDING_INDEX_DIMENSIONS)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--recreate-index", action="store_true",
+                        help="Drop and recreate the vector index even if its dimension is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="Count and estimate only, write nothing")
+    args = parser.parse_args()
+
+    index_dims = min(args.index_dims, EMBEDDING_DIMENSIONS) if args.to == "int8" else EMBEDDING_DIMENSIONS
+    current = safe_kg_query(INDEX_DIMENSIONS_QUERY, params={'index_name': VECTOR_INDEX_NAME})
+    current_dims = current[0]['dimensions'] if current else None
+    rebuild_index = args.recreate_index or current_dims != index_dims
+    write_query = WRITE_FLOAT64_QUERY if args.to == "float64" else WRITE_VECTOR_QUERY
+
+    print(f"Target: {args.to}, index dimension {index_dims} (currently {current_dims}), "
+          f"~{bytes_per_chunk(args.to, EMBEDDING_DIMENSIONS, index_dims)} bytes/chunk "
+          f"(float64 was {bytes_per_chunk('float64', EMBEDDING_DIMENSIONS)})")
+
+    if rebuild_index and not args.dry_run:
+        # Vectors of the wrong dimension are silently left out of an index, so rebuild it
+        safe_kg_query(f"DROP INDEX {VECTOR_INDEX_NAME} IF EXISTS")
+
+    after, migrated, skipped = "", 0, 0
+    while True:
+        rows = safe_kg_query(PAGE_QUERY, params={'after': after, 'batch_size': args.batch_size})
+        if not rows:
+            break
+        after = rows[-1]['id']
+        converted = [convert(row, args.to, index_dims) for row in rows]
+        batch = [row for row in converted if row is not None]
+        skipped += len(converted) - len(batch)
+        if batch and not args.dry_run:
+            safe_kg_query(write_query, params={'rows': batch})
+        migrated += len(batch)
+        print(f"  {migrated} chunks {'checked' if args.dry_run else 'migrated'}, {skipped} skipped", end="\r")
+
+    if rebuild_index and not args.dry_run:
+        safe_kg_query(create_index_statement(index_dims))
+
+    print(f"\nDone: {migrated} chunks {'would be migrated' if args.dry_run else 'migrated'}, "
+          f"{skipped} skipped (truncated vector without an int8 copy; re-embed those)")
+    if args.to != EMBEDDING_STORAGE:
+        print(f"Set EMBEDDING_STORAGE={args.to} so new embeddings are written the same way")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Test script for Claude QA system
 """
 import sys
 import os
+import asyncio
 sys.path.append('.')
 
 from utils.knowledge_graph import setup_qa_system
@@ -17,7 +18,7 @@ def test_claude_qa():
         print("Testing question...")
         question = "Who is Priyanka Chopra?"
         
-        response = qa_system.invoke({"question": question})
+        response = asyncio.run(qa_system.ainvoke({"question": question}))
         
         print(f"Question: {question}")
         print(f"Answer: {response.get('answer', 'No answer')}")
@@ -4,6 +4,7 @@ Test script for URL endpoint functionality
 """
 import sys
 import os
+import asyncio
 
 # Add the current directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -14,7 +15,7 @@ def test_url_extraction():
         from utils.url_extractor import extract_text_from_url
         
         print("🧪 Testing URL extraction...")
-        text, metadata = extract_text_from_url('https://httpbin.org/html')
+        text, metadata = asyncio.run(extract_text_from_url('https://httpbin.org/html'))
         
         print(f"✅ URL extraction successful")
         print(f"   Text length: {len(text)} characters")
@@ -68,7 +69,7 @@ def test_url_processing_flow():
         
         # Step 1: Extract text
         print("   Step 1: Extracting text from URL...")
-        text_content, metadata = extract_text_from_url(test_url)
+        text_content, metadata = asyncio.run(extract_text_from_url(test_url))
         print(f"   ✅ Text extracted: {len(text_content)} characters")
         
         # Step 2: Generate filename
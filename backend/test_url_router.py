@@ -4,6 +4,7 @@ Test script for URL router endpoint logic
 """
 import sys
 import os
+import asyncio
 from urllib.parse import urlparse
 
 # Add the current directory to the path
@@ -99,7 +100,7 @@ def test_url_extraction():
         test_url = "https://httpbin.org/html"
         
         print(f"   Testing URL: {test_url}")
-        text_content, metadata = extract_text_from_url(test_url)
+        text_content, metadata = asyncio.run(extract_text_from_url(test_url))
         
         print(f"   ✅ Text extracted successfully")
         print(f"   Text length: {len(text_content)} characters")
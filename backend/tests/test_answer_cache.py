@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.answer_cache import AnswerCache, answer_cache, normalize_question
+from utils.file_events import file_changed
+
+
+RESULT = {
+    "status": "success",
+    "answer": "Forty-two",
+    "question": "What is the answer?",
+    "sources": [{"filename": "a.txt", "chunk_id": "u_a.txt_chunk_0"}],
+    "total_sources": 1,
+}
+
+
+class TestAnswerCache:
+
+    def test_normalized_exact_hit(self):
+        cache = AnswerCache()
+        scope = cache.scope("cache-user-1", ["b.txt", "a.txt"])
+        cache.set(scope, "What is the answer?", RESULT)
+
+        assert normalize_question("  WHAT is   the answer ") == "what is the answer"
+        hit = cache.get(cache.scope("cache-user-1", ["a.txt", "b.txt"]), "what is the  ANSWER")
+        assert hit["answer"] == "Forty-two"
+        assert hit["cache"] == "exact"
+        assert hit["question"] == "what is the  ANSWER"
+        # Other file selections and other users don't share answers
+        assert cache.get(cache.scope("cache-user-1", ["a.txt"]), "What is the answer?") is None
+        assert cache.get(cache.scope("cache-user-2", ["a.txt", "b.txt"]), "What is the answer?") is None
+
+    def test_near_duplicate_hit(self):
+        cache = AnswerCache(similarity=0.95)
+        scope = cache.scope("cache-user-3")
+        cache.set(scope, "What is the answer?", RESULT, question_embedding=[1.0, 0.0, 0.1])
+
+        assert cache.get_similar(scope, "Whats the answer", [0.99, 0.01, 0.1])["cache"] == "similar"
+        assert cache.get_similar(scope, "Who wrote it?", [0.0, 1.0, 0.0]) is None
+
+    def test_file_change_invalidates(self):
+        cache = AnswerCache()
+        on_a = cache.scope("cache-user-4", ["a.txt"])
+        on_b = cache.scope("cache-user-4", ["b.txt"])
+        on_all = cache.scope("cache-user-4")
+        for scope in (on_a, on_b, on_all):
+            cache.set(scope, "q", RESULT)
+
+        file_changed("cache-user-4", "a.txt")
+        cache.invalidate("cache-user-4", "a.txt")
+
+        assert len(cache) == 1
+        # New versions mean new scopes for everything that includes a.txt
+        assert cache.scope("cache-user-4", ["a.txt"]) != on_a
+        assert cache.scope("cache-user-4") != on_all
+        assert cache.scope("cache-user-4", ["b.txt"]) == on_b
+        assert cache.get(on_b, "q") is not None
+
+    def test_version_lookups_do_not_grow_and_deletes_drop_entries(self):
+        from utils import file_events
+
+        cache = AnswerCache()
+        sizes = (len(file_events._file_versions), len(file_events._user_versions), len(file_events._user_resets))
+        cache.scope("cache-user-6", [f"made-up-{i}.txt" for i in range(50)])
+        cache.scope("cache-user-7")
+        assert (len(file_events._file_versions), len(file_events._user_versions),
+                len(file_events._user_resets)) == sizes
+
+        file_changed("cache-user-6", "a.txt")
+        before = cache.scope("cache-user-6", ["a.txt"])
+        file_changed("cache-user-6", "a.txt", deleted=True)
+        assert ("cache-user-6", "a.txt") not in file_events._file_versions
+        # Re-uploading the deleted file doesn't bring back the old scope
+        file_changed("cache-user-6", "a.txt")
+        assert cache.scope("cache-user-6", ["a.txt"]) != before
+
+    def test_ask_question_served_from_cache_until_file_changes(self):
+        from utils.knowledge_graph import ask_question
+
+        answer_cache.clear()
+        with patch('utils.knowledge_graph.QA_CACHE_SIMILARITY', 2.0), \
+             patch('utils.knowledge_graph._answer_question', new=AsyncMock(return_value=dict(RESULT))) as mock_answer:
+            first = asyncio.run(ask_question("cache-user-5", "What is the answer?", ["a.txt"]))
+            second = asyncio.run(ask_question("cache-user-5", "what is the answer", ["a.txt"]))
+            file_changed("cache-user-5", "a.txt")
+            third = asyncio.run(ask_question("cache-user-5", "What is the answer?", ["a.txt"]))
+
+        assert "cache" not in first
+        assert second["cache"] == "exact"
+        assert "cache" not in third
+        assert mock_answer.await_count == 2
+        answer_cache.clear()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
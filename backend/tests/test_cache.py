@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache import TTLCache
+
+
+class TestTTLCache:
+
+    def test_lru_eviction_when_full(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")          # "b" is now least recently used
+        cache.set("c", 3)
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch("utils.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("utils.cache.time.monotonic", return_value=105.0):
+            assert cache.get("a") == 1
+        with patch("utils.cache.time.monotonic", return_value=111.0):
+            assert cache.get("a") is None
+            assert len(cache) == 0
+
+    def test_get_or_create_builds_once(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        calls = []
+        factory = lambda: calls.append(1) or "value"
+        assert cache.get_or_create("k", factory) == "value"
+        assert cache.get_or_create("k", factory) == "value"
+        assert len(calls) == 1
+
+
+class TestQASystemRegistry:
+
+    def test_setup_qa_system_reuses_retrievers(self):
+        """The same user/file selection gets the same retriever; a different one builds a new one"""
+        from utils import knowledge_graph
+
+        knowledge_graph._qa_system_registry.clear()
+        knowledge_graph._vector_store = None
+        with patch("langchain_community.vectorstores.Neo4jVector") as mock_vector, \
+             patch("utils.knowledge_graph.get_embeddings"), \
+             patch("utils.knowledge_graph.get_llm_client"), \
+             patch("utils.knowledge_graph.get_neo4j_connection"):
+            first = knowledge_graph.setup_qa_system("u1", ["b.txt", "a.txt"])
+            second = knowledge_graph.setup_qa_system("u1", ["a.txt", "b.txt"])
+            other = knowledge_graph.setup_qa_system("u1", ["a.txt"])
+
+        assert first is second
+        assert other is not first
+        # One vector store for everyone; user and files travel as query parameters
+        assert mock_vector.from_existing_index.call_count == 1
+        vector_store = mock_vector.from_existing_index.return_value
+        assert vector_store.as_retriever.call_count == 2
+        params = vector_store.as_retriever.call_args_list[0][1]["search_kwargs"]["params"]
+        assert params["user_id"] == "u1"
+        assert params["filenames"] == ["a.txt", "b.txt"]
+        knowledge_graph._qa_system_registry.clear()
+        knowledge_graph._vector_store = None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
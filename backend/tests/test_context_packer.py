@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import context_packer
+from utils.context_packer import pack_context, overlap_length, count_tokens
+from utils.knowledge_graph import split_text
+
+TEXT = " ".join(f"Sentence number {i} talks about topic {i % 7}." for i in range(600))
+
+
+def _chunks(filename, pieces, indices=None):
+    indices = indices if indices is not None else range(len(pieces))
+    return [{
+        "text": pieces[i],
+        "chunk_id": f"u_{filename}_chunk_{i}",
+        "filename": filename,
+        "section": f"u_{filename}_section_0",
+        "chunk_index": i,
+    } for i in indices]
+
+
+class TestOverlap:
+
+    def test_finds_split_text_overlap(self):
+        pieces = split_text(TEXT)
+        overlap = overlap_length(pieces[0], pieces[1])
+        assert overlap > 0
+        assert pieces[0].endswith(pieces[1][:overlap])
+
+    def test_unrelated_text_has_no_overlap(self):
+        assert overlap_length("alpha beta gamma delta epsilon", "zeta eta theta iota kappa lambda") == 0
+
+    def test_short_coincidences_are_ignored(self):
+        assert overlap_length("ends with the", "the start") == 0
+
+
+class TestCountTokens:
+
+    def test_unavailable_encoding_falls_back_for_good(self):
+        with patch.object(context_packer, "_encoding", None), patch.object(context_packer, "_encoding_loaded", False), \
+             patch("tiktoken.get_encoding", side_effect=OSError("offline")) as get_encoding:
+            assert count_tokens("a" * 40) == 10
+            assert count_tokens("b" * 8) == 2
+        get_encoding.assert_called_once()
+
+
+class TestPackContext:
+
+    def test_adjacent_chunks_merge_back_into_source_text(self):
+        pieces = split_text(TEXT)
+        # Retrieval order is by relevance, not position
+        chunks = [_chunks("a.txt", pieces)[i] for i in (2, 0, 1)]
+
+        packed = pack_context(chunks, budget=100000)
+
+        assert len(packed["passages"]) == 1
+        passage = packed["passages"][0]
+        assert passage["chunk_indices"] == [0, 1, 2]
+        assert passage["text"] in TEXT
+        assert packed["stats"]["tokens_saved"] > 0
+        assert packed["stats"]["tokens"] == count_tokens(passage["text"])
+
+    def test_passages_ordered_by_best_chunk(self):
+        pieces = split_text(TEXT)
+        a = _chunks("a.txt", pieces)
+        b = _chunks("b.txt", pieces)
+        chunks = [b[5], a[0], a[1], b[9]]
+
+        packed = pack_context(chunks, budget=100000)
+
+        assert [(p["filename"], p["chunk_indices"]) for p in packed["passages"]] == [
+            ("b.txt", [5]), ("a.txt", [0, 1]), ("b.txt", [9])]
+        assert packed["chunks"] == chunks
+
+    def test_budget_drops_least_relevant_chunks(self):
+        pieces = split_text(TEXT)
+        chunks = _chunks("a.txt", pieces, indices=[0, 4, 8])
+        one_chunk = count_tokens(pieces[0])
+
+        packed = pack_context(chunks, budget=int(one_chunk * 2.5))
+
+        assert [c["chunk_index"] for c in packed["chunks"]] == [0, 4]
+        assert packed["stats"]["chunks_dropped"] == 1
+        assert packed["stats"]["tokens"] <= int(one_chunk * 2.5)
+
+    def test_most_relevant_chunk_is_kept_over_budget(self):
+        packed = pack_context(_chunks("a.txt", ["word " * 200]), budget=10)
+        assert len(packed["chunks"]) == 1
+
+    def test_duplicates_and_unindexed_chunks(self):
+        chunks = [
+            {"text": "first document text", "chunk_id": "x", "filename": "a.txt", "chunk_index": None},
+            {"text": "first document text", "chunk_id": "x", "filename": "a.txt", "chunk_index": None},
+            {"text": "other document text", "chunk_id": "y", "filename": "a.txt", "chunk_index": "Unknown"},
+        ]
+
+        packed = pack_context(chunks, budget=1000)
+
+        assert [p["text"] for p in packed["passages"]] == ["first document text", "other document text"]
+        assert packed["stats"]["chunks_used"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,179 @@
+import pytest
+import asyncio
+import gzip
+from unittest.mock import patch, Mock
+import sys
+import os
+import httpx
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.crawler import Crawl, canonical_url, start_crawl, get_crawl, cancel_crawl, CrawlError
+from utils.http_fetch import Fetcher
+from utils.embeddings import create_embeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+
+
+def html(body, head=""):
+    return f"<html><head>{head}</head><body>{body}</body></html>".encode()
+
+
+SITE = {
+    "/robots.txt": (b"User-agent: *\nDisallow: /private\n", "text/plain"),
+    "/": (html('<p>Home page</p><a href="/a">a</a> <a href="/a#top">a again</a> <a href="/a?utm_source=x">a</a>'
+               '<a href="b">b</a> <a href="/private/x">private</a> <a href="https://other.example/">other</a>'
+               '<a href="/copy">copy</a> <a href="/manual.pdf">pdf</a> <a href="/draft">draft</a>'
+               '<a href="/print">print</a> <a href="/spam" rel="nofollow">spam</a>'), "text/html"),
+    "/a": (html('<p>Page A about solar panels</p><a href="/deep">deeper</a>'), "text/html"),
+    "/b": (html('<p>Page B about batteries</p>'), "text/html; charset=utf-8"),
+    "/copy": (html('<p>Page A about solar panels</p><a href="/deep">deeper</a>'), "text/html"),
+    "/manual.pdf": (b"%PDF-1.4", "application/pdf"),
+    "/draft": (html('<p>Draft</p>', '<meta name="robots" content="noindex">'), "text/html"),
+    "/print": (html('<p>Printable B</p>', '<link rel="canonical" href="/b">'), "text/html"),
+    "/deep": (html('<p>Deep page</p>'), "text/html"),
+    "/spam": (html('<p>Spam</p>'), "text/html"),
+}
+
+
+def site_handler(site, requested):
+    def handler(request):
+        requested.append(str(request.url))
+        if request.url.host != "docs.example":
+            return httpx.Response(404)
+        if request.url.path not in site:
+            return httpx.Response(404)
+        content, content_type = site[request.url.path]
+        return httpx.Response(200, content=content, headers={'content-type': content_type})
+    return handler
+
+
+def crawl(site=SITE, ingest=None, **kwargs):
+    requested = []
+    fetcher = Fetcher(transport=httpx.MockTransport(site_handler(site, requested)))
+    job = Crawl("crawl-1", "alice", fetcher=fetcher, ingest=ingest, **kwargs)
+    return asyncio.run(job.run()), requested
+
+
+@pytest.fixture
+def graph():
+    graph = InMemoryGraph()
+    with patch("utils.knowledge_graph.kg", graph), \
+         patch("utils.knowledge_graph._embeddings", create_embeddings("local", dimensions=32)):
+        yield graph
+
+
+class TestCanonicalUrl:
+
+    def test_normalization(self):
+        assert canonical_url("HTTPS://Docs.Example:443/a?b=2&a=1&utm_source=x#top") == "https://docs.example/a?a=1&b=2"
+        assert canonical_url("http://docs.example") == "http://docs.example/"
+        assert canonical_url("http://docs.example:8080/x") == "http://docs.example:8080/x"
+        assert canonical_url("mailto:someone@docs.example") is None
+
+
+class TestCrawl:
+
+    def test_seed_crawl(self, graph):
+        ingest = Mock(return_value={"status": "success", "chunks": 1})
+        status, requested = crawl(ingest=ingest, urls=["https://docs.example/"], max_depth=1)
+
+        ingested = {call.kwargs['original_url'] for call in ingest.call_args_list}
+        assert ingested == {"https://docs.example/", "https://docs.example/a", "https://docs.example/b"}
+        assert status['status'] == "done"
+        assert {key: status[key] for key in ("ingested", "duplicate", "robots", "noindex", "skipped", "failed")} == {
+            'ingested': 3, 'duplicate': 2, 'robots': 1, 'noindex': 1, 'skipped': 1, 'failed': 0}
+        # Each page fetched once; depth, domain, robots.txt and nofollow respected
+        assert len(requested) == len(set(requested))
+        assert not any(url.endswith(("/deep", "/private/x", "/spam")) or "other.example" in url for url in requested)
+
+    def test_page_limit(self, graph):
+        ingest = Mock(return_value={"status": "success", "chunks": 1})
+        status, _ = crawl(ingest=ingest, urls=["https://docs.example/"], max_depth=2, max_pages=3)
+        assert status['pages'] == 3 and status['truncated']
+
+    def test_sitemaps(self, graph):
+        site = dict(SITE)
+        site["/sitemap_index.xml"] = (b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                                      b'<sitemap><loc>https://docs.example/pages.xml.gz</loc></sitemap></sitemapindex>',
+                                      "application/xml")
+        site["/pages.xml.gz"] = (gzip.compress(b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                                               b'<url><loc>https://docs.example/a</loc></url>'
+                                               b'<url><loc>https://docs.example/deep</loc></url></urlset>'),
+                                 "application/gzip")
+        ingest = Mock(return_value={"status": "success", "chunks": 1})
+        status, _ = crawl(site, ingest=ingest, sitemaps=["https://docs.example/sitemap_index.xml"])
+        assert {call.kwargs['original_url'] for call in ingest.call_args_list} == {
+            "https://docs.example/a", "https://docs.example/deep"}
+        assert status['errors'] == []
+
+    def test_unreachable_robots_disallows_everything(self, graph):
+        site = {path: page for path, page in SITE.items() if path != "/robots.txt"}
+
+        def handler(request):
+            if request.url.path == "/robots.txt":
+                return httpx.Response(503)
+            return site_handler(site, [])(request)
+
+        ingest = Mock()
+        job = Crawl("crawl-2", "alice", urls=["https://docs.example/"], ingest=ingest,
+                    fetcher=Fetcher(transport=httpx.MockTransport(handler)))
+        status = asyncio.run(job.run())
+        assert status['robots'] == 1
+        ingest.assert_not_called()
+
+    def test_stored_text_is_not_ingested_again(self, graph):
+        first, _ = crawl(urls=["https://docs.example/a", "https://docs.example/b"])
+        assert first['ingested'] == 2 and first['chunks'] >= 2
+        assert graph.files[("alice", "url_docs.example__a.txt")]['original_url'] == "https://docs.example/a"
+
+        chunks = dict(graph.chunks)
+        second, _ = crawl(urls=["https://docs.example/a", "https://docs.example/b"])
+        assert (second['ingested'], second['duplicate']) == (0, 2)
+        assert graph.chunks == chunks
+
+    def test_changed_page_keeps_its_stored_filename(self, graph):
+        """A URL stored under an older naming scheme is replaced, not stored a second time"""
+        url = "https://docs.example/a?lang=en"
+        graph.users["alice"] = {}
+        graph.files[("alice", "url_docs.example__a.txt")] = {'original_url': url, 'total_chunks': 0}
+        site = dict(SITE)
+        site["/a"] = (html('<p>Page A, now about wind turbines</p>'), "text/html")
+
+        status, _ = crawl(site, urls=[url])
+        assert status['ingested'] == 1
+        assert [name for (user_id, name), props in graph.files.items() if props.get('original_url') == url] == [
+            "url_docs.example__a.txt"]
+
+
+class TestStartCrawl:
+
+    def test_validation(self):
+        with pytest.raises(CrawlError):
+            start_crawl("alice")
+        with pytest.raises(CrawlError):
+            start_crawl("alice", urls=["ftp://docs.example/"])
+        with pytest.raises(CrawlError):
+            start_crawl("alice", urls=["https://docs.example/"], max_depth=99)
+
+    def test_cancel(self, graph):
+        async def slow(request):
+            await asyncio.sleep(10)
+            return httpx.Response(200)
+
+        async def run():
+            with patch("utils.crawler.get_fetcher", return_value=Fetcher(transport=httpx.MockTransport(slow))):
+                crawl_id = start_crawl("alice", urls=["https://docs.example/"])['crawl_id']
+                await asyncio.sleep(0.05)
+                assert get_crawl(crawl_id)['status'] == "running"
+                assert cancel_crawl(crawl_id)
+                await asyncio.sleep(0.05)
+            return get_crawl(crawl_id)
+
+        status = asyncio.run(run())
+        assert status['status'] == "cancelled"
+        assert not cancel_crawl(status['crawl_id'])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,231 @@
+import pytest
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_jobs import EmbeddingJobs, EmbeddingJobError, RateLimiter, JobCancelled, embed_batch
+from utils.embeddings import create_embeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+
+
+def make_graph():
+    graph = InMemoryGraph()
+    for i in range(7):
+        graph.chunks[f"a-{i}"] = {'text': f"alpha chunk {i}", 'user_id': "alice"}
+    for i in range(3):
+        graph.chunks[f"b-{i}"] = {'text': f"beta chunk {i}", 'user_id': "bob"}
+    return graph
+
+
+class CountingEmbeddings:
+    """Local embedder that records the texts it embeds and can fail or cancel on a given call"""
+    def __init__(self, on_call=None):
+        self.inner = create_embeddings("local")
+        self.texts = []
+        self.on_call = on_call
+
+    def embed_documents(self, texts):
+        if self.on_call:
+            self.on_call(len(self.texts))
+        self.texts.extend(texts)
+        return self.inner.embed_documents(texts)
+
+
+@pytest.fixture
+def graph():
+    graph = make_graph()
+    with patch("utils.knowledge_graph.kg", graph), \
+         patch("utils.embedding_jobs.embeddings_available", return_value=True), \
+         patch("utils.embedding_jobs.file_changed") as changed:
+        graph.file_changed = changed
+        yield graph
+
+
+def run_with(graph, embeddings, jobs, job):
+    with patch("utils.knowledge_graph._embeddings", embeddings):
+        return jobs.run(job)
+
+
+class TestEmbeddingJobs:
+
+    def test_tenant_job_pages_and_checkpoints(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter(), page_size=3, batch_size=2)
+        embeddings = CountingEmbeddings()
+
+        job = run_with(graph, embeddings, jobs, jobs.create("alice", "alice"))
+
+        assert job['status'] == "done"
+        assert job['done'] == job['total'] == 7
+        assert len(embeddings.texts) == 7
+        assert all(graph.chunks[f"a-{i}"].get('textEmbedding') for i in range(7))
+        assert all(graph.chunks[f"b-{i}"].get('textEmbedding') is None for i in range(3))
+        assert jobs.get(job['id'])['cursor'] == "a-6"
+        graph.file_changed.assert_called_once_with("alice")
+
+    def test_only_missing_unless_forced(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        run_with(graph, CountingEmbeddings(), jobs, jobs.create("alice", "alice"))
+
+        embeddings = CountingEmbeddings()
+        assert run_with(graph, embeddings, jobs, jobs.create("admin", None))['done'] == 3
+        forced = run_with(graph, CountingEmbeddings(), jobs, jobs.create("admin", None, force=True))
+        assert forced['done'] == 10
+
+    def test_cancel_and_resume(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter(), page_size=3, batch_size=2)
+        job = jobs.create("alice", "alice")
+        embeddings = CountingEmbeddings(on_call=lambda embedded: embedded == 2 and jobs.cancel(job['id']))
+
+        cancelled = run_with(graph, embeddings, jobs, job)
+        assert cancelled['status'] == "cancelled"
+        assert cancelled['done'] == 3
+        assert jobs.get(job['id'])['cursor'] == "a-2"
+
+        embeddings = CountingEmbeddings()
+        resumed = run_with(graph, embeddings, jobs, jobs.prepare_resume(job['id']))
+        assert resumed['status'] == "done"
+        assert resumed['done'] == 7
+        assert embeddings.texts == [f"alpha chunk {i}" for i in range(3, 7)]
+
+    def test_failed_job_keeps_checkpoint(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter(), page_size=10, batch_size=3)
+        job = jobs.create("alice", "alice")
+
+        def fail_second_batch(embedded):
+            if embedded == 3:
+                raise RuntimeError("provider down")
+
+        with pytest.raises(RuntimeError):
+            run_with(graph, CountingEmbeddings(on_call=fail_second_batch), jobs, job)
+
+        stored = jobs.get(job['id'])
+        assert stored['status'] == "failed"
+        assert stored['error'] == "provider down"
+        assert stored['done'] == 3
+        resumed = jobs.prepare_resume(job['id'])
+        # The job resumes with the embedding version it started with
+        assert resumed['version'] == stored['version']
+        assert run_with(graph, CountingEmbeddings(), jobs, resumed)['done'] == 7
+
+    def test_done_job_is_not_resumable(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        job = run_with(graph, CountingEmbeddings(), jobs, jobs.create("alice", "alice"))
+
+        with pytest.raises(EmbeddingJobError):
+            jobs.prepare_resume(job['id'])
+
+    def test_overlapping_jobs_are_refused(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        jobs._active["running"] = (threading.Event(), "alice")
+
+        with pytest.raises(EmbeddingJobError):
+            jobs.create("alice", "alice")
+        with pytest.raises(EmbeddingJobError):
+            jobs.create("admin", None)
+        assert jobs.create("bob", "bob")['status'] == "queued"
+
+    def test_job_refused_at_start_is_not_left_queued(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        job = jobs.create("alice", "alice")
+        # Claimed by another request between create() and start()
+        jobs._active["running"] = (threading.Event(), None)
+
+        with pytest.raises(EmbeddingJobError):
+            jobs.start(job)
+        stored = jobs.get(job['id'])
+        assert (stored['status'], stored['active']) == ("failed", False)
+        assert "already running" in stored['error']
+
+    def test_background_job_publishes_progress(self, graph):
+        from utils.progress import progress_bus
+
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        with patch("utils.knowledge_graph._embeddings", CountingEmbeddings()):
+            job = jobs.create("bob", "bob")
+            jobs.start(job).join(timeout=5)
+
+        assert progress_bus.latest("bob", job['id'])['status'] == "done"
+        assert jobs.list("bob")[0]['status'] == "done"
+
+
+class TestRateLimits:
+
+    def test_request_and_token_buckets(self):
+        now = [0.0]
+        limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=600, clock=lambda: now[0])
+
+        assert limiter.reserve(100) == 0
+        assert limiter.reserve(100) == 0
+        assert limiter.reserve(100) == pytest.approx(30)
+        now[0] = 30
+        assert limiter.reserve(500) == 0
+        now[0] = 45
+        assert limiter.reserve(500) == pytest.approx(25)
+
+    def test_acquire_is_cancellable(self):
+        limiter = RateLimiter(requests_per_minute=1)
+        limiter.reserve(0)
+        cancelled = threading.Event()
+        cancelled.set()
+
+        with pytest.raises(JobCancelled):
+            limiter.acquire(0, cancelled)
+
+    def test_rate_limited_batch_is_retried(self):
+        error = RuntimeError("429")
+        error.status_code = 429
+        error.response = SimpleNamespace(headers={'retry-after': "0"})
+        calls = []
+
+        class Flaky:
+            def embed_documents(self, texts):
+                calls.append(texts)
+                if len(calls) == 1:
+                    raise error
+                return [[1.0] for _ in texts]
+
+        assert embed_batch(Flaky(), ["a", "b"], RateLimiter()) == [[1.0], [1.0]]
+        assert len(calls) == 2
+
+    def test_other_errors_are_not_retried(self):
+        class Broken:
+            def embed_documents(self, texts):
+                raise ValueError("bad input")
+
+        with pytest.raises(ValueError):
+            embed_batch(Broken(), ["a"], RateLimiter())
+
+
+class TestEmbeddingJobEndpoints:
+
+    def test_all_users_requires_admin(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from routers.knowledge_graph import router, get_current_user
+
+        app = FastAPI()
+        app.include_router(router, prefix="/knowledge-graph")
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": "someone"}
+        with patch("environment.ENV", "prod"), patch("environment.ADMIN_USER_IDS", {"admin"}):
+            response = TestClient(app).post("/knowledge-graph/regenerate-embeddings?all_users=true")
+        assert response.status_code == 403
+
+    def test_unknown_job(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from routers.knowledge_graph import router, get_current_user
+
+        app = FastAPI()
+        app.include_router(router, prefix="/knowledge-graph")
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": "someone"}
+        with patch("utils.knowledge_graph.kg", InMemoryGraph()):
+            assert TestClient(app).get("/knowledge-graph/embedding-jobs/nope").status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
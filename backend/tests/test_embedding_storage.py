@@ -0,0 +1,105 @@
+import pytest
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_storage import (
+    bytes_per_chunk, dequantize_int8, embedding_kwargs, index_vector, quantize_int8, rescore,
+    storage_params, supports_dimensions,
+)
+
+
+class TestQuantization:
+    def test_int8_round_trip_keeps_direction(self):
+        vector = np.random.default_rng(0).normal(size=1536)
+        data, scale = quantize_int8(vector)
+        restored = dequantize_int8(data, scale)
+
+        assert len(data) == 1536
+        cosine = restored @ vector / (np.linalg.norm(restored) * np.linalg.norm(vector))
+        assert cosine > 0.999
+
+    def test_zero_vector(self):
+        data, scale = quantize_int8([0.0] * 4)
+        assert scale == 1.0
+        assert dequantize_int8(data, scale).tolist() == [0.0] * 4
+
+
+class TestIndexVector:
+    def test_truncates_and_renormalizes(self):
+        vector = [3.0, 4.0, 12.0]
+        assert index_vector(vector, 2) == pytest.approx([0.6, 0.8])
+
+    def test_full_dimension_is_unchanged(self):
+        assert index_vector([1.0, 2.0], 4) == pytest.approx([1.0, 2.0])
+
+
+class TestStorageParams:
+    def test_float32_writes_plain_vector(self):
+        params = storage_params([0.5, -0.5], "float32")
+        assert params == {'embedding': [0.5, -0.5], 'embedding_q': None, 'embedding_scale': None}
+
+    def test_int8_writes_index_vector_and_quantized_copy(self, monkeypatch):
+        monkeypatch.setattr("utils.embedding_storage.EMBEDDING_INDEX_DIMENSIONS", 2)
+        params = storage_params([3.0, 4.0, 12.0, 0.0], "int8")
+
+        assert params['embedding'] == pytest.approx([0.6, 0.8])
+        assert len(params['embedding_q']) == 4
+        assert dequantize_int8(params['embedding_q'], params['embedding_scale']) == pytest.approx(
+            [3.0, 4.0, 12.0, 0.0], abs=0.1)
+
+    def test_bytes_per_chunk(self):
+        assert bytes_per_chunk("float64", 1536) == 12288
+        assert bytes_per_chunk("float32", 1536) == 6144
+        assert bytes_per_chunk("int8", 1536, 512) == 4 * 512 + 1536 + 8
+
+    def test_dimensions_only_for_text_embedding_3(self):
+        assert not supports_dimensions("text-embedding-ada-002")
+        assert supports_dimensions("text-embedding-3-small")
+        assert "dimensions" not in embedding_kwargs() or supports_dimensions()
+
+
+class TestRescore:
+    def _candidate(self, chunk_id, full, score, index_dims=2):
+        data, scale = quantize_int8(full)
+        return {'chunk_id': chunk_id, 'score': score, 'embedding': index_vector(full, index_dims),
+                'embedding_q': data, 'embedding_scale': scale}
+
+    def test_reorders_by_full_dimension_similarity(self):
+        question = [1.0, 0.0, 1.0, 0.0]
+        # Identical leading dimensions, so the truncated index cannot tell them apart
+        candidates = [
+            self._candidate("wrong", [1.0, 0.0, -1.0, 0.0], 0.9),
+            self._candidate("right", [1.0, 0.0, 1.0, 0.0], 0.9),
+        ]
+
+        rescored = rescore(candidates, question)
+
+        assert [c['chunk_id'] for c in rescored] == ["right", "wrong"]
+        assert rescored[0]['score'] == pytest.approx(1.0, abs=0.01)
+        assert len(rescored[0]['embedding']) == 4
+        assert 'embedding_q' not in rescored[0]
+
+    def test_without_rerank_keeps_order_and_scores(self):
+        candidates = [
+            self._candidate("a", [1.0, 0.0, -1.0, 0.0], 0.033),
+            self._candidate("b", [1.0, 0.0, 1.0, 0.0], 0.016),
+        ]
+
+        rescored = rescore(candidates, [1.0, 0.0, 1.0, 0.0], rerank=False)
+
+        assert [(c['chunk_id'], c['score']) for c in rescored] == [("a", 0.033), ("b", 0.016)]
+        assert len(rescored[1]['embedding']) == 4
+
+    def test_pads_truncated_vectors_without_quantized_copy(self):
+        rescored = rescore([{'chunk_id': "a", 'score': 0.8, 'embedding': [0.6, 0.8]}], [1.0, 0.0, 0.0])
+
+        assert list(rescored[0]['embedding']) == pytest.approx([0.6, 0.8, 0.0])
+        assert rescored[0]['score'] == 0.8
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
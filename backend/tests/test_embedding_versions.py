@@ -0,0 +1,152 @@
+import pytest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import embedding_versions
+from utils.embedding_versions import (get_version, active_version, switch_version, collect_garbage,
+                                      EmbeddingVersionError, InvalidEmbeddingVersion)
+from utils.embedding_jobs import EmbeddingJobs, RateLimiter
+from utils.embeddings import create_embeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+
+LEGACY = "local:hashing:64"
+NEW = "local:hashing:32"
+
+
+def make_graph():
+    """alice and bob on the legacy version (no version recorded), three chunks each"""
+    graph = InMemoryGraph()
+    for user_id in ("alice", "bob"):
+        graph.users[user_id] = {}
+        graph.files[(user_id, "notes.txt")] = {'total_chunks': 3}
+        for i, text in enumerate(["solar panels and batteries", "tax forms for 2023", "hiking trails nearby"]):
+            add_chunk(graph, user_id, i, text)
+    return graph
+
+
+def add_chunk(graph, user_id, index, text):
+    chunk_id = f"{user_id}_notes.txt_chunk_{index}"
+    graph.chunks[chunk_id] = {'id': chunk_id, 'text': text, 'user_id': user_id, 'filename': "notes.txt",
+                              'section': f"{user_id}_notes.txt_section_0", 'chunk_index': index}
+    graph.file_chunks[(user_id, "notes.txt")].append(chunk_id)
+
+
+@pytest.fixture
+def graph():
+    """Versions enabled: textEmbedding holds 64-dim vectors, the configured model is 32-dim"""
+    graph = make_graph()
+    embedding_versions._active.clear()
+    with patch("utils.knowledge_graph.kg", graph), \
+         patch("utils.knowledge_graph._embeddings", create_embeddings("local", dimensions=32)), \
+         patch.dict(embedding_versions._versions, clear=True), \
+         patch("utils.embedding_versions.VERSIONING_ENABLED", True), \
+         patch("utils.embedding_versions.LEGACY_VERSION_ID", LEGACY), \
+         patch("utils.embedding_versions.DEFAULT_VERSION_ID", NEW), \
+         patch("utils.embedding_versions.file_changed") as changed, \
+         patch("utils.embedding_jobs.file_changed"), \
+         patch("utils.retrieval.cached_vector_search", return_value=None):
+        graph.file_changed = changed
+        EmbeddingJobs(limiter=RateLimiter()).run(
+            EmbeddingJobs(limiter=RateLimiter()).create("admin", version=LEGACY))
+        yield graph
+    embedding_versions._active.clear()
+
+
+def retrieve(user_id, question):
+    from utils.retrieval import retrieve_chunks
+    version = active_version(user_id)
+    embedding = version.embeddings().embed_query(question)
+    return retrieve_chunks(user_id, embedding, k=1, strategy="none", mode="vector", window=0)
+
+
+class TestEmbeddingVersions:
+
+    def test_version_ids(self, graph):
+        legacy, new = get_version(LEGACY), get_version(NEW)
+        assert (legacy.embedding_property, legacy.index_name) == ("textEmbedding", "pdf_chunks")
+        assert new.embedding_property == "embedding_local_hashing_32"
+        assert new.index_name == "chunk_vectors_local_hashing_32"
+        assert new.index_dims("float32") == 32
+        for bad in ("local:hashing", "word2vec:m:8", "openai:text-embedding-3-small:0", "local:other:8"):
+            with pytest.raises(InvalidEmbeddingVersion):
+                get_version(bad)
+
+    def test_disabled_versions_skip_the_lookup(self):
+        kg = Mock()
+        with patch("utils.knowledge_graph.kg", kg), patch("utils.embedding_versions.VERSIONING_ENABLED", False):
+            assert active_version("anyone").id == embedding_versions.DEFAULT_VERSION_ID
+        kg.query.assert_not_called()
+
+    def test_new_users_start_on_the_default_version(self, graph):
+        from utils.knowledge_graph import create_or_get_user
+        create_or_get_user("carol")
+        assert active_version("carol", fresh=True).id == NEW
+        assert active_version("alice").id == LEGACY
+
+    def test_backfill_switch_and_gc(self, graph):
+        jobs = EmbeddingJobs(limiter=RateLimiter())
+        jobs.run(jobs.create("admin", "alice", version=NEW))
+
+        # Backfilled next to the legacy vectors; questions still use the legacy version
+        chunk = graph.chunks["alice_notes.txt_chunk_0"]
+        assert len(chunk['textEmbedding']) == 64 and len(chunk['embedding_local_hashing_32']) == 32
+        assert active_version("alice").id == LEGACY
+        assert retrieve("alice", "batteries")[0]['chunk_id'] == "alice_notes.txt_chunk_0"
+
+        # An upload since the backfill blocks the switch until it is embedded too
+        add_chunk(graph, "alice", 3, "garden tomatoes")
+        with pytest.raises(EmbeddingVersionError):
+            switch_version("alice", NEW, catch_up=False)
+        assert active_version("alice", fresh=True).id == LEGACY
+
+        result = switch_version("alice", NEW)
+        assert result == {'user_id': "alice", 'version': NEW, 'previous': LEGACY, 'switched': True}
+        assert active_version("alice").id == NEW
+        graph.file_changed.assert_called_with("alice")
+        assert retrieve("alice", "tomatoes")[0]['chunk_id'] == "alice_notes.txt_chunk_3"
+        assert retrieve("bob", "tax forms")[0]['chunk_id'] == "bob_notes.txt_chunk_1"
+
+        # bob is still on the legacy version, so only alice's legacy vectors go
+        assert collect_garbage(LEGACY, settle_seconds=0) == {
+            'version': LEGACY, 'cleared': 3, 'remaining': 3, 'index_dropped': False}
+        assert "textEmbedding" not in chunk
+        assert retrieve("bob", "tax forms")[0]['chunk_id'] == "bob_notes.txt_chunk_1"
+
+        jobs.run(jobs.create("admin", "bob", version=NEW))
+        switch_version("bob", NEW)
+        assert collect_garbage(LEGACY, settle_seconds=0)['index_dropped']
+        assert not any("textEmbedding" in c for c in graph.chunks.values())
+
+    def test_recent_switches_are_not_collected(self, graph):
+        switch_version("alice", NEW)
+        assert collect_garbage(LEGACY)['cleared'] == 0
+
+    def test_default_version_is_not_collected(self, graph):
+        with pytest.raises(EmbeddingVersionError):
+            collect_garbage(NEW)
+
+
+class TestEmbeddingVersionEndpoints:
+
+    def test_invalid_version_is_rejected(self, graph):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from routers.knowledge_graph import router, get_current_user
+
+        app = FastAPI()
+        app.include_router(router, prefix="/knowledge-graph")
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": "admin"}
+        client = TestClient(app)
+        with patch("environment.ADMIN_USER_IDS", {"admin"}):
+            assert client.post("/knowledge-graph/admin/embedding-versions/switch?version=nope&user_id=alice").status_code == 400
+            assert client.post(f"/knowledge-graph/admin/embedding-versions/gc?version={NEW}").status_code == 409
+            status = client.get("/knowledge-graph/admin/embedding-versions").json()
+        assert {v['id']: v['tenants'] for v in status['versions']} == {NEW: 0, LEGACY: 2}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embeddings import HashingEmbeddings, InstrumentedEmbeddings, create_embeddings, embeddings_available
+
+
+class TestHashingEmbeddings:
+
+    def test_deterministic_and_normalized(self):
+        embeddings = HashingEmbeddings(dimensions=64)
+        first = embeddings.embed_query("Neo4j stores the knowledge graph")
+        second = HashingEmbeddings(dimensions=64).embed_documents(["Neo4j stores the knowledge graph"])[0]
+
+        assert len(first) == 64
+        assert first == second
+        assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-5)
+
+    def test_shared_words_are_closer(self):
+        embeddings = HashingEmbeddings(dimensions=256)
+        query, related, unrelated = np.array(embeddings.embed_documents([
+            "How is the vector index created?",
+            "The vector index is created on Chunk.textEmbedding",
+            "Bananas are rich in potassium",
+        ]))
+
+        assert query @ related > query @ unrelated
+
+    def test_empty_text_is_zero_vector(self):
+        assert HashingEmbeddings(dimensions=8).embed_query("") == [0.0] * 8
+
+    def test_async_matches_sync(self):
+        embeddings = HashingEmbeddings(dimensions=32)
+        assert asyncio.run(embeddings.aembed_query("graph")) == embeddings.embed_query("graph")
+
+
+class TestInstrumentedEmbeddings:
+
+    def test_batches_and_counts_throughput(self):
+        wrapped = InstrumentedEmbeddings(HashingEmbeddings(dimensions=16), "local", batch_size=2)
+        with patch.object(wrapped.provider, "embed_documents", wraps=wrapped.provider.embed_documents) as inner:
+            vectors = wrapped.embed_documents(["a b", "c d", "e f", "g h", "i j"])
+
+        assert len(vectors) == 5
+        assert [len(call.args[0]) for call in inner.call_args_list] == [2, 2, 1]
+        stats = wrapped.stats()
+        assert stats["requests"] == 3
+        assert stats["texts"] == 5
+        assert stats["chars"] == 15
+        assert stats["texts_per_second"] > 0
+
+    def test_async_batches(self):
+        wrapped = InstrumentedEmbeddings(HashingEmbeddings(dimensions=16), "local", batch_size=3)
+        vectors = asyncio.run(wrapped.aembed_documents(["one", "two", "three", "four"]))
+
+        assert vectors == wrapped.provider.embed_documents(["one", "two", "three", "four"])
+        assert wrapped.stats()["requests"] == 2
+
+
+class TestProviderSelection:
+
+    def test_local_provider(self):
+        embeddings = create_embeddings("local", batch_size=8)
+        assert isinstance(embeddings.provider, HashingEmbeddings)
+        assert embeddings_available("local")
+
+    def test_openai_needs_key(self):
+        with patch("utils.embeddings.OPENAI_API_KEY", " "):
+            assert not embeddings_available("openai")
+
+    def test_unknown_provider(self):
+        with pytest.raises(ValueError):
+            create_embeddings("word2vec")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import gzip
+import zlib
+import sys
+import os
+import httpx
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import http_fetch
+from utils.http_fetch import Fetcher, FetchError, ContentTooLarge
+
+MB = 1024 * 1024
+
+
+async def network(data, chunk_size=64 * 1024):
+    """Body delivered in chunks, as from a socket (bytes content would be decoded up front)"""
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+def fetch(handler, url, max_bytes=MB, **kwargs):
+    async def run():
+        async with Fetcher(transport=httpx.MockTransport(handler), **kwargs) as fetcher:
+            return await fetcher.fetch(url, max_bytes=max_bytes)
+    return asyncio.run(run())
+
+
+class TestFetcher:
+
+    def test_gzip_is_decoded(self):
+        page = b"<p>" + b"hello " * 1000 + b"</p>"
+        handler = lambda request: httpx.Response(200, content=network(gzip.compress(page)), headers={
+            'content-encoding': "gzip", 'content-type': "text/html; charset=utf-8"})
+        result = fetch(handler, "https://example.com/")
+        assert result['content'] == page and result['size'] == len(page)
+        assert result['encoding'] == "utf-8"
+
+    def test_deflate_with_and_without_zlib_header(self):
+        page = b"<p>" + b"deflated " * 1000 + b"</p>"
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        bodies = {"/zlib": zlib.compress(page), "/raw": raw.compress(page) + raw.flush()}
+        handler = lambda request: httpx.Response(200, content=network(bodies[request.url.path], chunk_size=256),
+                                                 headers={'content-encoding': "deflate"})
+        assert fetch(handler, "https://example.com/zlib")['content'] == page
+        assert fetch(handler, "https://example.com/raw")['content'] == page
+
+    def test_compression_bomb_stops_at_the_limit(self):
+        bomb = gzip.compress(b"\0" * (64 * MB))
+        assert len(bomb) < MB
+        handler = lambda request: httpx.Response(200, content=network(bomb), headers={'content-encoding': "gzip"})
+        with pytest.raises(ContentTooLarge):
+            fetch(handler, "https://example.com/bomb")
+
+    def test_declared_length_is_rejected_before_reading(self):
+        read = []
+
+        async def body():
+            read.append(1)
+            yield b"x"
+
+        handler = lambda request: httpx.Response(200, content=body(), headers={'content-length': str(2 * MB)})
+        with pytest.raises(ContentTooLarge):
+            fetch(handler, "https://example.com/big")
+        assert read == []
+
+    def test_redirects_report_the_final_url(self):
+        def handler(request):
+            if request.url.path == "/old":
+                return httpx.Response(301, headers={'location': "https://example.com/new"})
+            return httpx.Response(200, content=b"moved")
+        assert fetch(handler, "https://example.com/old")['url'] == "https://example.com/new"
+
+    def test_errors(self):
+        with pytest.raises(FetchError, match="HTTP 404"):
+            fetch(lambda request: httpx.Response(404), "https://example.com/missing")
+        with pytest.raises(FetchError, match="Invalid URL"):
+            fetch(lambda request: httpx.Response(200), "ftp://example.com/file")
+
+    def test_per_host_concurrency(self):
+        active, peak = {}, {}
+
+        async def handler(request):
+            host = request.url.host
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return httpx.Response(200, content=b"ok")
+
+        async def run():
+            async with Fetcher(max_per_host=2, transport=httpx.MockTransport(handler)) as fetcher:
+                urls = [f"https://{host}/{i}" for host in ("a.example", "b.example") for i in range(6)]
+                results = await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+                # Idle hosts keep no semaphore, so a long crawl doesn't accumulate them
+                return results, dict(fetcher._host_slots)
+
+        results, slots = asyncio.run(run())
+        assert len(results) == 12
+        assert peak == {'a.example': 2, 'b.example': 2}
+        assert slots == {}
+
+
+
+class TestSharedFetcher:
+
+    def test_closed_when_its_loop_ends(self):
+        """A new loop gets a new fetcher, and the previous one's pool is already closed"""
+        async def use():
+            fetcher = http_fetch.get_fetcher()
+            assert http_fetch.get_fetcher() is fetcher
+            return fetcher, fetcher.client
+
+        first, first_client = asyncio.run(use())
+        second, second_client = asyncio.run(use())
+        assert second is not first
+        assert first_client.is_closed and second_client.is_closed
+        asyncio.run(http_fetch.shutdown_fetcher())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
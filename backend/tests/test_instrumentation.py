@@ -0,0 +1,161 @@
+import pytest
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.instrumentation import record_stage_timings, timed_stage
+from utils.embeddings import create_embeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+from benchmarks.llm_replay import ReplayLLMClient, MISS_ANSWER
+
+
+class TestStageTimings:
+
+    def test_records_only_inside_context(self):
+        with timed_stage("split"):
+            pass
+
+        with record_stage_timings() as timings:
+            with timed_stage("split"):
+                pass
+            with timed_stage("split"):
+                with timed_stage("embed"):
+                    pass
+
+        assert timings["split"]["calls"] == 2
+        assert timings["embed"]["calls"] == 1
+        assert timings["split"]["seconds"] >= timings["embed"]["seconds"]
+
+    def test_records_when_stage_raises(self):
+        with record_stage_timings() as timings:
+            with pytest.raises(ValueError):
+                with timed_stage("extract"):
+                    raise ValueError("bad file")
+
+        assert timings["extract"]["calls"] == 1
+
+    def test_decorator(self):
+        @timed_stage("ocr")
+        def ocr():
+            return "text"
+
+        with record_stage_timings() as timings:
+            assert ocr() == "text"
+            ocr()
+
+        assert timings["ocr"]["calls"] == 2
+
+
+class TestIngestionOffline:
+
+    def test_text_file_ingests_end_to_end(self):
+        """Extract, split, graph write and embed against the in-memory graph and local embedder"""
+        from utils.knowledge_graph import create_file_knowledge_graph
+
+        graph = InMemoryGraph()
+        text = " ".join(f"Paragraph {i} about invoices and warranties." for i in range(300))
+
+        with patch("utils.knowledge_graph.kg", graph), \
+             patch("utils.knowledge_graph._embeddings", create_embeddings("local")), \
+             patch("utils.knowledge_graph.embeddings_available", return_value=True), \
+             record_stage_timings() as timings:
+            result = create_file_knowledge_graph("u", "doc.txt", text.encode("utf-8"))
+
+        assert result["status"] == "success"
+        assert len(graph.chunks) == result["chunks"] > 1
+        assert all(chunk["textEmbedding"] is not None for chunk in graph.chunks.values())
+        assert len(graph.next_edges) == result["chunks"] - 1
+        assert set(timings) == {"extract", "split", "graph_write", "embed"}
+
+    def test_same_filename_is_linked_per_user(self):
+        """NEXT edges never join chunks of two users' files with the same name"""
+        from utils.knowledge_graph import create_file_knowledge_graph
+
+        graph = InMemoryGraph()
+        text = " ".join(f"Paragraph {i} about invoices and warranties." for i in range(300))
+
+        with patch("utils.knowledge_graph.kg", graph), \
+             patch("utils.knowledge_graph._embeddings", create_embeddings("local")), \
+             patch("utils.knowledge_graph.embeddings_available", return_value=True):
+            first = create_file_knowledge_graph("u1", "doc.txt", text.encode("utf-8"))
+            second = create_file_knowledge_graph("u2", "doc.txt", text.encode("utf-8"))
+
+        assert len(graph.next_edges) == first["chunks"] - 1 + second["chunks"] - 1
+        assert all(graph.chunks[a]["user_id"] == graph.chunks[b]["user_id"] for a, b in graph.next_edges)
+
+
+class TestReplayLLMClient:
+
+    def _upstream(self, text):
+        upstream = SimpleNamespace(messages=SimpleNamespace(create=AsyncMock(return_value=SimpleNamespace(
+            content=[SimpleNamespace(text=text)], usage=SimpleNamespace(input_tokens=10, output_tokens=3)))))
+        return upstream
+
+    def test_record_then_replay(self, tmp_path):
+        cassette = str(tmp_path / "qa.json")
+        request = {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "hi"}]}
+
+        recorder = ReplayLLMClient(cassette, mode="record", upstream=self._upstream("hello"))
+        asyncio.run(recorder.messages.create(**request))
+        recorder.save()
+
+        replay = ReplayLLMClient(cassette, latency="zero")
+        hit = asyncio.run(replay.messages.create(**request))
+        miss = asyncio.run(replay.messages.create(**{**request, "max_tokens": 20}))
+
+        assert hit.content[0].text == "hello"
+        assert hit.usage.output_tokens == 3
+        assert miss.content[0].text == MISS_ANSWER
+        assert replay.stats()["hits"] == 1 and replay.stats()["misses"] == 1
+
+    def test_replay_stream(self, tmp_path):
+        cassette = str(tmp_path / "qa.json")
+        request = {"model": "m", "messages": []}
+        recorder = ReplayLLMClient(cassette, mode="record", upstream=self._upstream("a streamed answer"))
+        asyncio.run(recorder.messages.create(**request))
+        recorder.save()
+
+        async def collect():
+            async with ReplayLLMClient(cassette, latency="zero").messages.stream(**request) as stream:
+                return "".join([text async for text in stream.text_stream])
+
+        assert asyncio.run(collect()) == "a streamed answer"
+
+    def test_record_requires_upstream(self, tmp_path):
+        with pytest.raises(ValueError):
+            ReplayLLMClient(str(tmp_path / "qa.json"), mode="record")
+
+
+class TestQuestionOffline:
+
+    def test_question_stages_recorded(self, tmp_path):
+        """Retrieval, assembly and LLM against the in-memory graph, local embedder and replay client"""
+        from utils.knowledge_graph import create_file_knowledge_graph, ask_question
+
+        graph = InMemoryGraph()
+        text = " ".join(f"Paragraph {i} about invoices and warranties." for i in range(300))
+        embeddings = create_embeddings("local")
+
+        with patch("utils.knowledge_graph.kg", graph), \
+             patch("utils.knowledge_graph._embeddings", embeddings), \
+             patch("utils.knowledge_graph.embeddings_available", return_value=True), \
+             patch("utils.knowledge_graph.QA_CACHE_ENABLED", False), \
+             patch("utils.knowledge_graph.get_llm_client",
+                   return_value=ReplayLLMClient(str(tmp_path / "qa.json"), latency="zero")):
+            create_file_knowledge_graph("u", "doc.txt", text.encode("utf-8"))
+            with record_stage_timings() as timings:
+                result = asyncio.run(ask_question(user_id="u", question="Which paragraph covers warranties?"))
+
+        assert result["status"] == "success"
+        assert result["answer"] == MISS_ANSWER
+        assert result["sources"]
+        assert {"question_embedding", "retrieval", "assembly", "llm"} <= set(timings)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,5 +1,7 @@
+import asyncio
+import json
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 import sys
 import os
 
@@ -30,17 +32,17 @@ class TestEnhancedKnowledgeGraph:
             ]
         }
         
-        with patch('routers.knowledge_graph.ask_question', return_value=mock_result), \
+        with patch('routers.knowledge_graph.ask_question', new=AsyncMock(return_value=mock_result)), \
              patch('routers.knowledge_graph.get_graph_traversal_path') as mock_traversal:
             
             mock_traversal.return_value = {"nodes": [], "edges": []}
             
             # Call the endpoint
-            result = qa_endpoint(
+            result = asyncio.run(qa_endpoint(
                 question=mock_question,
                 filenames=None,
                 user=mock_user
-            )
+            ))
             
             # Verify traversal_path was added
             assert "traversal_path" in result
@@ -60,12 +62,12 @@ class TestEnhancedKnowledgeGraph:
             "answer": "This is about testing"
         }
         
-        with patch('routers.knowledge_graph.ask_question', return_value=mock_result):
-            result = qa_endpoint(
+        with patch('routers.knowledge_graph.ask_question', new=AsyncMock(return_value=mock_result)):
+            result = asyncio.run(qa_endpoint(
                 question=mock_question,
                 filenames=None,
                 user=mock_user
-            )
+            ))
             
             # Verify no traversal_path was added
             assert "traversal_path" not in result
@@ -82,12 +84,12 @@ class TestEnhancedKnowledgeGraph:
             "message": "Something went wrong"
         }
         
-        with patch('routers.knowledge_graph.ask_question', return_value=mock_result):
-            result = qa_endpoint(
+        with patch('routers.knowledge_graph.ask_question', new=AsyncMock(return_value=mock_result)):
+            result = asyncio.run(qa_endpoint(
                 question=mock_question,
                 filenames=None,
                 user=mock_user
-            )
+            ))
             
             # Verify no traversal_path was added
             assert "traversal_path" not in result
@@ -116,27 +118,26 @@ class TestEnhancedKnowledgeGraph:
         ]
         user_id = "test_user"
         
-        # Mock Neo4j query results
-        mock_chunk_result = [{
+        # Mock Neo4j query result: chunk, NEXT neighbours and File in one row
+        mock_traversal_result = [{
             "id": "test_user_test.txt_chunk_0",
-            "text": "This is a test chunk with some content",
             "index": 0,
-            "section": "test_user_test.txt_section_0"
-        }]
-        
-        mock_file_result = [{
+            "section": "test_user_test.txt_section_0",
+            "label": None,
+            "preview": None,
+            "text": "This is a test chunk with some content",
             "filename": "test.txt",
-            "total_chunks": 1
+            "total_chunks": 1,
+            "next_chunks": []
         }]
-        
+
         with patch('utils.knowledge_graph.kg') as mock_kg:
-            mock_kg.query.side_effect = [
-                mock_chunk_result,  # First call for chunk
-                [],                 # Second call for related chunks
-                mock_file_result    # Third call for file
-            ]
-            
+            mock_kg.query.return_value = mock_traversal_result
+
             result = get_graph_traversal_path(sources, user_id)
+
+            # All sources are resolved with a single round trip
+            assert mock_kg.query.call_count == 1
             
             # Verify the structure
             assert "nodes" in result
@@ -158,5 +159,170 @@ class TestEnhancedKnowledgeGraph:
             assert file_node is not None
             assert file_node["label"] == "test.txt"
 
+    def test_get_graph_traversal_path_uses_precomputed_labels(self):
+        """Ingest-time labels/previews are used and NEXT neighbours become edges"""
+        sources = [
+            {"filename": "a.txt", "chunk_id": "u_a.txt_chunk_0", "section": "u_a.txt_section_0"},
+            {"filename": "a.txt", "chunk_id": "u_a.txt_chunk_1", "section": "u_a.txt_section_0"},
+        ]
+        rows = [
+            {"id": "u_a.txt_chunk_0", "index": 0, "section": "u_a.txt_section_0",
+             "label": "first label", "preview": "first preview", "text": None,
+             "filename": "a.txt", "total_chunks": 3,
+             "next_chunks": [{"id": "u_a.txt_chunk_1", "index": 1, "label": "second label",
+                              "preview": "second preview", "text": None}]},
+            {"id": "u_a.txt_chunk_1", "index": 1, "section": "u_a.txt_section_0",
+             "label": "second label", "preview": "second preview", "text": None,
+             "filename": "a.txt", "total_chunks": 3,
+             "next_chunks": [{"id": "u_a.txt_chunk_2", "index": 2, "label": None,
+                              "preview": None, "text": "third chunk text"}]},
+        ]
+
+        with patch('utils.knowledge_graph.kg') as mock_kg:
+            mock_kg.query.return_value = rows
+            result = get_graph_traversal_path(sources, "u")
+
+        nodes = {n["id"]: n for n in result["nodes"]}
+        assert nodes["u_a.txt_chunk_0"]["label"] == "first label"
+        assert nodes["u_a.txt_chunk_1"]["type"] == "chunk"
+        assert nodes["u_a.txt_chunk_2"]["type"] == "related_chunk"
+        assert nodes["u_a.txt_chunk_2"]["text"] == "third chunk text"
+        assert nodes["file_a.txt"]["total_chunks"] == 3
+        edge_types = sorted(e["type"] for e in result["edges"])
+        assert edge_types == ["HAS_CHUNK", "HAS_CHUNK", "NEXT", "NEXT"]
+        assert result["metadata"]["total_nodes"] == 4
+
+    def test_ask_question_sources_need_no_extra_queries(self):
+        """Source metadata comes back with retrieval, so round trips don't grow with the chunk count"""
+        from utils.knowledge_graph import ask_question_with_diversity, count_graph_queries
+
+        retrieved = [{
+            "text": f"chunk {i}",
+            "score": 0.9 - i / 100,
+            "chunk_id": f"test_user_doc{i % 3}.txt_chunk_{i}",
+            "filename": f"doc{i % 3}.txt",
+            "section": f"test_user_doc{i % 3}.txt_section_0",
+            "chunk_index": i,
+            "user_id": "test_user",
+            "original_url": "https://example.com/doc" if i % 3 == 0 else None,
+            "embedding": [1.0, i / 10],
+            "vector_count": 10,
+        } for i in range(10)]
+
+        mock_message = Mock()
+        mock_message.content = [Mock(text="An answer")]
+
+        with patch('utils.knowledge_graph.kg') as mock_kg, \
+             patch('utils.knowledge_graph.get_embeddings') as mock_embeddings, \
+             patch('utils.knowledge_graph.get_llm_client') as mock_claude:
+            mock_kg.query.return_value = retrieved
+            mock_embeddings.return_value.aembed_query = AsyncMock(return_value=[1.0, 0.0])
+            mock_claude.return_value.messages.create = AsyncMock(return_value=mock_message)
+
+            with count_graph_queries() as graph_queries:
+                result = asyncio.run(ask_question_with_diversity("test_user", "What is this about?"))
+
+        assert result["status"] == "success"
+        assert result["total_sources"] == 10
+        assert graph_queries["queries"] == 1
+        assert {s["original_url"] for s in result["sources"]} == {"https://example.com/doc", None}
+
+    def test_stream_question_event_order(self):
+        """Sources are emitted before any answer token, traversal and done come last"""
+        from utils.knowledge_graph import stream_question
+
+        retrieved = [{
+            "text": "chunk text", "score": 0.9, "chunk_id": "u_a.txt_chunk_0", "filename": "a.txt",
+            "section": "u_a.txt_section_0", "chunk_index": 0, "user_id": "u", "original_url": None,
+        }]
+
+        class FakeStream:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            @property
+            async def text_stream(self):
+                for piece in ["Hello", " world"]:
+                    yield piece
+
+        async def collect():
+            return [item async for item in stream_question("u", "Question?")]
+
+        with patch('utils.knowledge_graph.QA_CACHE_ENABLED', False), \
+             patch('utils.knowledge_graph._retrieve_for_question', new=AsyncMock(return_value=retrieved)), \
+             patch('utils.knowledge_graph.get_llm_client') as mock_claude, \
+             patch('utils.knowledge_graph.get_graph_traversal_path', return_value={"nodes": [], "edges": []}):
+            mock_claude.return_value.messages.stream.return_value = FakeStream()
+            events = asyncio.run(collect())
+
+        assert [event for event, _ in events] == ["sources", "token", "token", "traversal", "done"]
+        assert events[0][1]["sources"][0]["chunk_id"] == "u_a.txt_chunk_0"
+        assert events[-1][1]["answer"] == "Hello world"
+
+    def test_ask_questions_batch_shares_embedding_and_bounds_llm_calls(self):
+        """One embeddings request for the batch, cache hits skip it, Claude calls stay within the limit"""
+        from utils.knowledge_graph import ask_questions_batch
+        from utils.answer_cache import answer_cache
+
+        retrieved = [{
+            "text": "chunk text", "score": 0.9, "chunk_id": "u_a.txt_chunk_0", "filename": "a.txt",
+            "section": "u_a.txt_section_0", "chunk_index": 0, "user_id": "u", "original_url": None,
+        }]
+        in_flight = {"now": 0, "max": 0}
+
+        async def create(**request):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            if "question 3" in request["messages"][0]["content"]:
+                raise RuntimeError("overloaded")
+            return Mock(content=[Mock(text="An answer")])
+
+        async def collect():
+            return [item async for item in ask_questions_batch(
+                "u", ["cached?"] + [f"question {i}" for i in range(6)], concurrency=2)]
+
+        answer_cache.clear()
+        answer_cache.set(answer_cache.scope("u"), "cached?", {"status": "success", "answer": "From cache",
+                                                              "sources": [], "total_sources": 0})
+        try:
+            with patch('utils.knowledge_graph._retrieve_for_question', new=AsyncMock(return_value=retrieved)), \
+                 patch('utils.knowledge_graph.get_embeddings') as mock_embeddings, \
+                 patch('utils.knowledge_graph.get_llm_client') as mock_claude:
+                mock_embeddings.return_value.aembed_documents = AsyncMock(return_value=[[1.0, float(i)] for i in range(6)])
+                mock_claude.return_value.messages.create = create
+                results = dict(asyncio.run(collect()))
+        finally:
+            answer_cache.clear()
+
+        mock_embeddings.return_value.aembed_documents.assert_awaited_once()
+        assert len(mock_embeddings.return_value.aembed_documents.await_args[0][0]) == 6
+        assert results[0]["answer"] == "From cache"
+        assert in_flight["max"] == 2
+        assert results[4]["status"] == "error"
+        assert all(results[i]["answer"] == "An answer" for i in (1, 2, 3, 5, 6))
+
+    def test_qa_batch_endpoint_streams_ndjson(self):
+        from routers.knowledge_graph import qa_batch_endpoint
+        from models.crud_models import BatchQARequest
+
+        async def fake_batch(user_id, questions, filenames=None):
+            yield 1, {"status": "success", "answer": "second", "sources": []}
+            yield 0, {"status": "success", "answer": "first", "sources": []}
+
+        async def collect():
+            response = await qa_batch_endpoint(BatchQARequest(questions=["a?", "b?"]), user={"user_id": "u"})
+            return [line async for line in response.body_iterator]
+
+        with patch('routers.knowledge_graph.ask_questions_batch', new=fake_batch):
+            lines = asyncio.run(collect())
+
+        assert [json.loads(line)["index"] for line in lines] == [1, 0]
+        assert all(line.endswith("\n") for line in lines)
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import llm_clients
+from models.chat_models import ChatRequest
+
+
+class TestLLMClients:
+
+    def test_client_is_shared_until_shutdown(self):
+        async def scenario():
+            first = await llm_clients.startup_llm_clients()
+            assert llm_clients.get_llm_client() is first
+            http_client = llm_clients.get_http_client()
+            assert first._client is http_client
+            await llm_clients.shutdown_llm_clients()
+            assert http_client.is_closed
+            # A fresh pool is opened if something asks for a client after shutdown
+            assert llm_clients.get_llm_client() is not first
+            await llm_clients.shutdown_llm_clients()
+
+        asyncio.run(scenario())
+
+    def test_chat_uses_shared_client(self):
+        from routers.chat import chat_endpoint
+
+        mock_client = Mock()
+        mock_client.messages.create = AsyncMock(return_value=Mock(content=[Mock(text="hi there")]))
+        with patch('routers.chat.CLAUDE_API_KEY', 'key'), \
+             patch('routers.chat.get_llm_client', return_value=mock_client):
+            response = asyncio.run(chat_endpoint(ChatRequest(message="hello")))
+
+        assert response.reply == "hi there"
+        assert mock_client.messages.create.await_count == 1
+
+    def test_cached_qa_system_follows_client_restart(self):
+        """A QA system built before shutdown_llm_clients() must not keep the closed client"""
+        from langchain_core.documents import Document
+        from utils.knowledge_graph import ClaudeQASystem
+
+        retriever = Mock()
+        retriever.get_relevant_documents.return_value = [Document(page_content="The sky is blue.",
+                                                                  metadata={'filename': "sky.txt"})]
+        qa = ClaudeQASystem(retriever)
+        clients = [Mock(), Mock()]
+        for client in clients:
+            client.messages.create = AsyncMock(return_value=Mock(content=[Mock(text="Blue")]))
+
+        with patch('utils.knowledge_graph.get_llm_client', side_effect=clients):
+            asyncio.run(qa.ainvoke({"question": "What colour is the sky?"}))
+            asyncio.run(qa.ainvoke({"question": "What colour is the sky?"}))
+
+        assert [client.messages.create.await_count for client in clients] == [1, 1]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,122 @@
+import pytest
+from unittest.mock import patch
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import metrics
+from utils.metrics import (Histogram, Counter, render_metrics, reset_metrics, register_collector,
+                           mongo_pool_listener, STAGE_SECONDS, STAGE_ERRORS, NEO4J_QUERY_SECONDS,
+                           NEO4J_QUERY_ERRORS, EMBEDDING_BATCH_TEXTS, MONGO_POOL_CONNECTIONS)
+from utils.instrumentation import timed_stage
+from utils.query_registry import record_query
+from utils.embeddings import create_embeddings
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class TestMetricTypes:
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            hist.observe(value, route="/qa")
+
+        samples = {(suffix, tuple(labels)): value for suffix, labels, value in hist.samples()}
+        assert samples[("_bucket", (("route", "/qa"), ("le", "0.1")))] == 2
+        assert samples[("_bucket", (("route", "/qa"), ("le", "1.0")))] == 3
+        assert samples[("_bucket", (("route", "/qa"), ("le", "+Inf")))] == 4
+        assert samples[("_count", (("route", "/qa"),))] == 4
+        assert samples[("_sum", (("route", "/qa"),))] == pytest.approx(3.65)
+
+    def test_labels_must_match(self):
+        total = Counter("test_total", "Test", ("statement",))
+        with pytest.raises(ValueError):
+            total.inc(route="/qa")
+
+    def test_register_is_idempotent_but_checks_type(self):
+        assert metrics.counter("test_registered_total", "Test") is metrics.counter("test_registered_total", "Test")
+        with pytest.raises(ValueError):
+            metrics.gauge("test_registered_total", "Test")
+
+    def test_render_escapes_label_values(self):
+        NEO4J_QUERY_ERRORS.inc(statement='bad "name"\n')
+        assert 'neo4j_query_errors_total{statement="bad \\"name\\"\\n"} 1' in render_metrics()
+
+    def test_collector_samples_and_failures(self):
+        with patch.object(metrics, "_collectors", []):
+            register_collector(lambda: [("test_pool_connections", "gauge", "Test", [({"state": "idle"}, 3)])])
+            register_collector(lambda: 1 / 0)
+            text = render_metrics()
+
+        assert "# TYPE test_pool_connections gauge" in text
+        assert 'test_pool_connections{state="idle"} 3' in text
+
+
+class TestRecordedMetrics:
+
+    def test_timed_stage_feeds_histogram_and_errors(self):
+        with timed_stage("ocr"):
+            pass
+        with pytest.raises(RuntimeError):
+            with timed_stage("ocr"):
+                raise RuntimeError("tesseract missing")
+
+        assert STAGE_SECONDS.snapshot(stage="ocr")["count"] == 2
+        assert STAGE_ERRORS.value(stage="ocr") == 1
+
+    def test_record_query_feeds_histogram(self):
+        record_query("qa.vector_retrieval", 12.0)
+        record_query("qa.vector_retrieval", 30.0, error=True)
+
+        snapshot = NEO4J_QUERY_SECONDS.snapshot(statement="qa.vector_retrieval")
+        assert snapshot["count"] == 2
+        assert snapshot["sum"] == pytest.approx(0.042)
+        assert NEO4J_QUERY_ERRORS.value(statement="qa.vector_retrieval") == 1
+
+    def test_embedding_batches(self):
+        embeddings = create_embeddings("local", batch_size=4)
+        embeddings.embed_documents([f"text {i}" for i in range(10)])
+
+        assert EMBEDDING_BATCH_TEXTS.snapshot(provider="local") == {"count": 3, "sum": 10.0}
+
+    def test_mongo_pool_listener(self):
+        event = SimpleNamespace(address=("mongo", 27017))
+        mongo_pool_listener.connection_created(event)
+        mongo_pool_listener.connection_created(event)
+        mongo_pool_listener.connection_checked_out(event)
+        mongo_pool_listener.connection_checked_out(event)
+        mongo_pool_listener.connection_checked_in(event)
+
+        assert MONGO_POOL_CONNECTIONS.value(address="mongo:27017", state="open") == 2
+        assert MONGO_POOL_CONNECTIONS.value(address="mongo:27017", state="in_use") == 1
+
+
+class TestMetricsEndpoint:
+
+    def test_scrape(self):
+        from routers.metrics import router
+
+        app = FastAPI()
+        app.include_router(router)
+        with timed_stage("embed"):
+            pass
+        response = TestClient(app).get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'pipeline_stage_duration_seconds_count{stage="embed"} 1' in response.text
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,173 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.progress import ProgressBus, track_ingestion, track_progress, report_stage, enable_cli_progress
+from utils.embeddings import create_embeddings
+from benchmarks.in_memory_graph import InMemoryGraph
+
+
+class RecordingBus(ProgressBus):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+        super().publish(event)
+
+
+class TestTrackProgress:
+
+    def test_no_op_outside_ingestion(self):
+        with track_progress("embed", 10) as bar:
+            bar.update(10)
+
+    def test_tqdm_only_in_cli_mode(self):
+        from tqdm import tqdm
+
+        enable_cli_progress()
+        try:
+            with track_progress("embed", 3, desc="Embedding") as bar:
+                assert isinstance(bar, tqdm)
+        finally:
+            enable_cli_progress(False)
+
+    def test_events_inside_ingestion(self):
+        bus = RecordingBus()
+        with track_ingestion("ing-1", "u", "doc.pdf", bus=bus):
+            report_stage("split")
+            with track_progress("embed", 4) as bar:
+                for _ in range(4):
+                    bar.update(1)
+
+        stages = [(event["stage"], event["done"], event["status"]) for event in bus.events]
+        assert stages[0] == ("queued", None, "running")
+        assert ("split", None, "running") in stages
+        assert ("embed", 0, "running") in stages
+        assert ("embed", 4, "running") in stages
+        assert stages[-1] == ("done", None, "done")
+        last_embed = [event for event in bus.events if event["stage"] == "embed"][-1]
+        assert last_embed["total"] == 4 and last_embed["eta_seconds"] == 0
+
+    def test_updates_are_throttled(self):
+        bus = RecordingBus()
+        with track_ingestion("ing-1", "u", "doc.pdf", bus=bus):
+            with track_progress("extract", 1000) as bar:
+                for _ in range(1000):
+                    bar.update(1)
+
+        extract = [event["done"] for event in bus.events if event["stage"] == "extract"]
+        assert extract[0] == 0 and extract[-1] == 1000
+        assert len(extract) < 10
+
+    def test_failure_event(self):
+        bus = RecordingBus()
+        with pytest.raises(ValueError):
+            with track_ingestion("ing-1", "u", "doc.pdf", bus=bus):
+                raise ValueError("bad pdf")
+
+        assert bus.events[-1]["status"] == "failed"
+        assert bus.events[-1]["error"] == "bad pdf"
+
+
+class TestProgressBus:
+
+    def test_subscriber_follows_one_ingestion_from_another_thread(self):
+        bus = ProgressBus()
+
+        async def follow():
+            received = []
+
+            async def consume():
+                async for event in bus.subscribe("u", "ing-1"):
+                    received.append((event["stage"], event["status"]))
+
+            consumer = asyncio.create_task(consume())
+            await asyncio.sleep(0)
+
+            def ingest():
+                with track_ingestion("ing-2", "u", "other.txt", bus=bus):
+                    pass
+                with track_ingestion("ing-1", "other-user", "doc.txt", bus=bus):
+                    pass
+                with track_ingestion("ing-1", "u", "doc.txt", bus=bus):
+                    report_stage("split")
+
+            await asyncio.to_thread(ingest)
+            await asyncio.wait_for(consumer, timeout=2)
+            return received
+
+        assert asyncio.run(follow()) == [("queued", "running"), ("split", "running"), ("done", "done")]
+
+    def test_late_subscriber_gets_final_state(self):
+        bus = ProgressBus()
+        with track_ingestion("ing-1", "u", "doc.txt", bus=bus):
+            pass
+
+        async def follow():
+            return [event async for event in bus.subscribe("u", "ing-1")]
+
+        events = asyncio.run(follow())
+        assert [event["status"] for event in events] == ["done"]
+        assert bus.latest("someone-else", "ing-1") is None
+
+    def test_heartbeat(self):
+        bus = ProgressBus()
+
+        async def first():
+            async for event in bus.subscribe("u", heartbeat=0.01):
+                return event
+
+        assert asyncio.run(first()) is None
+
+
+class TestIngestionProgressOffline:
+
+    def test_text_ingestion_stages(self):
+        from utils.knowledge_graph import create_file_knowledge_graph
+
+        bus = RecordingBus()
+        text = " ".join(f"Paragraph {i} about invoices and warranties." for i in range(300))
+        with patch("utils.knowledge_graph.kg", InMemoryGraph()), \
+             patch("utils.knowledge_graph._embeddings", create_embeddings("local")), \
+             patch("utils.knowledge_graph.embeddings_available", return_value=True), \
+             track_ingestion("ing-1", "u", "doc.txt", bus=bus):
+            result = create_file_knowledge_graph("u", "doc.txt", text.encode("utf-8"))
+
+        stages = [event["stage"] for event in bus.events]
+        assert result["status"] == "success"
+        assert stages[0] == "queued" and stages[-1] == "done"
+        assert {"split", "graph_write", "embed"} <= set(stages)
+        embed = [event for event in bus.events if event["stage"] == "embed"][-1]
+        assert embed["done"] == embed["total"] == result["chunks"]
+
+
+class TestIngestionEndpoints:
+
+    def test_status_and_events_for_finished_ingestion(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from routers.knowledge_graph import router, get_current_user
+
+        app = FastAPI()
+        app.include_router(router, prefix="/knowledge-graph")
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": "local-test-user"}
+        with track_ingestion("ing-42", "local-test-user", "doc.txt"):
+            pass
+
+        client = TestClient(app)
+        assert client.get("/knowledge-graph/ingestions/ing-42").json()["status"] == "done"
+        assert client.get("/knowledge-graph/ingestions/unknown").status_code == 404
+        body = client.get("/knowledge-graph/ingestions/ing-42/events").text
+        assert body.startswith("event: progress\n")
+        assert '"status": "done"' in body
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
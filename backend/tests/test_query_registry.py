@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.query_registry import register_query, statement_name, query_stats, reset_query_stats
+
+
+class TestQueryRegistry:
+
+    def test_register_and_lookup(self):
+        query = register_query("test.lookup", "MATCH (n {id: $id}) RETURN n")
+        assert statement_name(query) == "test.lookup"
+        assert statement_name("MATCH (n) RETURN n LIMIT 1") == "unregistered"
+        # Re-registering the same text is fine, different text is not
+        register_query("test.lookup", "MATCH (n {id: $id}) RETURN n")
+        with pytest.raises(ValueError):
+            register_query("test.lookup", "MATCH (n) RETURN n")
+
+    def test_retrieval_statements_are_parameterized(self):
+        """User ids and file names must never be spliced into retrieval Cypher"""
+        from utils import retrieval, knowledge_graph
+        for query in (retrieval.VECTOR_RETRIEVAL_QUERY, retrieval.EXACT_RETRIEVAL_QUERY,
+                      retrieval.PREFIX_RETRIEVAL_QUERY, knowledge_graph.QA_FALLBACK_RETRIEVAL_QUERY):
+            assert "$user_id" in query
+            assert "$filenames" in query
+            assert statement_name(query) != "unregistered"
+
+    def test_safe_kg_query_records_statement(self):
+        from utils.knowledge_graph import safe_kg_query
+        from utils.retrieval import PREFIX_RETRIEVAL_QUERY
+
+        reset_query_stats()
+        with patch('utils.knowledge_graph.kg') as mock_kg:
+            mock_kg.query.return_value = []
+            safe_kg_query(PREFIX_RETRIEVAL_QUERY, params={'user_id': 'u', 'filenames': None})
+            safe_kg_query(PREFIX_RETRIEVAL_QUERY, params={'user_id': 'v', 'filenames': ['a.txt']})
+
+        stats = query_stats()
+        assert stats["qa.prefix_retrieval"]["calls"] == 2
+        assert stats["qa.prefix_retrieval"]["errors"] == 0
+        reset_query_stats()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
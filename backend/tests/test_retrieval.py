@@ -0,0 +1,188 @@
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.retrieval import diversify, retrieve_chunks, lucene_query, reciprocal_rank_fusion
+
+
+def _candidate(chunk_id, filename, embedding, score=0.9):
+    return {
+        "text": f"text of {chunk_id}",
+        "score": score,
+        "chunk_id": chunk_id,
+        "filename": filename,
+        "section": f"{filename}_section_0",
+        "chunk_index": 0,
+        "user_id": "test_user",
+        "embedding": embedding,
+    }
+
+
+class TestDiversify:
+
+    def test_none_strategy_is_plain_top_k(self):
+        """Without diversification the most relevant candidates win"""
+        query = [1.0, 0.0]
+        cands = [[0.0, 1.0], [1.0, 0.1], [1.0, 0.0]]
+        picks = diversify(query, cands, ["a", "a", "a"], 2, strategy="none")
+        assert picks == [2, 1]
+
+    def test_quota_caps_chunks_per_file(self):
+        """The per-file quota lets a less relevant file through"""
+        query = [1.0, 0.0]
+        cands = [[1.0, 0.0], [1.0, 0.05], [1.0, 0.1], [0.5, 0.5]]
+        picks = diversify(query, cands, ["a", "a", "a", "b"], 3, strategy="quota", per_file_quota=2)
+        assert picks == [0, 1, 3]
+
+    def test_mmr_skips_near_duplicates(self):
+        """MMR prefers a different direction over a duplicate of the first pick"""
+        query = [1.0, 1.0]
+        cands = [[1.0, 0.9], [1.0, 0.9], [0.9, 1.0]]
+        picks = diversify(query, cands, ["a", "a", "b"], 2, strategy="mmr", lambda_mult=0.5)
+        assert picks[0] in (0, 1)
+        assert picks[1] == 2
+
+    def test_empty_candidates(self):
+        assert diversify([1.0, 0.0], [], [], 5) == []
+
+
+class TestRetrieveChunks:
+
+    def test_single_round_trip_and_embeddings_stripped(self):
+        """Enough index hits means one query and no embeddings in the result"""
+        rows = [_candidate(f"c{i}", "a.txt", [1.0, i / 10]) for i in range(3)]
+        with patch("utils.retrieval.safe_kg_query", return_value=rows) as mock_query:
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], ["a.txt"], k=2, strategy="none")
+
+        assert mock_query.call_count == 1
+        params = mock_query.call_args[1]["params"]
+        assert params["user_id"] == "test_user"
+        assert params["filenames"] == ["a.txt"]
+        assert [c["chunk_id"] for c in chunks] == ["c0", "c1"]
+        assert all("embedding" not in c for c in chunks)
+
+    def test_falls_back_to_exact_scan_when_index_underfilled(self):
+        rows = [_candidate(f"c{i}", "a.txt", [1.0, 0.0]) for i in range(3)]
+        with patch("utils.retrieval.safe_kg_query", side_effect=[[], rows]) as mock_query:
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], k=3, strategy="none")
+
+        assert mock_query.call_count == 2
+        assert len(chunks) == 3
+
+    def test_hybrid_is_one_round_trip(self):
+        """Full-text and vector lists are fused in the same query"""
+        rows = [dict(_candidate(f"c{i}", "a.txt", [1.0, i / 10], score=0.03 - i / 1000), vector_count=5)
+                for i in range(3)]
+        with patch("utils.retrieval.safe_kg_query", return_value=rows) as mock_query:
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], k=2, strategy="none",
+                                     question="What does E-1043 mean?", mode="hybrid")
+
+        assert mock_query.call_count == 1
+        params = mock_query.call_args[1]["params"]
+        assert '"e-1043"' in params["text_query"]
+        assert [c["chunk_id"] for c in chunks] == ["c0", "c1"]
+        assert all("vector_count" not in c and "embedding" not in c for c in chunks)
+
+    def test_hybrid_small_tenant_fuses_exact_and_fulltext(self):
+        exact = [_candidate("c1", "a.txt", [1.0, 0.0]), _candidate("c2", "a.txt", [0.9, 0.1])]
+        lexical = [_candidate("c3", "b.txt", None), _candidate("c2", "a.txt", [0.9, 0.1])]
+
+        def fake_query(query, params=None):
+            from utils.retrieval import EXACT_RETRIEVAL_QUERY, FULLTEXT_RETRIEVAL_QUERY
+            return {EXACT_RETRIEVAL_QUERY: exact, FULLTEXT_RETRIEVAL_QUERY: lexical}.get(query, [])
+
+        with patch("utils.retrieval.safe_kg_query", side_effect=fake_query):
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], k=3, strategy="none",
+                                     question="part ABC-1", mode="hybrid")
+
+        # c2 is in both lists, c3 was only found lexically and has no embedding yet
+        assert [c["chunk_id"] for c in chunks] == ["c2", "c1", "c3"]
+
+    def test_next_window_expands_seeds_in_one_query(self):
+        """A small seed top-k is widened along NEXT; seeds first, then neighbours nearest first"""
+        from utils.retrieval import NEIGHBOR_WINDOW_QUERY
+        seeds = [_candidate("a_5", "a.txt", [1.0, 0.0]), _candidate("b_2", "b.txt", [0.9, 0.1], score=0.8)]
+        neighbours = [
+            {"seed_id": "a_5", "offset": 2, "text": "a 7", "chunk_id": "a_7", "filename": "a.txt",
+             "section": "s", "chunk_index": 7, "user_id": "test_user", "original_url": None},
+            {"seed_id": "a_5", "offset": -1, "text": "a 4", "chunk_id": "a_4", "filename": "a.txt",
+             "section": "s", "chunk_index": 4, "user_id": "test_user", "original_url": None},
+            {"seed_id": "b_2", "offset": 1, "text": "b 3", "chunk_id": "b_3", "filename": "b.txt",
+             "section": "s", "chunk_index": 3, "user_id": "test_user", "original_url": None},
+        ]
+
+        def fake_query(query, params=None):
+            return neighbours if query == NEIGHBOR_WINDOW_QUERY else [dict(row, vector_count=5) for row in seeds]
+
+        with patch("utils.retrieval.safe_kg_query", side_effect=fake_query) as mock_query:
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], strategy="none", question="q",
+                                     mode="hybrid", window=2, seed_k=2)
+
+        assert mock_query.call_count == 2
+        window_params = mock_query.call_args_list[1][1]["params"]
+        assert window_params["seed_ids"] == ["a_5", "b_2"]
+        assert window_params["window"] == 2
+        assert [c["chunk_id"] for c in chunks] == ["a_5", "b_2", "a_4", "b_3", "a_7"]
+        assert chunks[2]["expanded_from"] == "a_5"
+        assert chunks[2]["score"] == chunks[0]["score"]
+        assert all("offset" not in c and "seed_id" not in c for c in chunks)
+
+    def test_window_zero_skips_expansion(self):
+        rows = [_candidate(f"c{i}", "a.txt", [1.0, i / 10]) for i in range(3)]
+        with patch("utils.retrieval.safe_kg_query", return_value=rows) as mock_query:
+            chunks = retrieve_chunks("test_user", [1.0, 0.0], k=2, strategy="none", mode="vector", window=0)
+
+        assert mock_query.call_count == 1
+        assert len(chunks) == 2
+
+
+class TestHybridHelpers:
+
+    def test_lucene_query_quotes_identifiers(self):
+        assert lucene_query("Error E-1043 on ABC/12.5?") == 'error OR "e-1043" OR on OR "abc/12.5"'
+        assert lucene_query("?! *") is None
+
+    def test_reciprocal_rank_fusion(self):
+        a = [{"chunk_id": "x"}, {"chunk_id": "y"}]
+        b = [{"chunk_id": "y"}, {"chunk_id": "z"}]
+        fused = reciprocal_rank_fusion([a, b], rrf_k=60)
+        assert [row["chunk_id"] for row in fused] == ["y", "x", "z"]
+        assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+class TestBenchExactTopK:
+
+    def test_exact_top_k_against_in_memory_graph(self):
+        """The benchmark's ground truth query gets the version params it needs"""
+        from benchmarks.bench_retrieval import exact_top_k
+        from benchmarks.in_memory_graph import InMemoryGraph
+        from utils.embeddings import create_embeddings
+        from utils.knowledge_graph import embed_and_store_chunks, get_embeddings
+
+        graph = InMemoryGraph()
+        texts = ["solar panels and batteries", "tax forms for 2023", "hiking trails nearby", "solar inverter sizing"]
+        for i, text in enumerate(texts):
+            chunk_id = f"alice_notes.txt_chunk_{i}"
+            graph.chunks[chunk_id] = {'id': chunk_id, 'text': text, 'user_id': "alice", 'filename': "notes.txt",
+                                      'section': "alice_notes.txt_section_0", 'chunk_index': i}
+            graph.file_chunks[("alice", "notes.txt")].append(chunk_id)
+        graph.files[("alice", "notes.txt")] = {'total_chunks': len(texts)}
+
+        with patch("utils.knowledge_graph.kg", graph), \
+             patch("utils.knowledge_graph._embeddings", create_embeddings("local", dimensions=32)), \
+             patch("utils.retrieval.cached_vector_search", return_value=None):
+            embed_and_store_chunks(get_embeddings(), list(graph.chunks.values()))
+            embedding = get_embeddings().embed_query("solar panels")
+            truth = exact_top_k("alice", embedding, None, 2)
+            retrieved = retrieve_chunks("alice", embedding, k=2, strategy="none")
+
+        assert len(truth) == 2
+        assert {c["chunk_id"] for c in retrieved} == truth
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
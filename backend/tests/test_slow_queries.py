@@ -0,0 +1,168 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.slow_queries import SlowQueryLog, summarize_params, profile_query
+from utils.query_registry import UNREGISTERED
+
+READ_QUERY = "MATCH (c:Chunk {user_id: $user_id}) RETURN c.text AS text"
+WRITE_QUERY = "MATCH (c:Chunk {id: $id}) SET c.textEmbedding = $embedding"
+
+PROFILE = {
+    'operatorType': 'ProduceResults@neo4j', 'rows': 3, 'dbHits': 0, 'args': {'Details': 'text'},
+    'children': [{'operatorType': 'NodeByLabelScan@neo4j', 'rows': 3, 'dbHits': 41, 'args': {'Details': 'c:Chunk'},
+                  'children': []}],
+}
+
+
+def fake_graph():
+    """Neo4jGraph-like object whose driver returns PROFILE summaries"""
+    tx = MagicMock()
+    tx.run.return_value.consume.return_value = SimpleNamespace(profile=PROFILE)
+    session = MagicMock()
+    session.begin_transaction.return_value = tx
+    driver = MagicMock()
+    driver.session.return_value.__enter__.return_value = session
+    return SimpleNamespace(_driver=driver, _database="neo4j"), tx
+
+
+def wait_for_profiles(log):
+    if log._executor is not None:
+        log._executor.shutdown(wait=True)
+        log._executor = None
+
+
+class TestSlowQueryLog:
+
+    def test_only_slow_statements_are_captured(self):
+        log = SlowQueryLog(threshold_ms=100, profile=False)
+
+        assert log.capture("qa.vector_retrieval", READ_QUERY, {}, 20) is None
+        log.capture("qa.vector_retrieval", READ_QUERY, {"user_id": "u"}, 250)
+
+        entries = log.entries()
+        assert len(entries) == 1
+        assert entries[0]["statement"] == "qa.vector_retrieval"
+        assert entries[0]["params"] == {"user_id": "u"}
+        assert "query" not in entries[0]
+
+    def test_ring_buffer_keeps_newest(self):
+        log = SlowQueryLog(threshold_ms=0, size=3, profile=False)
+        for i in range(5):
+            log.capture(f"stmt.{i}", READ_QUERY, {}, i)
+
+        assert [entry["statement"] for entry in log.entries()] == ["stmt.4", "stmt.3", "stmt.2"]
+        assert [entry["statement"] for entry in log.entries(limit=1)] == ["stmt.4"]
+        assert log.entries(statement="stmt.0") == []
+
+    def test_unregistered_statements_keep_their_text(self):
+        log = SlowQueryLog(threshold_ms=0, profile=False)
+        log.capture(UNREGISTERED, READ_QUERY, {}, 10)
+
+        assert log.entries()[0]["query"] == READ_QUERY
+
+    def test_params_are_summarized(self):
+        summary = summarize_params({"embedding": [0.1] * 1536, "user_id": "u", "text_query": "x" * 200, "k": 8})
+
+        assert summary["embedding"] == "<1536 items>"
+        assert summary["user_id"] == "u"
+        assert len(summary["text_query"]) < 100
+        assert summary["k"] == 8
+
+    def test_slow_read_is_profiled_and_rolled_back(self):
+        graph, tx = fake_graph()
+        log = SlowQueryLog(threshold_ms=0, profile_interval=300)
+
+        log.capture("qa.vector_retrieval", READ_QUERY, {"user_id": "u"}, 900, graph)
+        wait_for_profiles(log)
+
+        assert tx.run.call_args[0][0] == "PROFILE " + READ_QUERY
+        tx.rollback.assert_called_once()
+        profile = log.entries()[0]["profile"]
+        assert profile["db_hits"] == 41
+        assert profile["rows"] == 3
+        assert profile["plan"]["children"][0]["operator"] == "NodeByLabelScan@neo4j"
+
+    def test_profiles_are_rate_limited_per_statement(self):
+        graph, tx = fake_graph()
+        log = SlowQueryLog(threshold_ms=0, profile_interval=300)
+
+        log.capture("qa.vector_retrieval", READ_QUERY, {}, 900, graph)
+        log.capture("qa.vector_retrieval", READ_QUERY, {}, 900, graph)
+        wait_for_profiles(log)
+
+        assert tx.run.call_count == 1
+        assert log.entries()[0]["profile"] is None
+
+    def test_writes_are_not_profiled_by_default(self):
+        graph, tx = fake_graph()
+        log = SlowQueryLog(threshold_ms=0)
+
+        log.capture("embed.set_chunk_embedding", WRITE_QUERY, {}, 900, graph)
+        wait_for_profiles(log)
+
+        tx.run.assert_not_called()
+
+    def test_profile_failure_is_recorded(self):
+        graph, tx = fake_graph()
+        tx.run.side_effect = RuntimeError("PROFILE not allowed")
+        log = SlowQueryLog(threshold_ms=0)
+
+        log.capture("qa.vector_retrieval", READ_QUERY, {}, 900, graph)
+        wait_for_profiles(log)
+
+        assert log.entries()[0]["profile_error"] == "PROFILE not allowed"
+        tx.rollback.assert_called_once()
+
+    def test_profile_query_uses_graph_database(self):
+        graph, _ = fake_graph()
+        profile_query(graph, READ_QUERY, {})
+
+        graph._driver.session.assert_called_with(database="neo4j")
+
+
+class TestSafeQueryCapture:
+
+    def test_failed_slow_query_is_captured(self):
+        from utils.knowledge_graph import safe_kg_query
+
+        log = SlowQueryLog(threshold_ms=0, profile=False)
+        graph = MagicMock()
+        graph.query.side_effect = RuntimeError("boom")
+
+        with patch("utils.knowledge_graph.kg", graph), \
+             patch("utils.knowledge_graph.slow_query_log", log):
+            assert safe_kg_query(READ_QUERY, {"user_id": "u"}) == []
+
+        assert log.entries()[0]["error"] == "boom"
+
+
+class TestSlowQueryEndpoint:
+
+    def test_admin_only(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from routers.knowledge_graph import router, get_current_user
+
+        app = FastAPI()
+        app.include_router(router, prefix="/knowledge-graph")
+        app.dependency_overrides[get_current_user] = lambda: {"user_id": "someone"}
+        try:
+            with patch("environment.ENV", "prod"), patch("environment.ADMIN_USER_IDS", {"admin"}):
+                assert TestClient(app).get("/knowledge-graph/admin/slow-queries").status_code == 403
+            app.dependency_overrides[get_current_user] = lambda: {"user_id": "admin"}
+            with patch("environment.ENV", "prod"), patch("environment.ADMIN_USER_IDS", {"admin"}):
+                response = TestClient(app).get("/knowledge-graph/admin/slow-queries")
+            assert response.status_code == 200
+            assert "queries" in response.json()
+        finally:
+            app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,61 @@
+import pytest
+import subprocess
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_startup import LAZY_MODULES, parse_importtime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_main(**env):
+    """Import main in a fresh interpreter; returns (loaded lazy modules, registered paths)"""
+    probe = (
+        "import sys, main\n"
+        f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+        "print(' '.join(route.path for route in main.app.routes))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND_DIR, env={**os.environ, **env},
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
+    loaded, paths = result.stdout.splitlines()[-2:]
+    return loaded.split(), paths.split()
+
+
+class TestStartup:
+
+    def test_heavy_dependencies_load_lazily(self):
+        loaded, paths = import_main(DISCORD_ENABLED="true", OCR_ENABLED="true", CRUD_ENABLED="true")
+
+        assert loaded == []
+        assert "/crud/items" in paths
+        assert "/notify/discord/info" in paths
+
+    def test_disabled_subsystems_are_not_mounted(self):
+        _, paths = import_main(DISCORD_ENABLED="false", CRUD_ENABLED="false")
+
+        assert not any(path.startswith(("/crud", "/file_handler", "/notify")) for path in paths)
+        assert "/knowledge-graph/qa" in paths
+
+    def test_ocr_disabled(self):
+        from unittest.mock import patch
+        from utils.extract_text_from_image import extract_text_from_image
+
+        with patch("utils.extract_text_from_image.OCR_ENABLED", False), \
+             patch("pytesseract.image_to_string") as ocr:
+            assert extract_text_from_image(b"not an image") == ""
+        ocr.assert_not_called()
+
+    def test_parse_importtime(self):
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   json.decoder\n"
+                  "import time:       300 |        420 | json\n")
+
+        assert parse_importtime(stderr) == {"json.decoder": 120, "json": 420}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
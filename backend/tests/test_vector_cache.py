@@ -0,0 +1,115 @@
+import pytest
+from unittest.mock import patch
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vector_cache import TenantVectors, VectorCache, TENANT_CHUNK_COUNT_QUERY, TENANT_VECTORS_QUERY
+from utils.file_events import file_changed
+
+
+def _rows(user_id, n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        "text": f"chunk {i}",
+        "chunk_id": f"{user_id}_f{i % 2}.txt_chunk_{i}",
+        "filename": f"f{i % 2}.txt",
+        "section": "s",
+        "chunk_index": i,
+        "user_id": user_id,
+        "original_url": None,
+        "embedding": rng.normal(size=dim).tolist(),
+    } for i in range(n)]
+
+
+def _fake_graph(tenants):
+    def query(statement, params=None):
+        rows = tenants.get(params['user_id'], [])
+        if statement == TENANT_CHUNK_COUNT_QUERY:
+            return [{"chunks": len(rows)}]
+        if statement == TENANT_VECTORS_QUERY:
+            return rows
+        return []
+    return query
+
+
+class TestTenantVectors:
+
+    def test_matches_brute_force_cosine(self):
+        rows = _rows("u", 50)
+        tenant = TenantVectors(rows)
+        query = np.random.default_rng(1).normal(size=8)
+
+        matrix = np.array([r["embedding"] for r in rows])
+        cosine = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+        expected = [rows[i]["chunk_id"] for i in np.argsort(-cosine)[:5]]
+
+        hits = tenant.search(query, 5)
+        assert [h["chunk_id"] for h in hits] == expected
+        assert hits[0]["score"] == pytest.approx((1 + cosine.max()) / 2, abs=1e-5)
+
+    def test_file_filter(self):
+        tenant = TenantVectors(_rows("u", 20))
+        hits = tenant.search(np.ones(8), 50, filenames=["f1.txt"])
+        assert len(hits) == 10
+        assert {h["filename"] for h in hits} == {"f1.txt"}
+        assert tenant.search(np.ones(8), 5, filenames=["missing.txt"]) == []
+
+
+class TestVectorCache:
+
+    def test_loads_once_and_invalidates_on_file_change(self):
+        cache = VectorCache(max_bytes=10 * 1024 * 1024, max_tenant_chunks=1000)
+        with patch("utils.vector_cache.safe_kg_query", side_effect=_fake_graph({"vc-user-1": _rows("vc-user-1", 30)})) as mock_query:
+            cache.search("vc-user-1", np.ones(8), 3)
+            cache.search("vc-user-1", np.ones(8), 3)
+            assert mock_query.call_count == 2          # count + vectors, then served from memory
+
+            cache.invalidate("vc-user-1", "f0.txt")
+            cache.search("vc-user-1", np.ones(8), 3)
+            assert mock_query.call_count == 4
+        assert cache.stats()["hits"] == 1
+
+    def test_lru_eviction_under_memory_budget(self):
+        tenants = {f"vc-lru-{i}": _rows(f"vc-lru-{i}", 40, dim=64) for i in range(3)}
+        one_tenant = TenantVectors(tenants["vc-lru-0"]).nbytes
+        cache = VectorCache(max_bytes=int(one_tenant * 2.5), max_tenant_chunks=1000)
+        with patch("utils.vector_cache.safe_kg_query", side_effect=_fake_graph(tenants)):
+            cache.search("vc-lru-0", np.ones(64), 3)
+            cache.search("vc-lru-1", np.ones(64), 3)
+            cache.search("vc-lru-0", np.ones(64), 3)   # vc-lru-1 is now least recently used
+            cache.search("vc-lru-2", np.ones(64), 3)
+
+        assert list(cache._tenants) == ["vc-lru-0", "vc-lru-2"]
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] <= cache.max_bytes
+
+    def test_large_tenant_falls_through(self):
+        cache = VectorCache(max_bytes=10 * 1024 * 1024, max_tenant_chunks=10)
+        with patch("utils.vector_cache.safe_kg_query", side_effect=_fake_graph({"vc-big": _rows("vc-big", 30)})) as mock_query:
+            assert cache.search("vc-big", np.ones(8), 3) is None
+            assert cache.search("vc-big", np.ones(8), 3) is None
+            assert mock_query.call_count == 1          # only the count, and only until files change
+            file_changed("vc-big", "f0.txt")
+            cache.search("vc-big", np.ones(8), 3)
+            assert mock_query.call_count == 2
+
+    def test_retrieve_chunks_served_from_cache(self):
+        from utils import retrieval
+
+        rows = _rows("vc-user-2", 30)
+        tenant = TenantVectors(rows)
+        with patch("utils.retrieval.cached_vector_search", side_effect=lambda u, e, k, f: tenant.search(e, k, f)), \
+             patch("utils.retrieval.safe_kg_query") as mock_query:
+            chunks = retrieval.retrieve_chunks("vc-user-2", np.ones(8).tolist(), k=4, strategy="mmr", mode="vector")
+
+        assert mock_query.call_count == 0
+        assert len(chunks) == 4
+        assert all("embedding" not in c for c in chunks)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,92 @@
+import copy
+import re
+import unicodedata
+from environment import QA_CACHE_SIZE, QA_CACHE_TTL, QA_CACHE_SIMILARITY
+from utils.cache import TTLCache
+from utils.file_events import file_version, user_version, on_file_changed
+
+
+def normalize_question(question):
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    QA answers keyed by user, selected file set, the versions of those files and the
+    normalized question. Near-duplicate questions hit when their embedding's cosine
+    similarity to a cached question in the same scope is at least `similarity`.
+    """
+    def __init__(self, maxsize=1024, ttl=3600, similarity=0.95):
+        self.similarity = similarity
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def scope(self, user_id, filenames=None):
+        """
+        Cache scope for a question. Capture it before answering, so that an answer
+        computed while a file changes is stored under the old versions.
+        """
+        if not filenames:
+            return (user_id, None, user_version(user_id))
+        files = tuple(sorted(set(filenames)))
+        return (user_id, files, tuple(file_version(user_id, name) for name in files))
+
+    def get(self, scope, question):
+        """Exact hit on the normalized question"""
+        entry = self._entries.get((scope, normalize_question(question)))
+        return self._result(entry, question, "exact")
+
+    def get_similar(self, scope, question, question_embedding):
+        """Closest cached question in the scope, if it is similar enough"""
+        import numpy as np
+        candidates = [entry for key in self._entries.keys() if key[0] == scope
+                      for entry in [self._entries.get(key)] if entry and entry['embedding'] is not None]
+        if not candidates or question_embedding is None:
+            return None
+
+        query = np.asarray(question_embedding, dtype=np.float32)
+        matrix = np.stack([entry['embedding'] for entry in candidates])
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return self._result(candidates[best], question, "similar")
+
+    def set(self, scope, question, result, question_embedding=None):
+        import numpy as np
+        embedding = None if question_embedding is None else np.asarray(question_embedding, dtype=np.float32)
+        self._entries.set((scope, normalize_question(question)), {
+            'result': copy.deepcopy(result),
+            'embedding': embedding,
+        })
+
+    def invalidate(self, user_id, filename=None):
+        """Drop entries whose file set includes filename (all of the user's entries if None)"""
+        for key in self._entries.keys():
+            (owner, files, _), _question = key
+            if owner != user_id:
+                continue
+            if filename is None or files is None or filename in files:
+                self._entries.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _result(entry, question, hit):
+        if entry is None:
+            return None
+        result = copy.deepcopy(entry['result'])
+        result['question'] = question
+        result['cache'] = hit
+        return result
+
+
+answer_cache = AnswerCache(maxsize=QA_CACHE_SIZE, ttl=QA_CACHE_TTL, similarity=QA_CACHE_SIMILARITY)
+on_file_changed(answer_cache.invalidate)
@@ -0,0 +1,170 @@
+import threading
+from environment import QA_CONTEXT_TOKEN_BUDGET
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Loaded on first use: with a cold cache tiktoken downloads the BPE file, which must not
+# happen at import time (startup would hang or fail on an offline host)
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# split_text() overlaps neighbouring chunks by up to 400 characters; search a
+# little further in case the splitter backed off to an earlier separator
+MAX_OVERLAP_CHARS = 800
+# Shorter matches are more likely coincidence than splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+
+def _get_encoding():
+    """cl100k_base, loaded once; None for good if tiktoken or its BPE file is unavailable"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding unavailable, estimating ~4 characters per token: {e}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Approximate prompt tokens for text. cl100k_base is not Claude's tokenizer, but is
+    close enough for budgeting; without tiktoken fall back to ~4 characters per token.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def overlap_length(previous, following):
+    """
+    Length of the longest suffix of `previous` that is also a prefix of `following`
+    (the text split_text() repeats at the start of the next chunk), or 0.
+    """
+    if not previous or not following:
+        return 0
+    head = following[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return 0
+
+    start = max(0, len(previous) - min(MAX_OVERLAP_CHARS, len(following)))
+    position = previous.find(head, start)
+    while position != -1:
+        # Earliest match is the longest overlap
+        if following.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(head, position + 1)
+    return 0
+
+
+def _position(chunk):
+    index = chunk.get('chunk_index')
+    return (chunk.get('filename'), index) if isinstance(index, int) else None
+
+
+def _marginal_text(chunk, selected):
+    """Text this chunk adds given the neighbours already in the context"""
+    text = chunk.get('text') or ''
+    position = _position(chunk)
+    if position is None:
+        return text
+    filename, index = position
+    previous = selected.get((filename, index - 1))
+    if previous is not None:
+        text = text[overlap_length(previous['text'] or '', text):]
+    following = selected.get((filename, index + 1))
+    if following is not None:
+        text = text[:len(text) - overlap_length(text, following['text'] or '')]
+    return text
+
+
+def _merge(run):
+    """One passage from chunks of a file with consecutive chunk_index"""
+    text = run[0]['text'] or ''
+    for previous, chunk in zip(run, run[1:]):
+        current = chunk['text'] or ''
+        overlap = overlap_length(previous['text'] or '', current)
+        text += current[overlap:] if overlap else "\n" + current
+    return text
+
+
+def pack_context(chunks, budget=None):
+    """
+    Assemble retrieved chunks into prompt context: chunks adjacent in the same file
+    are merged into one passage with the repeated overlap removed, passages are
+    ordered by their most relevant chunk, and chunks are taken in relevance order
+    until the token budget is reached (the most relevant chunk is always kept).
+    Args:
+        chunks: Retrieved chunks, most relevant first, with text, filename and chunk_index
+        budget: Token budget for the context (QA_CONTEXT_TOKEN_BUDGET by default)
+    Returns:
+        dict: passages (text, filename, section, chunk_indices), chunks (the chunks used,
+              in relevance order) and stats (tokens before/after packing, tokens saved)
+    """
+    budget = QA_CONTEXT_TOKEN_BUDGET if budget is None else budget
+
+    selected = {}
+    used_chunks = []
+    seen_ids = set()
+    raw_tokens = used_tokens = dropped = 0
+    for rank, chunk in enumerate(chunks):
+        raw_tokens += count_tokens(chunk.get('text'))
+        chunk_id = chunk.get('chunk_id', chunk.get('id'))
+        position = _position(chunk)
+        if (chunk_id is not None and chunk_id in seen_ids) or (position is not None and position in selected):
+            continue
+
+        cost = count_tokens(_marginal_text(chunk, selected))
+        if used_chunks and used_tokens + cost > budget:
+            dropped += 1
+            continue
+
+        used_tokens += cost
+        seen_ids.add(chunk_id)
+        used_chunks.append(chunk)
+        selected[position if position is not None else ('', rank)] = {**chunk, '_rank': rank}
+
+    # Merge runs of consecutive chunks per file; chunks without an index stay on their own
+    passages = []
+    ordered = sorted(selected.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+    run = []
+    for (filename, index), chunk in ordered:
+        if run and (_position(chunk) is None or _position(run[-1]) != (filename, index - 1)):
+            passages.append(run)
+            run = []
+        run.append(chunk)
+    if run:
+        passages.append(run)
+
+    passages = [{
+        'text': _merge(run),
+        'filename': run[0].get('filename', 'Unknown'),
+        'section': run[0].get('section', 'Unknown'),
+        'chunk_indices': [chunk.get('chunk_index') for chunk in run],
+        'rank': min(chunk['_rank'] for chunk in run),
+    } for run in passages]
+    passages.sort(key=lambda passage: passage['rank'])
+
+    packed_tokens = sum(count_tokens(passage['text']) for passage in passages)
+    stats = {
+        'chunks': len(chunks),
+        'chunks_used': len(used_chunks),
+        'chunks_dropped': dropped,
+        'passages': len(passages),
+        'tokens_raw': raw_tokens,
+        'tokens': packed_tokens,
+        'tokens_saved': raw_tokens - packed_tokens,
+        'budget': budget,
+    }
+    logger.info(f"Packed {stats['chunks_used']}/{stats['chunks']} chunks into {stats['passages']} passages: "
+                f"{packed_tokens} tokens ({stats['tokens_saved']} saved)")
+    return {'passages': passages, 'chunks': used_chunks, 'stats': stats}
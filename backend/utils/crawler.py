@@ -0,0 +1,465 @@
+import asyncio
+import hashlib
+import time
+import uuid
+import zlib
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from bs4 import BeautifulSoup
+from environment import (
+    CRAWL_MAX_PAGES, CRAWL_MAX_DEPTH, CRAWL_CONCURRENCY, CRAWL_PAGE_MAX_MB, CRAWL_MAX_JOBS, CRAWL_MAX_DELAY,
+    URL_FETCH_USER_AGENT,
+)
+from utils.cache import TTLCache
+from utils.http_fetch import get_fetcher, max_bytes_for, FetchError
+from utils.knowledge_graph import safe_kg_query, create_url_knowledge_graph
+from utils.metrics import JOB_QUEUE_DEPTH
+from utils.progress import track_ingestion, MIN_EVENT_INTERVAL
+from utils.query_registry import register_query
+from utils.url_extractor import stored_url_filename, visible_text
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Crawl ingestion: a list of URLs and/or sitemaps, optionally followed link by link up to a
+# depth, fetched through the shared fetcher (so the per-host limit also covers /url-upload)
+# and ingested one page at a time as a single tracked job. robots.txt is honored, including
+# Crawl-delay; pages are deduplicated by canonical URL before fetching and by a hash of their
+# text after, and text already stored for the tenant (an earlier crawl) is not ingested again.
+
+FILE_BY_HASH_QUERY = register_query("crawl.file_by_hash", """
+    MATCH (f:File {user_id: $user_id, content_hash: $content_hash})
+    RETURN f.filename AS filename
+    LIMIT 1
+""")
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+TEXT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+ROBOTS_MAX_BYTES = 512 * 1024
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024  # sitemap protocol limit, uncompressed
+MAX_SITEMAPS = 50  # per crawl, counting those listed in sitemap indexes
+MAX_ERRORS = 50  # per-page errors kept in the status
+
+
+class CrawlError(ValueError):
+    """The crawl request is invalid"""
+
+
+class CrawlBusy(CrawlError):
+    """CRAWL_MAX_JOBS crawls are already running"""
+
+
+def canonical_url(url):
+    """
+    Normalized form of an http(s) URL used to dedupe pages: lower-case scheme and host,
+    no default port, fragment or tracking parameters, sorted query. None for other URLs.
+    """
+    parts = urlparse(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    netloc = parts.hostname.lower()
+    if port not in (None, DEFAULT_PORTS[scheme]):
+        netloc = f"{netloc}:{port}"
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not key.lower().startswith(TRACKING_PARAMS)))
+    return urlunparse((scheme, netloc, parts.path or "/", "", query, ""))
+
+
+def _in_domains(url, domains):
+    host = urlparse(url).hostname or ""
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def _parse_page(content, encoding, base_url, html):
+    """Text, outgoing links, rel=canonical and robots meta directives of a fetched page"""
+    if not html:
+        return {'text': content.decode(encoding or 'utf-8', errors='replace'), 'links': [],
+                'canonical': None, 'noindex': False, 'nofollow': False}
+    soup = BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+    base = soup.find('base', href=True)
+    base_url = urljoin(base_url, base['href']) if base else base_url
+    directives = set()
+    for meta in soup.find_all('meta', attrs={'name': lambda name: name and name.lower() == 'robots'}):
+        directives.update(value.strip().lower() for value in (meta.get('content') or '').split(','))
+    canonical = soup.find('link', rel=lambda rel: rel and 'canonical' in rel, href=True)
+    links = [urljoin(base_url, a['href']) for a in soup.find_all('a', href=True)
+             if 'nofollow' not in (a.get('rel') or [])]
+    return {
+        'links': links,
+        'canonical': urljoin(base_url, canonical['href']) if canonical else None,
+        'noindex': bool(directives & {'noindex', 'none'}),
+        'nofollow': bool(directives & {'nofollow', 'none'}),
+        'text': visible_text(soup),
+    }
+
+
+def _sitemap_entries(content):
+    """('index' or 'urlset', [loc, ...]) of a sitemap, gzipped or not"""
+    if content[:2] == b"\x1f\x8b":
+        decoder = zlib.decompressobj(wbits=47)
+        content = decoder.decompress(content, SITEMAP_MAX_BYTES + 1)
+        if len(content) > SITEMAP_MAX_BYTES:
+            raise FetchError("Sitemap exceeds 50MB uncompressed")
+    root = ET.fromstring(content)
+    kind = "index" if root.tag.rsplit("}", 1)[-1] == "sitemapindex" else "urlset"
+    locs = [element.text.strip() for element in root.iter()
+            if element.tag.rsplit("}", 1)[-1] == "loc" and element.text and element.text.strip()]
+    return kind, locs
+
+
+class Crawl:
+    """
+    One crawl job. run() is a coroutine; the returned status() counts pages by outcome:
+    ingested, duplicate (URL or text seen in this crawl, or text already stored), robots,
+    noindex, skipped (not text, empty, or outside allowed_domains after a redirect) and failed.
+    """
+
+    def __init__(self, crawl_id, owner_id, urls=(), sitemaps=(), max_depth=0, max_pages=CRAWL_MAX_PAGES,
+                 allowed_domains=None, fetcher=None, ingest=None):
+        self.id = crawl_id
+        self.owner_id = owner_id
+        self.urls = list(urls)
+        self.sitemaps = list(sitemaps)
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        seeds = [urlparse(url).hostname for url in self.urls + self.sitemaps]
+        self.domains = {domain.lower().strip(".") for domain in (allowed_domains or seeds) if domain}
+        self.fetcher = fetcher
+        self.ingest = ingest or create_url_knowledge_graph
+        self.state = "queued"
+        self.counts = {key: 0 for key in ("ingested", "duplicate", "robots", "noindex", "skipped", "failed")}
+        self.chunks = 0
+        self.errors = []
+        self.scheduled = 0
+        self.truncated = False
+        self.started = None
+        self.finished = None
+        self._seen = set()  # canonical URLs
+        self._hashes = set()  # text hashes
+        self._robots = {}  # origin -> task resolving to a RobotFileParser
+        self._next_fetch = {}  # origin -> loop time of the next request allowed by Crawl-delay
+        self._host_locks = {}
+        self._sitemaps_read = 0
+        self._pending = 0  # pages counted in JOB_QUEUE_DEPTH
+        self._last_event = 0.0
+        self._tracker = None
+
+    def status(self):
+        return {
+            'crawl_id': self.id,
+            'owner_id': self.owner_id,
+            'status': self.state,
+            'pages': self.scheduled,
+            'done': sum(self.counts.values()),
+            **self.counts,
+            'chunks': self.chunks,
+            'truncated': self.truncated,
+            'errors': list(self.errors),
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+    async def run(self):
+        """Crawl and ingest; progress goes to the progress bus under the crawl id"""
+        self.fetcher = self.fetcher or get_fetcher()
+        self.state, self.started = "running", time.time()
+        self._frontier = asyncio.Queue()
+        self._pages = asyncio.Queue(maxsize=CRAWL_CONCURRENCY)
+        try:
+            with track_ingestion(self.id, self.owner_id, None) as tracker:
+                self._tracker = tracker
+                workers = [asyncio.create_task(self._fetch_worker()) for _ in range(max(1, CRAWL_CONCURRENCY))]
+                workers.append(asyncio.create_task(self._ingest_worker()))
+                try:
+                    for url in self.urls:
+                        self._schedule(url, 0)
+                    for sitemap in self.sitemaps:
+                        await self._read_sitemap(sitemap)
+                    await self._frontier.join()
+                    await self._pages.join()
+                except asyncio.CancelledError:
+                    self.state = "cancelled"
+                    tracker.cancel()
+                    raise
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                self.state = "done"
+                self._report(force=True)
+        except Exception as e:
+            self.state = "failed"
+            self._error(None, e)
+            logger.error(f"Crawl {self.id} failed: {e}")
+        finally:
+            JOB_QUEUE_DEPTH.dec(self._pending, queue="crawl")
+            self._pending = 0
+            self.finished = time.time()
+            logger.info(f"Crawl {self.id} {self.state}: {self.counts}")
+        return self.status()
+
+    # --- Frontier ---
+
+    def _schedule(self, url, depth):
+        """Queue a page unless it was seen, is out of scope or the page budget is spent"""
+        url = canonical_url(url)
+        if url is None or url in self._seen or not _in_domains(url, self.domains):
+            return
+        if self.scheduled >= self.max_pages:
+            self.truncated = True
+            return
+        self._seen.add(url)
+        self.scheduled += 1
+        self._pending += 1
+        JOB_QUEUE_DEPTH.inc(queue="crawl")
+        self._frontier.put_nowait((url, depth))
+
+    def _page_done(self, outcome):
+        self.counts[outcome] += 1
+        self._pending -= 1
+        JOB_QUEUE_DEPTH.dec(queue="crawl")
+        self._report()
+
+    def _report(self, force=False):
+        now = time.perf_counter()
+        if force or now - self._last_event >= MIN_EVENT_INTERVAL:
+            self._last_event = now
+            self._tracker.emit("crawl", sum(self.counts.values()), self.scheduled)
+
+    def _error(self, url, error):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'url': url, 'error': str(error)})
+
+    # --- Fetching ---
+
+    async def _fetch_worker(self):
+        while True:
+            url, depth = await self._frontier.get()
+            try:
+                outcome, page = await self._fetch_page(url, depth)
+                if page is not None:
+                    await self._pages.put(page)
+                else:
+                    self._page_done(outcome)
+            except Exception as e:
+                self._error(url, e)
+                self._page_done("failed")
+            finally:
+                self._frontier.task_done()
+
+    async def _fetch_page(self, url, depth):
+        """Returns (outcome, page to ingest or None)"""
+        if not await self._allowed(url):
+            return "robots", None
+        try:
+            result = await self._fetch(url, max_bytes_for(CRAWL_PAGE_MAX_MB))
+        except FetchError as e:
+            self._error(url, e)
+            return "failed", None
+
+        final_url = canonical_url(result['url'])
+        if final_url != url:
+            if not final_url or not _in_domains(final_url, self.domains):
+                return "skipped", None
+            if final_url in self._seen:
+                return "duplicate", None
+            self._seen.add(final_url)
+
+        content_type = (result['content_type'] or 'text/html').split(';')[0].strip().lower()
+        if content_type not in TEXT_TYPES:
+            return "skipped", None
+        page = await asyncio.to_thread(_parse_page, result['content'], result['encoding'], result['url'],
+                                       content_type != 'text/plain')
+
+        # Links are followed even when the page itself turns out to be a duplicate
+        if depth < self.max_depth and not page['nofollow']:
+            for link in page['links']:
+                self._schedule(link, depth + 1)
+
+        canonical = canonical_url(page['canonical']) if page['canonical'] else None
+        if canonical and canonical != final_url and _in_domains(canonical, self.domains):
+            if canonical in self._seen:
+                return "duplicate", None
+            self._seen.add(canonical)
+            final_url = canonical
+        if page['noindex']:
+            return "noindex", None
+        if not page['text'].strip():
+            return "skipped", None
+        content_hash = hashlib.sha256(page['text'].encode('utf-8')).hexdigest()
+        if content_hash in self._hashes:
+            return "duplicate", None
+        self._hashes.add(content_hash)
+        return None, {'url': final_url, 'text': page['text'], 'content_hash': content_hash}
+
+    async def _fetch(self, url, max_bytes):
+        """Fetch after waiting out the host's Crawl-delay"""
+        delay = self._crawl_delay(url)
+        if delay:
+            origin = self._origin(url)
+            lock = self._host_locks.setdefault(origin, asyncio.Lock())
+            async with lock:
+                loop = asyncio.get_running_loop()
+                wait = self._next_fetch.get(origin, 0) - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_fetch[origin] = loop.time() + delay
+        return await self.fetcher.fetch(url, max_bytes=max_bytes)
+
+    # --- robots.txt ---
+
+    @staticmethod
+    def _origin(url):
+        parts = urlparse(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    async def _allowed(self, url):
+        origin = self._origin(url)
+        if origin not in self._robots:
+            self._robots[origin] = asyncio.ensure_future(self._load_robots(origin))
+        robots = await self._robots[origin]
+        return robots.can_fetch(URL_FETCH_USER_AGENT, url)
+
+    def _crawl_delay(self, url):
+        task = self._robots.get(self._origin(url))
+        robots = task.result() if task is not None and task.done() else None
+        delay = robots.crawl_delay(URL_FETCH_USER_AGENT) if robots is not None else None
+        return min(float(delay), CRAWL_MAX_DELAY) if delay else 0
+
+    async def _load_robots(self, origin):
+        """Rules for one origin: missing (4xx) allows everything, unreachable (5xx, network) nothing"""
+        robots = RobotFileParser(origin + "/robots.txt")
+        try:
+            result = await self.fetcher.fetch(origin + "/robots.txt", max_bytes=ROBOTS_MAX_BYTES)
+            robots.parse(result['content'].decode('utf-8', errors='replace').splitlines())
+        except FetchError as e:
+            if e.status_code is not None and 400 <= e.status_code < 500:
+                robots.allow_all = True
+            else:
+                robots.disallow_all = True
+                self._error(origin + "/robots.txt", e)
+            robots.modified()
+        return robots
+
+    # --- Sitemaps ---
+
+    async def _read_sitemap(self, url, nested=0):
+        """Queue the pages of a sitemap (and of the sitemaps listed in a sitemap index)"""
+        if self._sitemaps_read >= MAX_SITEMAPS:
+            self.truncated = True
+            return
+        self._sitemaps_read += 1
+        url = canonical_url(url)
+        if url is None or not await self._allowed(url):
+            self._error(url, "Sitemap is not an http(s) URL or is disallowed by robots.txt")
+            return
+        try:
+            result = await self._fetch(url, SITEMAP_MAX_BYTES)
+            kind, locs = await asyncio.to_thread(_sitemap_entries, result['content'])
+        except (FetchError, ET.ParseError) as e:
+            self._error(url, e)
+            return
+        if kind == "index":
+            for loc in locs[:MAX_SITEMAPS] if nested < 2 else []:
+                await self._read_sitemap(loc, nested + 1)
+        else:
+            for loc in locs:
+                self._schedule(loc, 0)
+
+    # --- Ingestion ---
+
+    async def _ingest_worker(self):
+        """Pages go through the ingestion pipeline one at a time, in a worker thread"""
+        while True:
+            page = await self._pages.get()
+            outcome = "failed"
+            try:
+                stored = await asyncio.to_thread(safe_kg_query, FILE_BY_HASH_QUERY, {
+                    'user_id': self.owner_id, 'content_hash': page['content_hash']})
+                if stored:
+                    outcome = "duplicate"
+                else:
+                    filename = await asyncio.to_thread(stored_url_filename, self.owner_id, page['url'])
+                    result = await asyncio.to_thread(
+                        self.ingest, user_id=self.owner_id, filename=filename,
+                        file_contents=page['text'].encode('utf-8'), original_url=page['url'],
+                        content_type='text/plain', content_hash=page['content_hash'])
+                    if isinstance(result, dict) and result.get("status") == "error":
+                        self._error(page['url'], result.get("message"))
+                    else:
+                        outcome = "ingested"
+                        self.chunks += (result or {}).get("chunks", 0)
+            except Exception as e:
+                self._error(page['url'], e)
+            finally:
+                self._page_done(outcome)
+                self._pages.task_done()
+
+
+# Running crawls and, for a day, the status of finished ones
+_running = {}  # crawl id -> (Crawl, task)
+_finished = TTLCache(maxsize=1000, ttl=86400)
+
+
+def start_crawl(owner_id, urls=None, sitemaps=None, max_depth=0, max_pages=None, allowed_domains=None):
+    """
+    Validate a crawl request and run it as a task on the running event loop
+    Args:
+        owner_id: tenant the pages are ingested for
+        urls: pages to ingest (and follow links from when max_depth > 0)
+        sitemaps: sitemap or sitemap index URLs whose pages are ingested
+        max_depth: link hops followed from urls and sitemap pages
+        max_pages: pages fetched at most (CRAWL_MAX_PAGES by default and at most)
+        allowed_domains: hosts (and their subdomains) that may be crawled; default the hosts of urls and sitemaps
+    Returns:
+        dict: crawl status; its crawl_id is also the ingestion id on the progress bus
+    Raises:
+        CrawlBusy: CRAWL_MAX_JOBS crawls are running
+        CrawlError: invalid request
+    """
+    urls, sitemaps = list(urls or []), list(sitemaps or [])
+    if not urls and not sitemaps:
+        raise CrawlError("Give at least one URL or sitemap")
+    invalid = [url for url in urls + sitemaps if canonical_url(url) is None]
+    if invalid:
+        raise CrawlError(f"Not an http(s) URL: {invalid[0]}")
+    if not 0 <= max_depth <= CRAWL_MAX_DEPTH:
+        raise CrawlError(f"max_depth must be between 0 and {CRAWL_MAX_DEPTH}")
+    max_pages = CRAWL_MAX_PAGES if max_pages is None else max_pages
+    if not 1 <= max_pages <= CRAWL_MAX_PAGES:
+        raise CrawlError(f"max_pages must be between 1 and {CRAWL_MAX_PAGES}")
+    if len(_running) >= CRAWL_MAX_JOBS:
+        raise CrawlBusy(f"{len(_running)} crawls are already running, try again later")
+
+    crawl = Crawl(uuid.uuid4().hex, owner_id, urls, sitemaps, max_depth, max_pages, allowed_domains)
+    task = asyncio.get_running_loop().create_task(crawl.run())
+    _running[crawl.id] = (crawl, task)
+
+    def finished(_):
+        _running.pop(crawl.id, None)
+        _finished.set(crawl.id, crawl.status())
+
+    task.add_done_callback(finished)
+    return crawl.status()
+
+
+def get_crawl(crawl_id):
+    """Status of a running or recently finished crawl, or None"""
+    if crawl_id in _running:
+        return _running[crawl_id][0].status()
+    return _finished.get(crawl_id)
+
+
+def cancel_crawl(crawl_id):
+    """Stop a running crawl; pages already ingested stay. False if it is not running"""
+    entry = _running.get(crawl_id)
+    if entry is None:
+        return False
+    entry[1].cancel()
+    return True
@@ -0,0 +1,392 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from environment import (EMBEDDING_STORAGE, EMBEDDING_BATCH_SIZE, EMBEDDING_JOB_PAGE_SIZE,
+                         EMBEDDING_RATE_LIMIT_RPM, EMBEDDING_RATE_LIMIT_TPM, EMBEDDING_MAX_RETRIES)
+from utils.embedding_versions import (get_version, default_version, active_version, InvalidEmbeddingVersion,
+                                      LEGACY_VERSION_ID)
+from utils.embeddings import embeddings_available
+from utils.file_events import file_changed
+from utils.knowledge_graph import safe_kg_query, neo4j_available
+from utils.metrics import JOB_QUEUE_DEPTH
+from utils.progress import track_ingestion, track_progress
+from utils.query_registry import register_query
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Background (re)embedding of stored chunks, scoped to one tenant or, for admins, all
+# of them. A job pages through chunks in id order and checkpoints the last id written
+# after every batch on an :EmbeddingJob node, so a cancelled, failed or interrupted
+# job resumes where it stopped. Progress goes to the progress bus under the job id.
+# A job writes one embedding version (utils/embedding_versions.py), which is also how
+# a new model is backfilled next to the one questions are answered with.
+
+# A running job whose checkpoint is older than this is treated as orphaned (worker died)
+STALE_AFTER_SECONDS = 300
+RESUMABLE_STATUSES = ("cancelled", "failed")
+ACTIVE_STATUSES = ("queued", "running")
+
+CHUNK_PAGE_QUERY = register_query("embed_job.chunk_page", """
+    MATCH (c:Chunk)
+    WHERE c.id > $after
+      AND ($user_id IS NULL OR c.user_id = $user_id)
+      AND ($force OR c[$embedding_property] IS NULL)
+    RETURN c.id AS id, c.text AS text, c.user_id AS user_id
+    ORDER BY c.id
+    LIMIT $limit
+""")
+
+COUNT_CHUNKS_QUERY = register_query("embed_job.count_chunks", """
+    MATCH (c:Chunk)
+    WHERE c.id > $after
+      AND ($user_id IS NULL OR c.user_id = $user_id)
+      AND ($force OR c[$embedding_property] IS NULL)
+    RETURN count(c) AS total
+""")
+
+WRITE_EMBEDDINGS_QUERY = register_query("embed_job.write_embeddings", """
+    UNWIND $rows AS row
+    MATCH (c:Chunk {id: row.id})
+    SET c += row.props
+""")
+
+WRITE_VECTORS_QUERY = register_query("embed_job.write_vectors", """
+    UNWIND $rows AS row
+    MATCH (c:Chunk {id: row.id})
+    CALL db.create.setNodeVectorProperty(c, $embedding_property, row.embedding)
+    SET c += row.props
+""")
+
+SAVE_JOB_QUERY = register_query("embed_job.save", """
+    MERGE (j:EmbeddingJob {id: $job.id})
+    SET j += $job
+""")
+
+GET_JOB_QUERY = register_query("embed_job.get", """
+    MATCH (j:EmbeddingJob {id: $id})
+    RETURN j {.*} AS job
+""")
+
+LIST_JOBS_QUERY = register_query("embed_job.list", """
+    MATCH (j:EmbeddingJob)
+    WHERE $owner_id IS NULL OR j.owner_id = $owner_id
+    RETURN j {.*} AS job
+    ORDER BY j.created_at DESC
+    LIMIT $limit
+""")
+
+
+class EmbeddingJobError(Exception):
+    """A job cannot be started or resumed in its current state"""
+
+
+class EmbeddingJobUnavailable(EmbeddingJobError):
+    """The embedding provider or Neo4j is not available"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job_version(job):
+    """A job's embedding version; jobs recorded before versions existed wrote the legacy one"""
+    return get_version(job.get('version') or LEGACY_VERSION_ID)
+
+
+def estimate_tokens(texts):
+    """Rough token count (about four characters per token) for rate limiting"""
+    return sum(len(text or "") for text in texts) // 4 + len(texts)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets shared by all jobs of the
+    process (provider limits apply per API key). A limit of 0 disables that bucket.
+    """
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, clock=time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed, self._updated = now - self._updated, now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def reserve(self, tokens):
+        """Take one request and `tokens` if available; otherwise return the seconds to wait"""
+        with self._lock:
+            self._refill()
+            # A single request larger than the whole budget waits for a full bucket
+            tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+            waits = []
+            if self.requests_per_minute and self._requests < 1:
+                waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+            if tokens and self._tokens < tokens:
+                waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+            if waits:
+                return max(waits)
+            if self.requests_per_minute:
+                self._requests -= 1
+            self._tokens -= tokens
+            return 0.0
+
+    def acquire(self, tokens, cancelled=None):
+        """Block until the request fits the limits; raises JobCancelled if `cancelled` is set meanwhile"""
+        cancelled = cancelled or threading.Event()
+        while True:
+            wait = self.reserve(tokens)
+            if not wait:
+                return
+            if cancelled.wait(wait):
+                raise JobCancelled()
+
+
+rate_limiter = RateLimiter(EMBEDDING_RATE_LIMIT_RPM, EMBEDDING_RATE_LIMIT_TPM)
+
+
+def _is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error, attempt):
+    """Seconds to wait before retrying a rate-limited batch: Retry-After if sent, else exponential backoff"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return min(60.0, 2.0 ** attempt)
+
+
+def embed_batch(embeddings, texts, limiter=None, cancelled=None, max_retries=EMBEDDING_MAX_RETRIES):
+    """Embed one batch within the rate limits, retrying 429 responses"""
+    limiter = limiter or rate_limiter
+    cancelled = cancelled or threading.Event()
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimate_tokens(texts), cancelled)
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == max_retries:
+                raise
+            delay = _retry_after(e, attempt)
+            logger.warning(f"Embedding provider rate limited, retrying in {delay:.1f}s")
+            if cancelled.wait(delay):
+                raise JobCancelled()
+
+
+def write_embeddings(rows, storage=EMBEDDING_STORAGE, version=None):
+    """Store a batch of (chunk id, vector) pairs of one embedding version (the default one if None) in one statement"""
+    version = version or default_version()
+    query = WRITE_EMBEDDINGS_QUERY if storage == "float64" else WRITE_VECTORS_QUERY
+    params = []
+    for chunk_id, vector in rows:
+        written = version.write_params(vector, storage)
+        params.append({'id': chunk_id, 'embedding': written['embedding'], 'props': written['props']})
+    safe_kg_query(query, params={'rows': params, 'embedding_property': version.embedding_property},
+                  raise_errors=True)
+
+
+class EmbeddingJobs:
+    """Starts, runs, cancels and resumes embedding jobs; job state lives in the graph"""
+    def __init__(self, limiter=None, page_size=EMBEDDING_JOB_PAGE_SIZE, batch_size=EMBEDDING_BATCH_SIZE):
+        self.limiter = limiter or rate_limiter
+        self.page_size = page_size
+        self.batch_size = max(1, batch_size)
+        self._active = {}  # job id -> (cancel event, tenant or None)
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        rows = safe_kg_query(GET_JOB_QUERY, params={'id': job_id})
+        return self._view(rows[0]['job']) if rows else None
+
+    def list(self, owner_id=None, limit=50):
+        rows = safe_kg_query(LIST_JOBS_QUERY, params={'owner_id': owner_id, 'limit': limit})
+        return [self._view(row['job']) for row in rows]
+
+    def _view(self, job):
+        return {'user_id': None, 'error': None, 'total': None, **job, 'active': job['id'] in self._active}
+
+    def _save(self, job, **changes):
+        job.update(changes, updated_at=_now(), heartbeat=time.time())
+        safe_kg_query(SAVE_JOB_QUERY, params={'job': {key: value for key, value in job.items() if key != 'active'}},
+                      raise_errors=True)
+
+    def create(self, owner_id, user_id=None, force=False, version=None):
+        """
+        Record a new job
+        Args:
+            owner_id: User who started the job (receives its progress events)
+            user_id: Tenant whose chunks are embedded, or None for all tenants
+            force: Re-embed chunks that already have an embedding
+            version: Embedding version id to write (default: the tenant's active
+                     version, or the default version for all tenants)
+        """
+        try:
+            version = get_version(version) if version else active_version(user_id) if user_id else default_version()
+        except InvalidEmbeddingVersion as e:
+            raise EmbeddingJobError(str(e))
+        if not embeddings_available(version.provider):
+            raise EmbeddingJobUnavailable(f"Embedding provider '{version.provider}' not available")
+        if not neo4j_available():
+            raise EmbeddingJobUnavailable("Neo4j not available")
+        with self._lock:
+            self._check_scope_free(user_id)
+        job = {
+            'id': uuid.uuid4().hex, 'owner_id': owner_id, 'user_id': user_id, 'force': force,
+            'version': version.id, 'status': "queued",
+            'cursor': "", 'done': 0, 'created_at': _now(),
+        }
+        self._save(job)
+        return self._view(job)
+
+    def _check_scope_free(self, user_id):
+        """Two jobs over the same chunks would embed them twice; all-tenant jobs overlap every tenant (call with the lock held)"""
+        if any(scope is None or user_id is None or scope == user_id for _, scope in self._active.values()):
+            raise EmbeddingJobError("An embedding job covering these chunks is already running")
+
+    def cancel(self, job_id):
+        """Ask a running job to stop after its current batch; returns False if it is not running here"""
+        with self._lock:
+            active = self._active.get(job_id)
+        if active is None:
+            return False
+        active[0].set()
+        return True
+
+    def resumable(self, job):
+        if job['status'] in RESUMABLE_STATUSES:
+            return True
+        # Still marked running, but no worker has checkpointed it for a while
+        return (job['status'] in ACTIVE_STATUSES and not job['active']
+                and time.time() - job.get('heartbeat', 0) > STALE_AFTER_SECONDS)
+
+    def prepare_resume(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not self.resumable(job):
+            raise EmbeddingJobError(f"Job is {job['status']}{' and running' if job['active'] else ''}; it cannot be resumed")
+        try:
+            # The job keeps writing the version it started with, whatever the configured model is now
+            version = _job_version(job)
+        except InvalidEmbeddingVersion as e:
+            raise EmbeddingJobError(str(e))
+        if not embeddings_available(version.provider):
+            raise EmbeddingJobUnavailable(f"Embedding provider '{version.provider}' not available")
+        with self._lock:
+            self._check_scope_free(job.get('user_id'))
+        self._save(job, status="queued", error=None)
+        return self._view(job)
+
+    def start(self, job):
+        """Run a created (or prepared) job in a background thread"""
+        cancelled = self._claim(job)
+        thread = threading.Thread(target=self._run_logged, args=(job, cancelled), daemon=True,
+                                  name=f"embedding-job-{job['id'][:8]}")
+        thread.start()
+        return thread
+
+    def run(self, job):
+        """Run a job in the calling thread; returns the final job state"""
+        return self._run(job, self._claim(job))
+
+    def _claim(self, job):
+        with self._lock:
+            if job['id'] in self._active:
+                raise EmbeddingJobError("Job is already running")
+            try:
+                self._check_scope_free(job.get('user_id'))
+            except EmbeddingJobError as e:
+                busy = e
+            else:
+                busy = None
+                cancelled = threading.Event()
+                self._active[job['id']] = (cancelled, job.get('user_id'))
+        if busy is not None:
+            # Another job claimed the scope since create()/prepare_resume(); don't leave this
+            # one queued, where it would look pending and later turn resumable
+            try:
+                self._save(job, status="failed", error=str(busy))
+            except Exception as save_error:
+                logger.error(f"Could not record refusal of embedding job {job['id']}: {save_error}")
+            raise busy
+        JOB_QUEUE_DEPTH.inc(queue="embedding_jobs")
+        return cancelled
+
+    def _run_logged(self, job, cancelled):
+        try:
+            self._run(job, cancelled)
+        except Exception as e:
+            logger.error(f"Embedding job {job['id']} failed: {e}")
+
+    def _run(self, job, cancelled):
+        job = {key: value for key, value in job.items() if key != 'active'}
+        touched = set()
+        try:
+            with track_ingestion(job['id'], job['owner_id'], None) as tracker:
+                try:
+                    self._embed_chunks(job, cancelled, touched)
+                except JobCancelled:
+                    self._save(job, status="cancelled")
+                    tracker.cancel()
+                except Exception as e:
+                    try:
+                        self._save(job, status="failed", error=str(e))
+                    except Exception as save_error:
+                        logger.error(f"Could not record failure of embedding job {job['id']}: {save_error}")
+                    raise
+                else:
+                    self._save(job, status="done")
+            logger.info(f"Embedding job {job['id']} {job['status']}: {job['done']} chunks")
+            return job
+        finally:
+            with self._lock:
+                self._active.pop(job['id'], None)
+            JOB_QUEUE_DEPTH.dec(queue="embedding_jobs")
+            # Cached vectors and answers of these tenants are stale now
+            for user_id in touched:
+                file_changed(user_id)
+
+    def _embed_chunks(self, job, cancelled, touched):
+        version = _job_version(job)
+        scope = {'user_id': job.get('user_id'), 'force': job['force'], **version.params()}
+        safe_kg_query(version.create_index_query())
+        remaining = safe_kg_query(COUNT_CHUNKS_QUERY, params={**scope, 'after': job['cursor']}, raise_errors=True)
+        remaining = remaining[0]['total'] if remaining else 0
+        self._save(job, status="running", total=job['done'] + remaining)
+        embeddings = version.embeddings()
+
+        with track_progress("embed", remaining, desc="Regenerating embeddings", unit="chunk") as progress:
+            while True:
+                if cancelled.is_set():
+                    raise JobCancelled()
+                page = safe_kg_query(CHUNK_PAGE_QUERY, params={**scope, 'after': job['cursor'], 'limit': self.page_size},
+                                     raise_errors=True)
+                if not page:
+                    return
+                for offset in range(0, len(page), self.batch_size):
+                    if cancelled.is_set():
+                        raise JobCancelled()
+                    batch = page[offset:offset + self.batch_size]
+                    vectors = embed_batch(embeddings, [chunk['text'] for chunk in batch], self.limiter, cancelled)
+                    write_embeddings([(chunk['id'], vector) for chunk, vector in zip(batch, vectors)], version=version)
+                    touched.update(chunk['user_id'] for chunk in batch if chunk.get('user_id'))
+                    # Checkpoint: everything up to this id is embedded
+                    self._save(job, cursor=batch[-1]['id'], done=job['done'] + len(batch))
+                    progress.update(len(batch))
+
+
+embedding_jobs = EmbeddingJobs()
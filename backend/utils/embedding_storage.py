@@ -0,0 +1,114 @@
+from environment import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_STORAGE, EMBEDDING_INDEX_DIMENSIONS
+
+# Storage modes for Chunk embeddings:
+#   float64  SET c.textEmbedding = [...]           8 bytes per dimension (Neo4j's default for float lists)
+#   float32  db.create.setNodeVectorProperty       4 bytes per dimension
+#   int8     float32 index vector, possibly truncated to EMBEDDING_INDEX_DIMENSIONS, plus the
+#            full vector scalar-quantized to int8 (textEmbeddingInt8 + textEmbeddingScale)
+#            for rescoring the top candidates at full dimension
+STORAGE_MODES = ("float64", "float32", "int8")
+
+
+def supports_dimensions(model=EMBEDDING_MODEL):
+    """Only the text-embedding-3 family accepts a `dimensions` parameter"""
+    return model.startswith("text-embedding-3")
+
+
+def embedding_kwargs(model=None, dimensions=None):
+    """OpenAIEmbeddings arguments for a model and output size (the configured ones by default)"""
+    model = model or EMBEDDING_MODEL
+    kwargs = {"model": model}
+    if supports_dimensions(model):
+        kwargs["dimensions"] = dimensions or EMBEDDING_DIMENSIONS
+    return kwargs
+
+
+def index_dimensions(storage=EMBEDDING_STORAGE, dimensions=None):
+    """Dimension of the vector held in the vector index for embeddings of `dimensions` (configured by default)"""
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if storage == "int8":
+        return min(EMBEDDING_INDEX_DIMENSIONS, dimensions)
+    return dimensions
+
+
+def index_vector(vector, dims=None):
+    """
+    Vector as stored in (and queried against) the index: the leading `dims` components,
+    re-normalized. Truncation keeps most of the signal for Matryoshka-trained models
+    (text-embedding-3-*); for older models use the full dimension.
+    """
+    import numpy as np
+    dims = dims or index_dimensions()
+    vector = np.asarray(vector, dtype=np.float32)
+    if dims >= len(vector):
+        return vector.tolist()
+    head = vector[:dims]
+    return (head / (np.linalg.norm(head) or 1.0)).tolist()
+
+
+def quantize_int8(vector):
+    """Symmetric per-vector int8 quantization. Returns (bytes, scale)"""
+    import numpy as np
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return quantized.tobytes(), scale
+
+
+def dequantize_int8(data, scale):
+    import numpy as np
+    return np.frombuffer(bytes(data), dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def storage_params(vector, storage=EMBEDDING_STORAGE, index_dims=None):
+    """Query parameters for writing one embedding in the given storage mode"""
+    if storage == "int8":
+        quantized, scale = quantize_int8(vector)
+        return {'embedding': index_vector(vector, index_dims or index_dimensions(storage)),
+                'embedding_q': quantized, 'embedding_scale': scale}
+    return {'embedding': [float(x) for x in vector], 'embedding_q': None, 'embedding_scale': None}
+
+
+def bytes_per_chunk(storage=EMBEDDING_STORAGE, dims=EMBEDDING_DIMENSIONS, index_dims=None):
+    """Approximate embedding bytes stored per chunk (property payload only)"""
+    if storage == "float64":
+        return 8 * dims
+    if storage == "float32":
+        return 4 * dims
+    index_dims = min(index_dims or EMBEDDING_INDEX_DIMENSIONS, dims)
+    return 4 * index_dims + dims + 8
+
+
+def rescore(candidates, question_embedding, rerank=True):
+    """
+    Bring candidates back to full dimension for scoring and diversification.
+    Candidates with int8 vectors (`embedding_q`/`embedding_scale` from the retrieval
+    query) get the dequantized full vector as `embedding`; truncated index vectors
+    without one are zero-padded. With rerank, scores become full-dimension cosine
+    similarities and the list is re-sorted; otherwise scores and order are kept
+    (e.g. rank-fused hybrid scores).
+    """
+    import numpy as np
+    query = np.asarray(question_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    dims = len(query)
+
+    rescored = []
+    quantized = False
+    for c in candidates:
+        c = dict(c)
+        data, scale = c.pop('embedding_q', None), c.pop('embedding_scale', None)
+        if data is not None:
+            quantized = True
+            full = dequantize_int8(data, scale)
+            c['embedding'] = full
+            if rerank:
+                # Same (1 + cos) / 2 scale as the Neo4j cosine index
+                c['score'] = float((1.0 + full @ query / (np.linalg.norm(full) or 1.0)) / 2.0)
+        elif c.get('embedding') is not None and len(c['embedding']) < dims:
+            c['embedding'] = np.pad(np.asarray(c['embedding'], dtype=np.float32), (0, dims - len(c['embedding'])))
+        rescored.append(c)
+
+    if quantized and rerank:
+        rescored.sort(key=lambda c: -c['score'])
+    return rescored
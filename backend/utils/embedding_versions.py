@@ -0,0 +1,380 @@
+import re
+import threading
+import time
+import uuid
+from environment import (EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_STORAGE,
+                         EMBEDDING_LEGACY_VERSION, EMBEDDING_VERSION_CACHE_TTL, EMBEDDING_JOB_PAGE_SIZE)
+from utils import knowledge_graph
+from utils.cache import TTLCache
+from utils.embedding_storage import index_dimensions, storage_params
+from utils.embeddings import PROVIDERS, create_embeddings, embeddings_available
+from utils.file_events import file_changed
+from utils.knowledge_graph import (safe_kg_query, vector_index_query, CREATE_VECTOR_INDEX_QUERY,
+                                   VECTOR_INDEX_NAME, VECTOR_EMBEDDING_PROPERTY)
+from utils.progress import track_ingestion, track_progress
+from utils.query_registry import register_query
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Embedding versions let the embedding model or dimension change without downtime.
+# A version ("provider:model:dimensions") keeps its vectors in its own Chunk properties
+# and vector index. A new version is backfilled by an embedding job while questions
+# keep using each tenant's active version, then tenants are switched one at a time in
+# a single statement, and finally the old version's vectors are garbage-collected.
+#
+# The legacy version (EMBEDDING_LEGACY_VERSION) is the one held in textEmbedding and
+# the pdf_chunks index; tenants without a recorded version use it. New tenants start
+# on the configured model (the default version). Without EMBEDDING_LEGACY_VERSION,
+# every tenant uses the configured model in textEmbedding, with no per-tenant lookups.
+
+LOCAL_MODEL = "hashing"
+
+
+def _configured_id():
+    model = EMBEDDING_MODEL if EMBEDDING_PROVIDER == "openai" else LOCAL_MODEL
+    return f"{EMBEDDING_PROVIDER}:{model}:{EMBEDDING_DIMENSIONS}"
+
+
+VERSIONING_ENABLED = bool(EMBEDDING_LEGACY_VERSION)
+DEFAULT_VERSION_ID = _configured_id()
+LEGACY_VERSION_ID = EMBEDDING_LEGACY_VERSION or DEFAULT_VERSION_ID
+
+USER_VERSION_QUERY = register_query("embed_version.user_version", """
+    MATCH (u:User {user_id: $user_id})
+    RETURN u.embedding_version AS version
+""")
+
+TENANTS_BY_VERSION_QUERY = register_query("embed_version.tenants", """
+    MATCH (u:User)
+    RETURN coalesce(u.embedding_version, $legacy) AS version, count(u) AS tenants
+""")
+
+COVERAGE_QUERY = register_query("embed_version.coverage", """
+    MATCH (c:Chunk)
+    WHERE $user_id IS NULL OR c.user_id = $user_id
+    RETURN count(c) AS chunks, count(c[$embedding_property]) AS embedded
+""")
+
+INDEX_STATE_QUERY = register_query("embed_version.index_state", """
+    SHOW INDEXES YIELD name, state, populationPercent
+    WHERE name = $index_name
+    RETURN state, populationPercent AS population
+""")
+
+# Check and flip in one statement: the tenant moves only if every one of its chunks
+# already has a vector of the new version
+SWITCH_QUERY = register_query("embed_version.switch", """
+    MATCH (u:User {user_id: $user_id})
+    OPTIONAL MATCH (c:Chunk {user_id: $user_id})
+    WHERE c[$embedding_property] IS NULL
+    WITH u, count(c) AS missing
+    FOREACH (_ IN CASE WHEN missing = 0 THEN [1] ELSE [] END |
+        SET u.embedding_version = $version, u.embedding_version_since = $now)
+    RETURN missing, coalesce(u.embedding_version, $legacy) AS version
+""")
+
+# One page of garbage collection: removes the version's properties from chunks of tenants
+# that left it more than $settled_before ago (workers may still have the old version cached)
+GC_PAGE_QUERY = register_query("embed_version.gc_page", """
+    MATCH (c:Chunk)
+    WHERE c[$embedding_property] IS NOT NULL
+    OPTIONAL MATCH (u:User {user_id: c.user_id})
+    WITH c, u
+    WHERE u IS NULL OR (coalesce(u.embedding_version, $legacy) <> $version
+                        AND coalesce(u.embedding_version_since, 0) < $settled_before)
+    WITH c LIMIT $limit
+    SET c += $clear
+    RETURN count(c) AS cleared
+""")
+
+
+class EmbeddingVersionError(Exception):
+    """A switch or garbage collection is not possible in the current state"""
+
+
+class InvalidEmbeddingVersion(EmbeddingVersionError):
+    """A version id is malformed or names an unknown provider"""
+
+
+class EmbeddingVersion:
+    """Where one embedding model's vectors live (Chunk properties, vector index) and how to compute them"""
+    def __init__(self, provider, model, dimensions):
+        self.provider = provider
+        self.model = model
+        self.dimensions = dimensions
+        self.id = f"{provider}:{model}:{dimensions}"
+        self.legacy = self.id == LEGACY_VERSION_ID
+        self.slug = re.sub(r"[^0-9a-z]+", "_", self.id.lower()).strip("_")
+        if self.legacy:
+            self.index_name, self.embedding_property = VECTOR_INDEX_NAME, VECTOR_EMBEDDING_PROPERTY
+        else:
+            self.index_name, self.embedding_property = f"chunk_vectors_{self.slug}", f"embedding_{self.slug}"
+        self.int8_property = f"{self.embedding_property}Int8"
+        self.scale_property = f"{self.embedding_property}Scale"
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def __eq__(self, other):
+        return isinstance(other, EmbeddingVersion) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"EmbeddingVersion({self.id!r})"
+
+    def index_dims(self, storage=EMBEDDING_STORAGE):
+        return index_dimensions(storage, self.dimensions)
+
+    def params(self):
+        """Query parameters naming this version's index and properties"""
+        return {'index_name': self.index_name, 'embedding_property': self.embedding_property,
+                'int8_property': self.int8_property, 'scale_property': self.scale_property}
+
+    def write_params(self, vector, storage=EMBEDDING_STORAGE):
+        """
+        Parameters for writing one vector: `embedding` for setNodeVectorProperty and
+        `props` for SET c += $props (the plain list in float64 mode, the int8 copy otherwise)
+        """
+        stored = storage_params(vector, storage, self.index_dims(storage))
+        props = {self.int8_property: stored['embedding_q'], self.scale_property: stored['embedding_scale']}
+        if storage == "float64":
+            props[self.embedding_property] = stored['embedding']
+        return {'embedding_property': self.embedding_property, 'embedding': stored['embedding'], 'props': props}
+
+    def clear_props(self):
+        """SET c += $clear removes every property of this version"""
+        return {self.embedding_property: None, self.int8_property: None, self.scale_property: None}
+
+    def create_index_query(self):
+        query = vector_index_query(self.index_name, self.embedding_property, self.index_dims())
+        if query == CREATE_VECTOR_INDEX_QUERY:
+            return query
+        return register_query(f"schema.create_vector_index.{self.slug}", query)
+
+    def drop_index_query(self):
+        return register_query(f"schema.drop_vector_index.{self.slug}", f"DROP INDEX {self.index_name} IF EXISTS")
+
+    def available(self):
+        return embeddings_available(self.provider)
+
+    def embeddings(self):
+        """Embeddings client for this version; the configured model shares the QA client"""
+        if self.id == DEFAULT_VERSION_ID:
+            return knowledge_graph.get_embeddings()
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = create_embeddings(self.provider, model=self.model, dimensions=self.dimensions)
+            return self._embeddings
+
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+# user id -> active version id, see active_version()
+_active = TTLCache(maxsize=10000, ttl=EMBEDDING_VERSION_CACHE_TTL)
+
+
+def get_version(version_id):
+    """
+    Parse "provider:model:dimensions" (e.g. openai:text-embedding-3-small:512, local:hashing:256)
+    Raises:
+        InvalidEmbeddingVersion: malformed id or unknown provider
+    """
+    with _versions_lock:
+        version = _versions.get(version_id)
+        if version is not None:
+            return version
+    try:
+        provider, rest = version_id.split(":", 1)
+        model, dimensions = rest.rsplit(":", 1)
+        dimensions = int(dimensions)
+    except (AttributeError, ValueError):
+        raise InvalidEmbeddingVersion(f"Invalid embedding version '{version_id}', expected provider:model:dimensions")
+    if provider not in PROVIDERS:
+        raise InvalidEmbeddingVersion(f"Unknown embedding provider '{provider}', expected one of {PROVIDERS}")
+    if not model or dimensions <= 0 or (provider == "local" and model != LOCAL_MODEL):
+        raise InvalidEmbeddingVersion(f"Invalid embedding version '{version_id}'")
+    with _versions_lock:
+        return _versions.setdefault(version_id, EmbeddingVersion(provider, model, dimensions))
+
+
+def default_version():
+    """The configured model (EMBEDDING_PROVIDER/MODEL/DIMENSIONS), where new tenants start"""
+    return get_version(DEFAULT_VERSION_ID)
+
+
+def legacy_version():
+    return get_version(LEGACY_VERSION_ID)
+
+
+def new_user_version():
+    """Version recorded on new User nodes; None while versions are disabled"""
+    return DEFAULT_VERSION_ID if VERSIONING_ENABLED else None
+
+
+def active_version(user_id, fresh=False):
+    """
+    The version the tenant's questions are embedded and searched with, cached for
+    EMBEDDING_VERSION_CACHE_TTL seconds (fresh=True reads the graph)
+    """
+    if not VERSIONING_ENABLED:
+        return default_version()
+    version_id = None if fresh else _active.get(user_id)
+    if version_id is None:
+        try:
+            rows = safe_kg_query(USER_VERSION_QUERY, params={'user_id': user_id}, raise_errors=True)
+        except Exception as e:
+            logger.error(f"Could not read the embedding version of {user_id}: {e}")
+            return legacy_version()
+        version_id = (rows[0]['version'] if rows else None) or LEGACY_VERSION_ID
+        _active.set(user_id, version_id)
+    try:
+        return get_version(version_id)
+    except InvalidEmbeddingVersion as e:
+        logger.error(f"User {user_id} has an unusable embedding version: {e}")
+        return legacy_version()
+
+
+def require_versions():
+    """Raise unless per-tenant embedding versions are enabled"""
+    if not VERSIONING_ENABLED:
+        raise EmbeddingVersionError("Embedding versions are disabled; set EMBEDDING_LEGACY_VERSION to the "
+                                    "provider:model:dimensions currently stored in textEmbedding")
+
+
+def _coverage(version, user_id=None):
+    rows = safe_kg_query(COVERAGE_QUERY, params={'user_id': user_id, **version.params()}, raise_errors=True)
+    return rows[0] if rows else {'chunks': 0, 'embedded': 0}
+
+
+def _tenants_by_version():
+    rows = safe_kg_query(TENANTS_BY_VERSION_QUERY, params={'legacy': LEGACY_VERSION_ID}, raise_errors=True)
+    return {row['version']: row['tenants'] for row in rows}
+
+
+def versions_status(extra=()):
+    """Tenants per version and how many chunks each version has vectors for"""
+    tenants = _tenants_by_version() if VERSIONING_ENABLED else {}
+    versions = []
+    for version_id in dict.fromkeys([DEFAULT_VERSION_ID, LEGACY_VERSION_ID, *tenants, *extra]):
+        version = get_version(version_id)
+        versions.append({'id': version.id, 'index_name': version.index_name,
+                         'embedding_property': version.embedding_property,
+                         'tenants': tenants.get(version.id, 0), **_coverage(version)})
+    return {'enabled': VERSIONING_ENABLED, 'default': DEFAULT_VERSION_ID, 'legacy': LEGACY_VERSION_ID,
+            'versions': versions}
+
+
+def index_state(version):
+    rows = safe_kg_query(INDEX_STATE_QUERY, params={'index_name': version.index_name}, raise_errors=True)
+    return rows[0]['state'] if rows else None
+
+
+def switch_version(user_id, version_id, owner_id=None, catch_up=True):
+    """
+    Make `version_id` the tenant's active version. First embeds the tenant's chunks that
+    have no vector of that version yet (uploads since the backfill), then flips the
+    version only if none are missing, so retrieval never sees a half-embedded version.
+    Chunks uploaded by a worker that had not yet seen the switch are picked up by
+    running the backfill for the tenant again.
+    Args:
+        user_id: Tenant to switch
+        version_id: Target version, backfilled beforehand
+        owner_id: User the catch-up job reports progress to
+        catch_up: Embed missing chunks inline before switching
+    Returns:
+        dict: user_id, version, previous version and whether it changed
+    """
+    require_versions()
+    version = get_version(version_id)
+    previous = active_version(user_id, fresh=True)
+    if previous == version:
+        return {'user_id': user_id, 'version': version.id, 'previous': previous.id, 'switched': False}
+
+    if catch_up:
+        from utils.embedding_jobs import embedding_jobs
+        job = embedding_jobs.create(owner_id or user_id, user_id=user_id, version=version.id)
+        job = embedding_jobs.run(job)
+        if job['status'] != "done":
+            raise EmbeddingVersionError(f"Catch-up embedding for {user_id} ended {job['status']}")
+
+    state = index_state(version)
+    if state != "ONLINE":
+        raise EmbeddingVersionError(f"Vector index {version.index_name} is {state or 'missing'}; "
+                                    "switch once it is ONLINE")
+
+    rows = safe_kg_query(SWITCH_QUERY, params={
+        'user_id': user_id, 'version': version.id, 'legacy': LEGACY_VERSION_ID, 'now': time.time(),
+        **version.params(),
+    }, raise_errors=True)
+    if not rows:
+        raise EmbeddingVersionError(f"Unknown user {user_id}")
+    if rows[0]['missing']:
+        raise EmbeddingVersionError(f"{rows[0]['missing']} chunks of {user_id} have no {version.id} vector yet; "
+                                    "run the backfill and switch again")
+
+    _active.pop(user_id)
+    # Cached vectors and answers were computed with the previous version
+    file_changed(user_id)
+    logger.info(f"Switched {user_id} from embedding version {previous.id} to {version.id}")
+    return {'user_id': user_id, 'version': version.id, 'previous': previous.id, 'switched': True}
+
+
+def _gc_target(version_id):
+    require_versions()
+    version = get_version(version_id)
+    if version.id == DEFAULT_VERSION_ID:
+        raise EmbeddingVersionError(f"{version.id} is the default version new tenants start on; "
+                                    "configure another model before collecting it")
+    return version
+
+
+def collect_garbage(version_id, page_size=EMBEDDING_JOB_PAGE_SIZE, settle_seconds=EMBEDDING_VERSION_CACHE_TTL):
+    """
+    Remove a version's vectors from tenants that are no longer on it, and drop its index
+    once no tenant uses it and no vectors are left
+    Args:
+        version_id: Version to collect (not the default one)
+        page_size: Chunks cleared per statement
+        settle_seconds: Skip tenants switched more recently than this (cached elsewhere)
+    Returns:
+        dict: version, chunks cleared, vectors remaining and whether the index was dropped
+    """
+    version = _gc_target(version_id)
+    params = {'version': version.id, 'legacy': LEGACY_VERSION_ID, 'clear': version.clear_props(),
+              'settled_before': time.time() - settle_seconds, 'limit': page_size, **version.params()}
+    cleared = 0
+    with track_progress("gc", _coverage(version)['embedded'], desc=f"Removing {version.id} vectors",
+                        unit="chunk") as progress:
+        while True:
+            rows = safe_kg_query(GC_PAGE_QUERY, params=params, raise_errors=True)
+            page = rows[0]['cleared'] if rows else 0
+            if not page:
+                break
+            cleared += page
+            progress.update(page)
+
+    remaining = _coverage(version)['embedded']
+    dropped = not remaining and not _tenants_by_version().get(version.id)
+    if dropped:
+        safe_kg_query(version.drop_index_query(), raise_errors=True)
+    logger.info(f"Collected {cleared} vectors of embedding version {version.id}, {remaining} remain"
+                f"{', index dropped' if dropped else ''}")
+    return {'version': version.id, 'cleared': cleared, 'remaining': remaining, 'index_dropped': dropped}
+
+
+def start_collect_garbage(owner_id, version_id):
+    """Run collect_garbage() in a background thread; progress goes to the progress bus under the returned id"""
+    _gc_target(version_id)
+    gc_id = uuid.uuid4().hex
+
+    def run():
+        try:
+            with track_ingestion(gc_id, owner_id, None):
+                collect_garbage(version_id)
+        except Exception as e:
+            logger.error(f"Garbage collection of embedding version {version_id} failed: {e}")
+
+    threading.Thread(target=run, daemon=True, name=f"embedding-gc-{gc_id[:8]}").start()
+    return gc_id
@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from langchain_core.embeddings import Embeddings
+from environment import EMBEDDING_PROVIDER, EMBEDDING_BATCH_SIZE, EMBEDDING_DIMENSIONS, OPENAI_API_KEY
+from utils.embedding_storage import embedding_kwargs
+from utils.metrics import EMBEDDING_BATCH_TEXTS, EMBEDDING_REQUEST_SECONDS
+
+# Embedding providers, selected with EMBEDDING_PROVIDER:
+#   openai  OpenAI embeddings API (EMBEDDING_MODEL), needs OPENAI_API_KEY
+#   local   HashingEmbeddings: deterministic, offline and fast, for tests, benchmarks
+#           and load tests; similarity reflects shared words, not meaning
+PROVIDERS = ("openai", "local")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline embeddings from hashed word and character n-gram counts. Features are
+    hashed (crc32, so vectors are identical across processes) into `dimensions`
+    signed buckets, log-scaled and L2-normalized.
+    """
+    def __init__(self, dimensions=1536, ngram_range=(3, 5)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+
+    def _features(self, text):
+        """Counts of words and of the character n-grams of each distinct word"""
+        words = Counter(re.findall(r"\w+", (text or "").lower()))
+        features = Counter(words)
+        low, high = self.ngram_range
+        for word, count in words.items():
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    features[padded[i:i + n]] += count
+        return features
+
+    def _embed(self, texts):
+        import numpy as np
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.int64, count=len(features))
+            counts = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            matrix[row] = np.bincount(hashes % self.dimensions, weights=signs * counts, minlength=self.dimensions)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).tolist()
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts))
+
+    def embed_query(self, text):
+        return self._embed([text])[0]
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """
+    Wraps a provider: splits document lists into batches of `batch_size` and keeps
+    throughput counters (texts, characters, seconds) for stats().
+    """
+    def __init__(self, provider, name, batch_size=EMBEDDING_BATCH_SIZE):
+        self.provider = provider
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def _record(self, texts, seconds):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['texts'] += len(texts)
+            self._stats['chars'] += sum(len(text or '') for text in texts)
+            self._stats['seconds'] += seconds
+        EMBEDDING_BATCH_TEXTS.observe(len(texts), provider=self.name)
+        EMBEDDING_REQUEST_SECONDS.observe(seconds, provider=self.name)
+
+    def _batches(self, texts):
+        texts = list(texts)
+        return [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+
+    def embed_documents(self, texts):
+        vectors = []
+        for batch in self._batches(texts):
+            start = time.perf_counter()
+            vectors.extend(self.provider.embed_documents(batch))
+            self._record(batch, time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text):
+        start = time.perf_counter()
+        vector = self.provider.embed_query(text)
+        self._record([text], time.perf_counter() - start)
+        return vector
+
+    async def aembed_documents(self, texts):
+        vectors = []
+        for batch in self._batches(texts):
+            start = time.perf_counter()
+            vectors.extend(await self.provider.aembed_documents(batch))
+            self._record(batch, time.perf_counter() - start)
+        return vectors
+
+    async def aembed_query(self, text):
+        start = time.perf_counter()
+        vector = await self.provider.aembed_query(text)
+        self._record([text], time.perf_counter() - start)
+        return vector
+
+    def stats(self):
+        """Totals since the last reset plus texts/second and characters/second"""
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats['seconds'] or float('inf')
+        stats.update(provider=self.name, batch_size=self.batch_size,
+                     texts_per_second=stats['texts'] / seconds, chars_per_second=stats['chars'] / seconds)
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'requests': 0, 'texts': 0, 'chars': 0, 'seconds': 0.0}
+
+
+def embeddings_available(provider=EMBEDDING_PROVIDER):
+    """Whether the provider can embed in this environment"""
+    if provider == "local":
+        return True
+    return bool(OPENAI_API_KEY and OPENAI_API_KEY.strip())
+
+
+def create_embeddings(provider=EMBEDDING_PROVIDER, batch_size=EMBEDDING_BATCH_SIZE, model=None, dimensions=None):
+    """
+    Embeddings client for the configured provider, wrapped with batching and throughput stats
+    Args:
+        provider: "openai" or "local"
+        batch_size: Texts per embedding request
+        model: OpenAI model (EMBEDDING_MODEL by default)
+        dimensions: Output size (EMBEDDING_DIMENSIONS by default)
+    """
+    if provider == "local":
+        inner = HashingEmbeddings(dimensions=dimensions or EMBEDDING_DIMENSIONS)
+    elif provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        inner = OpenAIEmbeddings(**embedding_kwargs(model, dimensions), chunk_size=batch_size)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}', expected one of {PROVIDERS}")
+    return InstrumentedEmbeddings(inner, provider, batch_size)
@@ -1,11 +1,7 @@
-from tqdm import tqdm
-from PIL import Image, ImageEnhance, ImageFilter 
-import logging
-from langchain.schema import Document
-import pytesseract
 import io
-import numpy as np
 import logging
+from environment import OCR_ENABLED
+from utils.instrumentation import timed_stage
 
 
 # Set up logging with minimal verbosity
@@ -22,6 +18,7 @@ logger.setLevel(logging.ERROR)
 
 def preprocess_image(image):
     """Enhanced image preprocessing for better OCR results"""
+    from PIL import Image, ImageEnhance, ImageFilter
     try:
         # Convert to RGB if image is in RGBA or other formats
         if image.mode == 'RGBA':
@@ -50,7 +47,6 @@ def preprocess_image(image):
         image = enhancer.enhance(1.5)
 
         # Apply adaptive thresholding
-        from PIL import ImageFilter
         image = image.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
 
         return image
@@ -59,9 +55,16 @@ def preprocess_image(image):
         return image
 
 
+@timed_stage("ocr")
 def extract_text_from_image(image_bytes, languages=['eng']):
     """Enhanced OCR function with better error handling and configuration"""
+    if not OCR_ENABLED:
+        return ""
     try:
+        # PIL and pytesseract load on first use
+        from PIL import Image, ImageFilter
+        import pytesseract
+
         # Convert image bytes to PIL Image
         image = Image.open(io.BytesIO(image_bytes))
 
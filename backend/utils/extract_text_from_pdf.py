@@ -1,9 +1,9 @@
 
-import fitz  # PyMuPDF
-from tqdm import tqdm
-from PIL import Image, ImageEnhance, ImageFilter 
 import logging
+from environment import OCR_ENABLED
 from utils.extract_text_from_image import extract_text_from_image
+from utils.instrumentation import timed_stage
+from utils.progress import track_progress
 
 
 # Set up logging with minimal verbosity
@@ -18,6 +18,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
 
+@timed_stage("extract")
 def extract_text_from_pdf(pdf_path, languages=['eng']):
     """Enhanced PDF text extraction with better image handling"""
     statistics = {
@@ -28,6 +29,8 @@ def extract_text_from_pdf(pdf_path, languages=['eng']):
         'errors': []
     }
 
+    import fitz  # PyMuPDF, loaded on first use
+
     try:
         logger.info(f"Starting text extraction from: {pdf_path}")
 
@@ -37,7 +40,8 @@ def extract_text_from_pdf(pdf_path, languages=['eng']):
         full_text = []
 
         # Process each page
-        for page_num in tqdm(range(len(doc)), desc="Processing pages"):
+        progress = track_progress("extract", len(doc), desc="Processing pages", unit="page")
+        for page_num in range(len(doc)):
             try:
                 page = doc[page_num]
 
@@ -46,15 +50,12 @@ def extract_text_from_pdf(pdf_path, languages=['eng']):
                 if text.strip():
                     full_text.append(text)
 
-                # Get images with higher resolution
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x resolution
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
                 # Process images in the page
                 image_list = page.get_images(full=True)
                 statistics['total_images'] += len(image_list)
 
-                for img_index, img_info in enumerate(image_list):
+                # Embedded images are only read when OCR is enabled
+                for img_index, img_info in enumerate(image_list if OCR_ENABLED else []):
                     try:
                         xref = img_info[0]
                         base_image = doc.extract_image(xref)
@@ -81,7 +82,9 @@ def extract_text_from_pdf(pdf_path, languages=['eng']):
                 error_msg = f"Error processing page {page_num + 1}: {str(e)}"
                 statistics['errors'].append(error_msg)
                 logger.error(error_msg)
-                continue
+            finally:
+                progress.update(1)
+        progress.close()
 
         # Combine all extracted text
         combined_text = ' '.join(full_text)
@@ -0,0 +1,60 @@
+import threading
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# In-process content versions of each user's files. Ingestion and deletion call
+# file_changed(); caches derived from file contents key on these versions and
+# subscribe with on_file_changed() to drop stale entries eagerly. Only changes
+# write entries, so looking up names a client made up doesn't grow these maps.
+_file_versions = {}
+_user_versions = {}
+_user_resets = {}
+_listeners = []
+_lock = threading.Lock()
+
+
+def on_file_changed(listener):
+    """Register listener(user_id, filename) for file changes; filename is None when all of the user's files changed"""
+    _listeners.append(listener)
+    return listener
+
+
+def file_version(user_id, filename):
+    """Current version of one file"""
+    with _lock:
+        return (_user_resets.get(user_id, 0), _file_versions.get((user_id, filename), 0))
+
+
+def user_version(user_id):
+    """Version of a user's whole file set; changes whenever any of their files does"""
+    with _lock:
+        return _user_versions.get(user_id, 0)
+
+
+def file_changed(user_id, filename=None, deleted=False):
+    """
+    Record that a file's contents changed (ingested, re-ingested or deleted)
+    Args:
+        user_id: Owner of the file
+        filename: Changed file, or None if all of the user's files changed
+        deleted: The file (or all of the user's files) no longer exists
+    """
+    with _lock:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+        if filename is None or deleted:
+            # A new reset retires every file version of the user, so a deleted file's
+            # entry can be dropped without its version ever repeating
+            _user_resets[user_id] = _user_resets.get(user_id, 0) + 1
+        if deleted and filename is None:
+            for key in [key for key in _file_versions if key[0] == user_id]:
+                del _file_versions[key]
+        elif deleted:
+            _file_versions.pop((user_id, filename), None)
+        elif filename is not None:
+            _file_versions[(user_id, filename)] = _file_versions.get((user_id, filename), 0) + 1
+
+    for listener in list(_listeners):
+        try:
+            listener(user_id, filename)
+        except Exception as e:
+            logger.error(f"File change listener {listener!r} failed: {e}")
@@ -0,0 +1,222 @@
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import httpx
+from environment import (
+    URL_FETCH_MAX_MB, URL_FETCH_TIMEOUT, URL_FETCH_CONNECT_TIMEOUT, URL_FETCH_MAX_CONNECTIONS,
+    URL_FETCH_MAX_KEEPALIVE_CONNECTIONS, URL_FETCH_MAX_PER_HOST, URL_FETCH_MAX_REDIRECTS, URL_FETCH_USER_AGENT,
+)
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Outbound fetches of user-supplied URLs. Bodies are streamed and the size limit is checked
+# on the decoded bytes as they arrive, so neither a huge page nor a small compressed bomb is
+# ever held in memory much beyond the limit.
+
+_ZLIB_ENCODINGS = ("gzip", "x-gzip", "deflate")
+
+
+class FetchError(ValueError):
+    """The URL could not be fetched; status_code is set for HTTP error responses"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ContentTooLarge(FetchError):
+    """The body is over the size limit"""
+
+
+def max_bytes_for(max_size_mb):
+    return int(max_size_mb * 1024 * 1024)
+
+
+class Fetcher:
+    """
+    Pooled keep-alive client with at most max_per_host requests in flight per host.
+    One fetcher belongs to one event loop.
+    """
+
+    def __init__(self, max_per_host=URL_FETCH_MAX_PER_HOST, transport=None):
+        self.max_per_host = max(1, max_per_host)
+        self.transport = transport
+        self._client = None
+        self._host_slots = {}  # host -> semaphore and the number of requests holding or waiting for it
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                follow_redirects=True,
+                max_redirects=URL_FETCH_MAX_REDIRECTS,
+                timeout=httpx.Timeout(URL_FETCH_TIMEOUT, connect=URL_FETCH_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=URL_FETCH_MAX_CONNECTIONS,
+                    max_keepalive_connections=URL_FETCH_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                headers={'User-Agent': URL_FETCH_USER_AGENT},
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _slot(self, host):
+        """Wait for one of the host's max_per_host slots; an idle host's semaphore is dropped"""
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = {'semaphore': asyncio.Semaphore(self.max_per_host), 'users': 0}
+        slot['users'] += 1
+        try:
+            async with slot['semaphore']:
+                yield
+        finally:
+            slot['users'] -= 1
+            if not slot['users']:
+                del self._host_slots[host]
+
+    async def fetch(self, url, max_bytes=None, headers=None):
+        """
+        GET a URL, following redirects
+        Args:
+            url: absolute http(s) URL
+            max_bytes: limit on the decoded body (default URL_FETCH_MAX_MB)
+            headers: extra request headers
+        Returns:
+            dict: url (after redirects), status_code, content_type, encoding, content, size
+        Raises:
+            ContentTooLarge: the declared or received body is over max_bytes
+            FetchError: invalid URL, network error or HTTP error status
+        """
+        max_bytes = max_bytes_for(URL_FETCH_MAX_MB) if max_bytes is None else max_bytes
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise FetchError("Invalid URL format")
+
+        async with self._slot(parsed.netloc.lower()):
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    # Content-Length counts encoded bytes, which never exceed the decoded size
+                    declared = response.headers.get('content-length', '')
+                    if declared.isdigit() and int(declared) > max_bytes:
+                        raise ContentTooLarge(f"Content size ({int(declared) / (1024 * 1024):.1f}MB) "
+                                              f"exceeds limit ({max_bytes / (1024 * 1024):g}MB)")
+                    content = await _read_capped(response, max_bytes)
+                    return {
+                        'url': str(response.url),
+                        'status_code': response.status_code,
+                        'content_type': response.headers.get('content-type'),
+                        'encoding': response.charset_encoding,
+                        'content': content,
+                        'size': len(content),
+                    }
+            except FetchError:
+                raise
+            except httpx.HTTPStatusError as e:
+                raise FetchError(f"HTTP {e.response.status_code} from {url}", e.response.status_code)
+            except httpx.HTTPError as e:
+                raise FetchError(f"Network error fetching {url}: {e}")
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+async def _read_capped(response, max_bytes):
+    """Read the decoded body, stopping as soon as it passes max_bytes"""
+    encoding = response.headers.get('content-encoding', '').strip().lower()
+    body = bytearray()
+
+    def too_large():
+        return ContentTooLarge(f"Content size exceeds limit ({max_bytes / (1024 * 1024):g}MB)")
+
+    if encoding in _ZLIB_ENCODINGS:
+        # Inflate ourselves with a bounded output size; httpx would inflate each network
+        # chunk in full, which for a compression bomb is up to ~1000x the chunk
+        decoder = zlib.decompressobj(wbits=47)  # gzip or zlib header, detected automatically
+        first = True
+        try:
+            async for data in response.aiter_raw():
+                if first and data:
+                    first = False
+                    try:
+                        body += decoder.decompress(data, max_bytes + 1 - len(body))
+                    except zlib.error:
+                        if encoding != "deflate":
+                            raise
+                        # Many servers send "deflate" as raw deflate data, without the zlib header
+                        decoder = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+                        body += decoder.decompress(data, max_bytes + 1 - len(body))
+                    if len(body) > max_bytes:
+                        raise too_large()
+                    data = decoder.unconsumed_tail
+                while data:
+                    body += decoder.decompress(data, max_bytes + 1 - len(body))
+                    if len(body) > max_bytes:
+                        raise too_large()
+                    data = decoder.unconsumed_tail
+            body += decoder.flush()
+        except zlib.error as e:
+            raise FetchError(f"Could not decode {encoding} body: {e}")
+    else:
+        # Identity, or br/zstd when their decoders are installed
+        async for data in response.aiter_bytes():
+            body += data
+            if len(body) > max_bytes:
+                raise too_large()
+    if len(body) > max_bytes:
+        raise too_large()
+    return bytes(body)
+
+
+# Process-wide fetcher for the app's event loop, created on first use
+_fetcher = None
+_fetcher_loop = None
+_fetcher_guard = None
+
+
+async def _close_with_loop(fetcher):
+    """Wait until the loop shuts down (asyncio.run cancels pending tasks), then close the fetcher"""
+    try:
+        await asyncio.Future()
+    finally:
+        await fetcher.aclose()
+
+
+def get_fetcher():
+    """
+    Shared fetcher for the running event loop. Its connections are closed while that loop
+    shuts down, since they can't be closed from another loop once it has stopped.
+    """
+    global _fetcher, _fetcher_loop, _fetcher_guard
+    loop = asyncio.get_running_loop()
+    if _fetcher is None or _fetcher_loop is not loop:
+        _fetcher, _fetcher_loop = Fetcher(), loop
+        _fetcher_guard = loop.create_task(_close_with_loop(_fetcher))
+    return _fetcher
+
+
+async def fetch_url(url, max_bytes=None, headers=None):
+    """Fetch a URL with the shared fetcher (see Fetcher.fetch)"""
+    return await get_fetcher().fetch(url, max_bytes=max_bytes, headers=headers)
+
+
+async def shutdown_fetcher():
+    """Close pooled connections when the app shuts down"""
+    global _fetcher, _fetcher_loop, _fetcher_guard
+    if _fetcher_guard is not None:
+        _fetcher_guard.cancel()
+    if _fetcher is not None:
+        await _fetcher.aclose()
+    _fetcher = None
+    _fetcher_loop = None
+    _fetcher_guard = None
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.metrics import STAGE_SECONDS, STAGE_ERRORS
+
+# Per-run stage timings, see record_stage_timings(). Pipeline code wraps its stages
+# in timed_stage(), which always feeds the stage histogram on /metrics and, inside a
+# recording context, also the recorded timings.
+_stage_timings = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def record_stage_timings():
+    """
+    Collect the timed_stage() durations issued within this context
+    Yields:
+        dict: stage name -> {'seconds': total wall time, 'calls': count}
+    """
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def timed_stage(name):
+    """Time a pipeline stage (extract, ocr, split, graph_write, embed, ...)"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if failed:
+            STAGE_ERRORS.inc(stage=name)
+        timings = _stage_timings.get()
+        if timings is not None:
+            stage = timings.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += 1
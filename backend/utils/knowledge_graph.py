@@ -1,16 +1,24 @@
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_neo4j import Neo4jGraph
-from langchain_community.vectorstores import Neo4jVector
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains import RetrievalQAWithSourcesChain
-from langchain_openai import ChatOpenAI
-from environment import NEO4J_URI, NEO4J_USER, NEO4J_PASS, CLAUDE_API_KEY
-import anthropic
+import time
+import asyncio
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from environment import NEO4J_URI, NEO4J_USER, NEO4J_PASS, QA_RETRIEVER_CACHE_SIZE, QA_RETRIEVER_CACHE_TTL, QA_TOP_K, QA_FETCH_K, QA_CACHE_ENABLED, QA_CACHE_SIMILARITY, QA_BATCH_LLM_CONCURRENCY, EMBEDDING_STORAGE, EMBEDDING_INDEX_QUANTIZATION, EMBEDDING_PROVIDER, EMBEDDING_BATCH_SIZE
 import logging
-from tqdm import tqdm
 from utils.extract_text_from_pdf import extract_text_from_pdf
 from utils.extract_text_from_image import extract_text_from_image
+from utils.cache import TTLCache
+from utils.query_registry import register_query, statement_name, record_query
+from utils.llm_clients import get_llm_client
+from utils.file_events import file_changed
+from utils.answer_cache import answer_cache
+from utils.embedding_storage import index_dimensions
+from utils.embeddings import create_embeddings, embeddings_available
+from utils.context_packer import pack_context
+from utils.instrumentation import timed_stage
+from utils.metrics import register_collector, JOB_QUEUE_DEPTH
+from utils.slow_queries import slow_query_log
+from utils.progress import track_progress, report_stage
 
 
 # Set up logging with minimal verbosity
@@ -29,12 +37,16 @@ VECTOR_INDEX_NAME = 'pdf_chunks'
 VECTOR_NODE_LABEL = 'Chunk'
 VECTOR_SOURCE_PROPERTY = 'text'
 VECTOR_EMBEDDING_PROPERTY = 'textEmbedding'
+FULLTEXT_INDEX_NAME = 'chunk_text_fulltext'
 
 
 
 # Neo4j connection (lazy-loaded)
 kg = None
 
+# Per-request Neo4j round-trip counter, see count_graph_queries()
+_graph_query_counter = ContextVar('graph_query_counter', default=None)
+
 def get_neo4j_connection():
     """Get Neo4j connection with lazy loading and error handling"""
     global kg
@@ -44,6 +56,8 @@ def get_neo4j_connection():
                 logger.warning("Neo4j credentials not provided. Knowledge graph features will be disabled.")
                 return None
             
+            # langchain_neo4j is slow to import, so it loads with the first connection
+            from langchain_neo4j import Neo4jGraph
             kg = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USER, password=NEO4J_PASS)
             logger.info("Neo4j connection established successfully")
             return kg
@@ -53,18 +67,76 @@ def get_neo4j_connection():
             return None
     return kg
 
-def safe_kg_query(query, params=None):
-    """Execute Neo4j query with error handling"""
+@contextmanager
+def count_graph_queries():
+    """Count the Neo4j round trips issued through safe_kg_query within this context"""
+    counter = {'queries': 0}
+    token = _graph_query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _graph_query_counter.reset(token)
+
+def safe_kg_query(query, params=None, raise_errors=False):
+    """Execute Neo4j query with error handling (failures are logged and return [] unless raise_errors)"""
     kg = get_neo4j_connection()
     if kg is None:
+        if raise_errors:
+            raise RuntimeError("Neo4j not available")
         return []
-    
+
+    counter = _graph_query_counter.get()
+    if counter is not None:
+        counter['queries'] += 1
+
+    name = statement_name(query)
+    start = time.perf_counter()
     try:
-        return kg.query(query, params=params or {})
+        result = kg.query(query, params=params or {})
+        duration_ms = (time.perf_counter() - start) * 1000
+        record_query(name, duration_ms)
+        slow_query_log.capture(name, query, params, duration_ms, kg)
+        return result
     except Exception as e:
-        logger.error(f"Neo4j query failed: {e}")
+        duration_ms = (time.perf_counter() - start) * 1000
+        record_query(name, duration_ms, error=True)
+        slow_query_log.capture(name, query, params, duration_ms, kg, error=e)
+        logger.error(f"Neo4j query '{name}' failed: {e}")
+        if raise_errors:
+            raise
         return []
 
+@register_collector
+def neo4j_pool_metrics():
+    """Connections of the shared driver's pool, read at scrape time (driver internals, so best effort)"""
+    pool = getattr(getattr(kg, '_driver', None), '_pool', None)
+    if pool is None:
+        return []
+    samples = []
+    for address in list(pool.connections):
+        in_use = pool.in_use_connection_count(address)
+        total = len(pool.connections.get(address, ()))
+        samples.append(({'address': str(address), 'state': 'in_use'}, in_use))
+        samples.append(({'address': str(address), 'state': 'idle'}, total - in_use))
+    return [
+        ("neo4j_pool_connections", "gauge", "Neo4j driver pool connections (in_use, idle)", samples),
+        ("neo4j_pool_max_connections", "gauge", "Neo4j driver pool size limit",
+         [({}, pool.pool_config.max_connection_pool_size)]),
+    ]
+
+# Long-lived embeddings client shared across QA requests (lazy-loaded)
+_embeddings = None
+
+# QA systems keyed by retrieval configuration, see setup_qa_system()
+_qa_system_registry = TTLCache(maxsize=QA_RETRIEVER_CACHE_SIZE, ttl=QA_RETRIEVER_CACHE_TTL)
+
+def get_embeddings():
+    """Shared embeddings client for the configured provider (EMBEDDING_PROVIDER)"""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = create_embeddings()
+    return _embeddings
+
 def neo4j_available():
     """Check if Neo4j is available"""
     return get_neo4j_connection() is not None
@@ -78,7 +150,11 @@ def ensure_constraints():
     
     constraints = {
         "unique_user": "CREATE CONSTRAINT unique_user IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE",
-        "unique_chunk": "CREATE CONSTRAINT unique_chunk IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE"
+        "unique_chunk": "CREATE CONSTRAINT unique_chunk IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+        # Crawls skip pages whose text is already stored
+        "file_content_hash": "CREATE INDEX file_content_hash IF NOT EXISTS FOR (f:File) ON (f.user_id, f.content_hash)",
+        # Lexical side of hybrid retrieval (part numbers, error codes, names)
+        "chunk_fulltext": f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} IF NOT EXISTS FOR (c:{VECTOR_NODE_LABEL}) ON EACH [c.{VECTOR_SOURCE_PROPERTY}]"
     }
     for name, query in constraints.items():
         safe_kg_query(query)
@@ -86,6 +162,7 @@ def ensure_constraints():
 
 def split_text(text, chunk_size=2000, chunk_overlap=400):
     """Split text into intelligently sized chunks"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
@@ -96,6 +173,16 @@ def split_text(text, chunk_size=2000, chunk_overlap=400):
 
 
 
+# New users start on the default embedding version ($embedding_version is null unless versions are enabled)
+MERGE_USER_QUERY = register_query("ingest.merge_user", """
+    MERGE (u:User {user_id: $user_id})
+    ON CREATE SET u.embedding_version = $embedding_version
+    SET u.name = COALESCE($name, u.name),
+        u.email = COALESCE($email, u.email),
+        u.created_date = COALESCE(u.created_date, datetime()),
+        u.last_activity = datetime()
+""")
+
 def create_or_get_user(user_id, name=None, email=None):
     if not neo4j_available():
         logger.warning("Neo4j unavailable. User creation skipped.")
@@ -104,13 +191,9 @@ def create_or_get_user(user_id, name=None, email=None):
     if not ensure_constraints():
         return user_id
     
-    safe_kg_query("""
-        MERGE (u:User {user_id: $user_id})
-        SET u.name = COALESCE($name, u.name),
-            u.email = COALESCE($email, u.email),
-            u.created_date = COALESCE(u.created_date, datetime()),
-            u.last_activity = datetime()
-    """, params={'user_id': user_id, 'name': name, 'email': email})
+    from utils.embedding_versions import new_user_version
+    safe_kg_query(MERGE_USER_QUERY, params={'user_id': user_id, 'name': name, 'email': email,
+                                            'embedding_version': new_user_version()})
     return user_id
 
 def remove_existing_file_nodes(filename, user_id):
@@ -122,6 +205,7 @@ def remove_existing_file_nodes(filename, user_id):
             OPTIONAL MATCH (f)-[:HAS_CHUNK]->(c:Chunk)
             DETACH DELETE f, c
         """, params={'filename': filename, 'user_id': user_id})
+        file_changed(user_id, filename)
     except Exception as e:
         print(f"Error clearing existing data for {filename}: {e}")
         exit(1)
@@ -156,6 +240,7 @@ def delete_user(user_id):
             print(f"User '{user_id}' not found")
             return False
         _delete_file_or_chunks(user_id=user_id)
+        file_changed(user_id, deleted=True)
         info = result[0]
         print(f"Deleted user '{user_id}' ({info['name'] or 'No name'}), "
               f"{info['total_files']} files, {info['total_chunks']} chunks")
@@ -186,6 +271,7 @@ def delete_file_knowledge_graph(filename, user_id):
             OPTIONAL MATCH (f)-[:HAS_CHUNK]->(c:Chunk)
             DETACH DELETE f, c
         """, params={'filename': filename, 'user_id': user_id})
+        file_changed(user_id, filename, deleted=True)
 
         print(f"Successfully deleted file '{filename}' and {file_info['chunks']} chunks for user '{user_id}'")
         return True
@@ -194,6 +280,31 @@ def delete_file_knowledge_graph(filename, user_id):
         print(f"Error deleting file {filename} for user {user_id}: {e}")
         return False
 
+UPSERT_FILE_QUERY = register_query("ingest.upsert_file", """
+    MERGE (f:File {user_id: $user_id, filename: $filename})
+    SET f.source = $source,
+        f.processed_date = datetime(),
+        f.total_chunks = $total_chunks,
+        f.pages_processed = $metadata.pages_processed,
+        f.images_processed = $metadata.images_processed,
+        f.successful_ocr = $metadata.successful_ocr,
+        f.failed_ocr = $metadata.failed_ocr,
+        f.extraction_errors = $metadata.extraction_errors,
+        f.original_url = $metadata.original_url,
+        f.content_hash = $metadata.content_hash
+""")
+
+LINK_UPLOADED_QUERY = register_query("ingest.link_uploaded", """
+    MATCH (u:User {user_id: $user_id})
+    MATCH (f:File {user_id: $user_id, filename: $filename})
+    MERGE (u)-[:UPLOADED]->(f)
+""")
+
+CLEAR_FILE_CHUNKS_QUERY = register_query("ingest.clear_file_chunks", """
+    MATCH (f:File {user_id: $user_id, filename: $filename})-[:HAS_CHUNK]->(c:Chunk)
+    DETACH DELETE c
+""")
+
 def create_or_update_file_node(filename, user_id, chunks, metadata):
     """Create or update File node and its relationship with the user"""
     ensure_constraints()
@@ -203,32 +314,50 @@ def create_or_update_file_node(filename, user_id, chunks, metadata):
         'user_id': user_id, 'filename': filename, 'source': filename,
         'total_chunks': len(chunks), 'metadata': metadata
     }
-    safe_kg_query("""
-        MERGE (f:File {user_id: $user_id, filename: $filename})
-        SET f.source = $source,
-            f.processed_date = datetime(),
-            f.total_chunks = $total_chunks,
-            f.pages_processed = $metadata.pages_processed,
-            f.images_processed = $metadata.images_processed,
-            f.successful_ocr = $metadata.successful_ocr,
-            f.failed_ocr = $metadata.failed_ocr,
-            f.extraction_errors = $metadata.extraction_errors,
-            f.original_url = $metadata.original_url
-    """, params=params)
-    safe_kg_query("""
-        MATCH (u:User {user_id: $user_id})
-        MATCH (f:File {user_id: $user_id, filename: $filename})
-        MERGE (u)-[:UPLOADED]->(f)
-    """, params={'user_id': user_id, 'filename': filename})
+    safe_kg_query(UPSERT_FILE_QUERY, params=params)
+    safe_kg_query(LINK_UPLOADED_QUERY, params={'user_id': user_id, 'filename': filename})
     # Remove existing chunks
-    safe_kg_query("""
-        MATCH (f:File {user_id: $user_id, filename: $filename})-[:HAS_CHUNK]->(c:Chunk)
-        DETACH DELETE c
-    """, params={'user_id': user_id, 'filename': filename})
-
+    safe_kg_query(CLEAR_FILE_CHUNKS_QUERY, params={'user_id': user_id, 'filename': filename})
+
+
+def _chunk_label(text, chunk_index):
+    """Short display label for a chunk: the tail of its text, starting on a word boundary"""
+    text_content = (text or "").strip()
+    if not text_content:
+        return f"Chunk {chunk_index}"
+    # Get last 50 characters and clean them up
+    label_text = text_content[-50:].strip()
+    # Remove any incomplete words at the beginning
+    if len(label_text) == 50 and ' ' in label_text:
+        label_text = label_text[label_text.find(' ') + 1:]
+    # Truncate if still too long
+    if len(label_text) > 40:
+        label_text = label_text[-40:] + "..."
+    return label_text
+
+def _chunk_preview(text):
+    """First 100 characters of a chunk, shown in traversal nodes"""
+    text = text or ""
+    return text[:100] + "..." if len(text) > 100 else text
+
+STORE_CHUNKS_QUERY = register_query("ingest.store_chunks", """
+    MATCH (f:File {user_id: $user_id, filename: $filename})
+    UNWIND $params AS param
+    CREATE (c:Chunk {id: param.id})
+    SET c.text = param.text,
+        c.chunk_index = param.chunk_index,
+        c.section = param.section,
+        c.length = param.length,
+        c.label = param.label,
+        c.preview = param.preview,
+        c.user_id = param.user_id,
+        c.filename = param.filename
+    MERGE (f)-[:HAS_CHUNK]->(c)
+""")
 
 def store_chunks(chunks, filename, user_id):
     batch_size = 50
+    progress = track_progress("graph_write", len(chunks), desc="Storing chunks", unit="chunk")
     for i in range(0, len(chunks), batch_size):
         batch = chunks[i:i+batch_size]
         params = [{
@@ -237,48 +366,34 @@ def store_chunks(chunks, filename, user_id):
             'chunk_index': i+j,
             'section': f'{user_id}_{filename}_section_{(i+j)//10}',
             'length': len(chunk),
+            'label': _chunk_label(chunk, i+j),
+            'preview': _chunk_preview(chunk),
             'user_id': user_id,
             'filename': filename
         } for j, chunk in enumerate(batch)]
-        safe_kg_query("""
-            MATCH (f:File {user_id: $user_id, filename: $filename})
-            UNWIND $params AS param
-            CREATE (c:Chunk {id: param.id})
-            SET c.text = param.text,
-                c.chunk_index = param.chunk_index,
-                c.section = param.section,
-                c.length = param.length,
-                c.user_id = param.user_id,
-                c.filename = param.filename
-            MERGE (f)-[:HAS_CHUNK]->(c)
-        """, params={'params': params, 'user_id': user_id, 'filename': filename})
+        safe_kg_query(STORE_CHUNKS_QUERY, params={'params': params, 'user_id': user_id, 'filename': filename})
+        progress.update(len(batch))
+    progress.close()
 
 
 def _process_text_file(text, filename, user_id, metadata):
     """Handles splitting text, storing chunks, creating relationships, embeddings"""
-    chunks = split_text(text)
-    create_or_update_file_node(filename, user_id, chunks, metadata)
-    store_chunks(chunks, filename, user_id)
-    create_chunk_relationships(filename)
-    create_vector_index_and_embeddings(filename)
+    report_stage("split")
+    with timed_stage("split"):
+        chunks = split_text(text)
+    try:
+        with timed_stage("graph_write"):
+            create_or_update_file_node(filename, user_id, chunks, metadata)
+            store_chunks(chunks, filename, user_id)
+            create_chunk_relationships(filename, user_id)
+        with timed_stage("embed"):
+            create_vector_index_and_embeddings(filename, user_id)
+    finally:
+        # Answers over this file are stale, even if ingestion stopped half-way
+        file_changed(user_id, filename)
     return len(chunks)
 
 
-def create_chunk_relationships(filename=None):
-    query = """
-        MATCH (f:File{filename:$filename})-[:HAS_CHUNK]->(c1:Chunk),
-              (f)-[:HAS_CHUNK]->(c2:Chunk)
-        WHERE c1.chunk_index = c2.chunk_index - 1
-        MERGE (c1)-[:NEXT]->(c2)
-    """ if filename else """
-        MATCH (f:File)-[:HAS_CHUNK]->(c1:Chunk),
-              (f)-[:HAS_CHUNK]->(c2:Chunk)
-        WHERE c1.chunk_index = c2.chunk_index - 1
-        MERGE (c1)-[:NEXT]->(c2)
-    """
-    safe_kg_query(query, params={'filename': filename} if filename else {})
-
-
 def create_graph_and_store_chunks(chunks, filename, user_id, extraction_metadata):
     try:
         # Create constraints (suppress notifications)
@@ -339,6 +454,8 @@ def create_graph_and_store_chunks(chunks, filename, user_id, extraction_metadata
                 'chunk_index': i+j,
                 'section': f'{user_id}_{filename}_section_{(i+j) // 10}',
                 'length': len(chunk),
+                'label': _chunk_label(chunk, i+j),
+                'preview': _chunk_preview(chunk),
                 'user_id': user_id,
                 'filename': filename
             } for j, chunk in enumerate(batch)]
@@ -353,6 +470,8 @@ def create_graph_and_store_chunks(chunks, filename, user_id, extraction_metadata
                     c.chunk_index = param.chunk_index,
                     c.section = param.section,
                     c.length = param.length,
+                    c.label = param.label,
+                    c.preview = param.preview,
                     c.user_id = param.user_id,
                     c.filename = param.filename
                 MERGE (f)-[:HAS_CHUNK]->(c)
@@ -360,163 +479,182 @@ def create_graph_and_store_chunks(chunks, filename, user_id, extraction_metadata
                 params={'params': params, 'user_id': user_id, 'filename': filename}
             )
 
-        print(f"Stored {len(chunks)} chunks for {filename}")
+        logger.info(f"Stored {len(chunks)} chunks for {filename}")
     except Exception as e:
-        print(f"Error creating graph and storing chunks: {e}")
+        logger.error(f"Error creating graph and storing chunks: {e}")
         raise  # Re-raise the exception to be caught in the calling function
 
-def create_chunk_relationships(filename=None):
-    """Create NEXT relationships between sequential chunks in the same file"""
+LINK_FILE_CHUNKS_QUERY = register_query("ingest.link_file_chunks", """
+    MATCH (f:File {user_id: $user_id, filename: $filename})-[:HAS_CHUNK]->(c1:Chunk)
+    MATCH (f)-[:HAS_CHUNK]->(c2:Chunk)
+    WHERE c1.chunk_index = c2.chunk_index - 1
+    MERGE (c1)-[:NEXT]->(c2)
+""")
+
+LINK_ALL_CHUNKS_QUERY = register_query("ingest.link_all_chunks", """
+    MATCH (f:File)-[:HAS_CHUNK]->(c1:Chunk)
+    MATCH (f)-[:HAS_CHUNK]->(c2:Chunk)
+    WHERE c1.chunk_index = c2.chunk_index - 1
+    MERGE (c1)-[:NEXT]->(c2)
+""")
+
+def create_chunk_relationships(filename=None, user_id=None):
+    """Create NEXT relationships between sequential chunks in the same file (one user's file if filename is given)"""
     try:
         if not neo4j_available():
-            print("Neo4j not available. Skipping chunk relationships.")
+            logger.warning("Neo4j not available. Skipping chunk relationships.")
             return
             
         if filename:
-            query = """
-            MATCH (f:File {filename: $filename})-[:HAS_CHUNK]->(c1:Chunk)
-            MATCH (f)-[:HAS_CHUNK]->(c2:Chunk)
-            WHERE c1.chunk_index = c2.chunk_index - 1
-            MERGE (c1)-[:NEXT]->(c2)
-            """
-            safe_kg_query(query, params={'filename': filename})
+            safe_kg_query(LINK_FILE_CHUNKS_QUERY, params={'filename': filename, 'user_id': user_id})
         else:
-            query = """
-            MATCH (f:File)-[:HAS_CHUNK]->(c1:Chunk)
-            MATCH (f)-[:HAS_CHUNK]->(c2:Chunk)
-            WHERE c1.chunk_index = c2.chunk_index - 1
-            MERGE (c1)-[:NEXT]->(c2)
-            """
-            safe_kg_query(query)
+            safe_kg_query(LINK_ALL_CHUNKS_QUERY)
     except Exception as e:
-        print(f"Error creating chunk relationships: {e}")
+        logger.error(f"Error creating chunk relationships: {e}")
 
-def create_vector_index_and_embeddings(filename=None):
+def vector_index_query(index_name, embedding_property, dimensions):
+    """
+    Vector index DDL. Names and dimensions cannot be parameters in schema statements,
+    so every embedding version (utils/embedding_versions.py) gets its own text.
+    Index-side quantization needs Neo4j 5.23+
+    """
+    return f"""
+    CREATE VECTOR INDEX {index_name} IF NOT EXISTS
+    FOR (c:{VECTOR_NODE_LABEL}) ON (c.{embedding_property})
+    OPTIONS {{
+        indexConfig: {{
+            `vector.dimensions`: {dimensions},
+            `vector.similarity_function`: 'cosine'{", `vector.quantization.enabled`: true" if EMBEDDING_INDEX_QUANTIZATION else ""}
+        }}
+    }}
+"""
+
+# Index dimension follows the embedding configuration (reduced in int8 mode, see
+# utils/embedding_storage.py)
+CREATE_VECTOR_INDEX_QUERY = register_query("schema.create_vector_index", vector_index_query(
+    VECTOR_INDEX_NAME, VECTOR_EMBEDDING_PROPERTY, index_dimensions()))
+
+# Embedding property names come from the embedding version ($embedding_property etc.)
+FILE_CHUNKS_MISSING_EMBEDDINGS_QUERY = register_query("embed.file_chunks_missing_embeddings", """
+    MATCH (f:File {filename: $filename})-[:HAS_CHUNK]->(c:Chunk)
+    WHERE ($user_id IS NULL OR f.user_id = $user_id)
+      AND c[$embedding_property] IS NULL
+    RETURN c.id AS id, c.text AS text, f.filename AS filename
+""")
+
+ALL_CHUNKS_MISSING_EMBEDDINGS_QUERY = register_query("embed.all_chunks_missing_embeddings", """
+    MATCH (f:File)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c[$embedding_property] IS NULL
+    RETURN c.id AS id, c.text AS text, f.filename AS filename
+""")
+
+# $props holds the embedding under the version's property name
+SET_CHUNK_EMBEDDING_QUERY = register_query("embed.set_chunk_embedding", """
+    MATCH (c:Chunk {id: $id}) SET c += $props
+""")
+
+# float32 vector property (half the size of a plain float list); in int8 mode $props
+# carries the full-dimension quantized copy for rescoring
+SET_CHUNK_VECTOR_QUERY = register_query("embed.set_chunk_vector", """
+    MATCH (c:Chunk {id: $id})
+    CALL db.create.setNodeVectorProperty(c, $embedding_property, $embedding)
+    SET c += $props
+""")
+
+def store_chunk_embedding(chunk_id, vector, storage=EMBEDDING_STORAGE, version=None):
+    """Write one chunk embedding in the configured storage mode, under `version` (the default one if None)"""
+    from utils.embedding_versions import default_version
+    version = version or default_version()
+    query = SET_CHUNK_EMBEDDING_QUERY if storage == "float64" else SET_CHUNK_VECTOR_QUERY
+    return safe_kg_query(query, params={'id': chunk_id, **version.write_params(vector, storage)})
+
+def create_vector_index_and_embeddings(filename=None, user_id=None):
     try:
         # Check if OpenAI API key is available
-        from environment import OPENAI_API_KEY
-        if not OPENAI_API_KEY or OPENAI_API_KEY.strip() == "":
-            print(f"OpenAI API key not available. Skipping embeddings for {filename or 'all files'}")
+        if not embeddings_available():
+            logger.warning(f"Embedding provider '{EMBEDDING_PROVIDER}' not available. Skipping embeddings for {filename or 'all files'}")
             return
         
         # Check if Neo4j is available
         if not neo4j_available():
-            print(f"Neo4j not available. Skipping embeddings for {filename or 'all files'}")
+            logger.warning(f"Neo4j not available. Skipping embeddings for {filename or 'all files'}")
             return
             
         kg = get_neo4j_connection()
         if kg is None:
-            print(f"Cannot connect to Neo4j. Skipping embeddings for {filename or 'all files'}")
+            logger.warning(f"Cannot connect to Neo4j. Skipping embeddings for {filename or 'all files'}")
             return
 
+        # The tenant's active embedding version, read fresh so a just-switched tenant is not missed
+        from utils.embedding_versions import active_version, default_version
+        version = active_version(user_id, fresh=True) if user_id else default_version()
+
         # Create vector index
-        safe_kg_query(f"""
-        CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS
-        FOR (c:{VECTOR_NODE_LABEL}) ON (c.{VECTOR_EMBEDDING_PROPERTY})
-        OPTIONS {{
-            indexConfig: {{
-                `vector.dimensions`: 1536,
-                `vector.similarity_function`: 'cosine'
-            }}
-        }}
-        """)
+        safe_kg_query(version.create_index_query())
 
         try:
-            embeddings = OpenAIEmbeddings()
+            embeddings = version.embeddings()
             
             # Only process chunks for specific file if filename provided, otherwise all chunks
             if filename:
-                chunks = safe_kg_query("""
-                    MATCH (f:File {filename: $filename})-[:HAS_CHUNK]->(c:Chunk)
-                    WHERE c.textEmbedding IS NULL 
-                    RETURN c.id AS id, c.text AS text, f.filename AS filename
-                """, params={'filename': filename})
+                chunks = safe_kg_query(FILE_CHUNKS_MISSING_EMBEDDINGS_QUERY,
+                                       params={'filename': filename, 'user_id': user_id, **version.params()})
             else:
-                chunks = safe_kg_query("""
-                    MATCH (f:File)-[:HAS_CHUNK]->(c:Chunk)
-                    WHERE c.textEmbedding IS NULL 
-                    RETURN c.id AS id, c.text AS text, f.filename AS filename
-                """)
+                chunks = safe_kg_query(ALL_CHUNKS_MISSING_EMBEDDINGS_QUERY, params=version.params())
 
             if chunks:
-                for chunk in tqdm(chunks, desc="Generating embedding", unit="chunk"):
-                    embedding_vector = embeddings.embed_query(chunk['text'])
-                    safe_kg_query(
-                        "MATCH (c:Chunk {id: $id}) SET c.textEmbedding = $embedding",
-                        params={'id': chunk['id'], 'embedding': embedding_vector}
-                    )
+                embed_and_store_chunks(embeddings, chunks, desc="Generating embedding", version=version)
 
                 if filename:
-                    print(f"Vector index and embeddings created/updated successfully for {filename}")
+                    logger.info(f"Vector index and embeddings created/updated successfully for {filename}")
                 else:
-                    print("Vector index and embeddings created/updated successfully for all files")
+                    logger.info("Vector index and embeddings created/updated successfully for all files")
             else:
-                print(f"No chunks found to create embeddings for {filename or 'all files'}")
+                logger.info(f"No chunks found to create embeddings for {filename or 'all files'}")
                 
         except Exception as e:
-            print(f"Error creating embeddings (continuing without embeddings): {e}")
+            logger.error(f"Error creating embeddings (continuing without embeddings): {e}")
             # Don't exit, continue without embeddings
             
     except Exception as e:
-        print(f"Error creating vector index and embeddings: {e}")
+        logger.error(f"Error creating vector index and embeddings: {e}")
         # Don't exit, continue without embeddings
 
-def regenerate_all_embeddings(force=False):
-    """Force regenerate embeddings for all chunks, useful for fixing search bias"""
+def embed_and_store_chunks(embeddings, chunks, desc="Generating embedding", version=None):
+    """Embed chunks (dicts with id and text) in batches of EMBEDDING_BATCH_SIZE and store the vectors"""
+    start = time.perf_counter()
+    with track_progress("embed", len(chunks), desc=desc, unit="chunk") as progress:
+        for offset in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+            batch = chunks[offset:offset + EMBEDDING_BATCH_SIZE]
+            vectors = embeddings.embed_documents([chunk['text'] for chunk in batch])
+            for chunk, vector in zip(batch, vectors):
+                store_chunk_embedding(chunk['id'], vector, version=version)
+            progress.update(len(batch))
+    elapsed = time.perf_counter() - start
+    logger.info(f"Embedded {len(chunks)} chunks with '{EMBEDDING_PROVIDER}' in {elapsed:.2f}s "
+                f"({len(chunks) / (elapsed or 1e-9):.1f} chunks/s)")
+
+def regenerate_all_embeddings(force=False, user_id=None):
+    """
+    Embed chunks that have no embedding (every chunk with force) as one paged, checkpointed
+    job in the calling thread; the API runs the same job in the background (utils/embedding_jobs.py)
+    Args:
+        force: Re-embed chunks that already have an embedding
+        user_id: Only this tenant's chunks, or None for all
+    Returns:
+        bool: True if any chunk was embedded
+    """
+    from utils.embedding_jobs import embedding_jobs
     try:
-        # Check if OpenAI API key is available
-        from environment import OPENAI_API_KEY
-        if not OPENAI_API_KEY or OPENAI_API_KEY.strip() == "":
-            print("OpenAI API key not available. Cannot regenerate embeddings")
-            return False
-        
-        # Check if Neo4j is available
-        if not neo4j_available():
-            print("Neo4j not available. Cannot regenerate embeddings")
-            return False
-            
-        kg = get_neo4j_connection()
-        if kg is None:
-            print("Cannot connect to Neo4j. Cannot regenerate embeddings")
-            return False
-
-        try:
-            embeddings = OpenAIEmbeddings()
-            
-            # Get all chunks (regardless of whether they have embeddings)
-            if force:
-                chunks = safe_kg_query("""
-                    MATCH (f:File)-[:HAS_CHUNK]->(c:Chunk)
-                    RETURN c.id AS id, c.text AS text, f.filename AS filename
-                """)
-            else:
-                chunks = safe_kg_query("""
-                    MATCH (f:File)-[:HAS_CHUNK]->(c:Chunk)
-                    WHERE c.textEmbedding IS NULL 
-                    RETURN c.id AS id, c.text AS text, f.filename AS filename
-                """)
-
-            if chunks:
-                print(f"Generating embeddings for {len(chunks)} chunks...")
-                for chunk in tqdm(chunks, desc="Regenerating embeddings", unit="chunk"):
-                    embedding_vector = embeddings.embed_query(chunk['text'])
-                    safe_kg_query(
-                        "MATCH (c:Chunk {id: $id}) SET c.textEmbedding = $embedding",
-                        params={'id': chunk['id'], 'embedding': embedding_vector}
-                    )
-
-                print(f"Successfully regenerated embeddings for {len(chunks)} chunks")
-                return True
-            else:
-                print("No chunks found to regenerate embeddings")
-                return False
-                
-        except Exception as e:
-            print(f"Error regenerating embeddings: {e}")
-            return False
-            
+        job = embedding_jobs.create(owner_id=user_id or "system", user_id=user_id, force=force)
+        job = embedding_jobs.run(job)
+        if job['done']:
+            logger.info(f"Successfully regenerated embeddings for {job['done']} chunks")
+            return True
+        logger.info("No chunks found to regenerate embeddings")
+        return False
     except Exception as e:
-        print(f"Error in regenerate_all_embeddings: {e}")
+        logger.error(f"Error in regenerate_all_embeddings: {e}")
         return False
 
 def visualize_graph_structure():
@@ -545,47 +683,65 @@ def visualize_graph_structure():
         print(f"  OCR Success/Failed: {file_info['ocr_success']}/{file_info['ocr_failed']}")
         print(f"  Chunks: {file_info['actual_chunks']}/{file_info['total_chunks']}")
 
-def setup_qa_system(user_id, filenames=None):
-    try:
-        # Build filename filter for the query
-        if filenames:
-            filenames_str = ', '.join([f'"{f}"' for f in filenames])
-            file_filter = f"AND f.filename IN [{filenames_str}]"
-        else:
-            file_filter = ""
-
-        # Enhanced retrieval query with user-based access control (direct substitution)
-        retrieval_query = f"""
-        MATCH (u:User {{user_id: '{user_id}'}})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
-        WHERE c.textEmbedding IS NOT NULL {file_filter}
-        RETURN c.text AS text,
-               score,
-               {{
-                   source: f.source,
-                   filename: f.filename,
-                   user_id: f.user_id,
-                   chunk_index: c.chunk_index,
-                   section: c.section,
-                   id: c.id,
-                   original_url: f.original_url
-               }} AS metadata
-        ORDER BY score DESC
-        LIMIT 10
-        """
-
-        # Create vector store with user-scoped retrieval query
-        vector_store = Neo4jVector.from_existing_index(
-            embedding=OpenAIEmbeddings(),
+# Appended by Neo4jVector to its index query (which yields `node` and `score`).
+# Tenant and file filter are parameters, so every user shares one cached plan.
+QA_FALLBACK_RETRIEVAL_QUERY = register_query("qa.fallback_retrieval", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(node)
+    WHERE $filenames IS NULL OR f.filename IN $filenames
+    WITH node, f, score
+    ORDER BY score DESC
+    LIMIT $top_k
+    RETURN node.text AS text,
+           score,
+           {
+               source: f.source,
+               filename: f.filename,
+               user_id: f.user_id,
+               chunk_index: node.chunk_index,
+               section: node.section,
+               id: node.id,
+               original_url: f.original_url
+           } AS metadata
+""")
+
+# Shared vector store for the fallback QA path (lazy-loaded)
+_vector_store = None
+
+def get_vector_store():
+    """Vector store over the chunk index, reusing the shared Neo4j driver"""
+    global _vector_store
+    if _vector_store is None:
+        from langchain_community.vectorstores import Neo4jVector
+        _vector_store = Neo4jVector.from_existing_index(
+            embedding=get_embeddings(),
+            graph=get_neo4j_connection(),
             url=NEO4J_URI,
             username=NEO4J_USER,
             password=NEO4J_PASS,
             index_name=VECTOR_INDEX_NAME,
             text_node_property=VECTOR_SOURCE_PROPERTY,
-            retrieval_query=retrieval_query)
+            retrieval_query=QA_FALLBACK_RETRIEVAL_QUERY)
+    return _vector_store
+
+def setup_qa_system(user_id, filenames=None):
+    """
+    Get the QA system for a user and file selection. Vector store, retriever and
+    clients are built once per retrieval configuration and reused until they expire.
+    """
+    key = (user_id, tuple(sorted(filenames)) if filenames else None)
+    return _qa_system_registry.get_or_create(key, lambda: _build_qa_system(user_id, filenames))
 
-        retriever = vector_store.as_retriever(search_kwargs={
-            "k": 10,
-            "score_threshold": 0.3
+def _build_qa_system(user_id, filenames=None):
+    try:
+        # User-scoped retriever: access control is passed as query parameters
+        retriever = get_vector_store().as_retriever(search_kwargs={
+            "k": QA_FETCH_K,
+            "score_threshold": 0.3,
+            "params": {
+                "user_id": user_id,
+                "filenames": sorted(filenames) if filenames else None,
+                "top_k": QA_TOP_K,
+            }
         })
 
         # Use Claude for better QA responses
@@ -598,16 +754,18 @@ class ClaudeQASystem:
     """
     Custom QA system using Claude for better, more detailed responses
     """
-    def __init__(self, retriever):
+    def __init__(self, retriever, client=None):
         self.retriever = retriever
-        self.client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+        # Only an injected client is kept; the shared one is looked up per call, since cached
+        # QA systems outlive shutdown_llm_clients()
+        self.client = client
         
-    def invoke(self, question_dict):
+    async def ainvoke(self, question_dict):
         try:
             question = question_dict.get("question", "")
             
-            # Retrieve relevant documents
-            docs = self.retriever.get_relevant_documents(question)
+            # Retrieve relevant documents (blocking Neo4j call, kept off the event loop)
+            docs = await asyncio.to_thread(self.retriever.get_relevant_documents, question)
             
             if not docs:
                 return {
@@ -615,13 +773,22 @@ class ClaudeQASystem:
                     "source_documents": []
                 }
             
-            # Prepare context from retrieved documents
+            # Prepare context from retrieved documents, merging adjacent chunks of a file
+            packed = pack_context([{
+                'text': doc.page_content,
+                'filename': getattr(doc, 'metadata', {}).get('filename', 'Unknown'),
+                'section': getattr(doc, 'metadata', {}).get('section', 'Unknown'),
+                'chunk_index': getattr(doc, 'metadata', {}).get('chunk_index'),
+                'chunk_id': getattr(doc, 'metadata', {}).get('id'),
+                'doc': doc,
+            } for doc in docs])
+            docs = [chunk['doc'] for chunk in packed['chunks']]
+
             context_parts = []
-            for doc in docs:
-                context_parts.append(f"Document: {doc.page_content}")
-                if hasattr(doc, 'metadata'):
-                    context_parts.append(f"Source: {doc.metadata.get('filename', 'Unknown')}")
-                    context_parts.append(f"Section: {doc.metadata.get('section', 'Unknown')}")
+            for passage in packed['passages']:
+                context_parts.append(f"Document: {passage['text']}")
+                context_parts.append(f"Source: {passage['filename']}")
+                context_parts.append(f"Section: {passage['section']}")
                 context_parts.append("---")
             
             context = "\n".join(context_parts)
@@ -641,7 +808,7 @@ Context:
 Please provide a short answer based on the context provided."""
             
             # Call Claude API
-            message = self.client.messages.create(
+            message = await (self.client or get_llm_client()).messages.create(
                 model="claude-3-5-sonnet-20241022",  # Use the latest Claude model
                 max_tokens=2000,
                 system=system_prompt,
@@ -654,7 +821,8 @@ Please provide a short answer based on the context provided."""
             
             return {
                 "answer": answer,
-                "source_documents": docs
+                "source_documents": docs,
+                "context": packed['stats']
             }
             
         except Exception as e:
@@ -699,10 +867,10 @@ def process_and_store_pdf(pdf_path, user_id):
         create_graph_and_store_chunks(chunks, filename, user_id, extraction_metadata)
 
         # Create sequential chunk relationships
-        create_chunk_relationships(filename)
+        create_chunk_relationships(filename, user_id)
 
         # Create embeddings
-        create_vector_index_and_embeddings(filename)
+        create_vector_index_and_embeddings(filename, user_id)
 
         logger.info(f"Successfully processed {user_id}/{filename}")
         return filename
@@ -711,103 +879,110 @@ def process_and_store_pdf(pdf_path, user_id):
         logger.error(f"Error processing PDF {filename}: {str(e)}")
         raise
 
-def ask_question_with_diversity(user_id: str, question: str, filenames: list = None):
+QA_SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on the provided context. 
+        Always provide detailed, accurate answers using the information from the context. 
+        If the context doesn't contain enough information to answer the question completely, 
+        say so and provide what information you can. 
+        Be conversational but informative."""
+
+QA_MODEL = "claude-3-5-sonnet-20241022"
+NO_ANSWER = "I don't have enough information to answer that question."
+
+async def _tenant_version(user_id):
+    """The embedding version the user's questions are embedded and searched with"""
+    from utils.embedding_versions import active_version
+    return await asyncio.to_thread(active_version, user_id)
+
+async def _retrieve_for_question(user_id, question, filenames=None, question_embedding=None, version=None):
+    """Embed the question (unless already embedded) and fetch diversified chunks for it"""
+    from utils.retrieval import retrieve_chunks
+    version = version or await _tenant_version(user_id)
+
+    # Get embedding for the question, with the model of the tenant's embedding version
+    if question_embedding is None:
+        with timed_stage("question_embedding"):
+            question_embedding = await version.embeddings().aembed_query(question)
+
+    # Vector (or hybrid lexical + vector) top-k over the user's files, diversified across files
+    with timed_stage("retrieval"):
+        return await asyncio.to_thread(retrieve_chunks, user_id, question_embedding, filenames,
+                                       question=question, version=version)
+
+@timed_stage("assembly")
+def _build_answer_request(question, chunks):
+    """
+    Build the Claude request and the source list for retrieved chunks. Adjacent chunks
+    of a file are merged without their repeated overlap and the context is capped at
+    QA_CONTEXT_TOKEN_BUDGET; chunks that did not fit are left out of the sources.
+    Returns:
+        tuple: (messages.create keyword arguments, sources, context packing stats)
+    """
+    packed = pack_context(chunks)
+    context_parts = []
+    sources = []
+
+    for passage in packed['passages']:
+        context_parts.append(f"Document: {passage['text']}")
+        context_parts.append(f"Source: {passage['filename']}")
+        context_parts.append("---")
+
+    for chunk in packed['chunks']:
+        # File metadata (original_url, filename, section) comes back with the retrieval query
+        sources.append({
+            'filename': chunk['filename'],
+            'user_id': chunk['user_id'],
+            'section': chunk['section'],
+            'chunk_index': chunk['chunk_index'],
+            'chunk_id': chunk.get('chunk_id', chunk.get('id', 'Unknown')),
+            'score': chunk.get('score'),
+            'original_url': chunk.get('original_url')
+        })
+
+    context = "\n".join(context_parts)
+
+    user_prompt = f"""Based on the following context, please answer this question very precisely and briefly: {question}
+
+Context:
+{context}
+
+Please provide a short answer based on the context provided."""
+
+    request = {
+        "model": QA_MODEL,
+        "max_tokens": 2000,
+        "system": QA_SYSTEM_PROMPT,
+        "messages": [
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+    return request, sources, packed['stats']
+
+async def ask_question_with_diversity(user_id: str, question: str, filenames: list = None, question_embedding=None,
+                                      llm_slots=None, version=None):
     """
     Ask a question with diverse source retrieval to avoid bias
+    Args:
+        llm_slots: Optional asyncio.Semaphore held only around the Claude call
+        version: The user's embedding version, if already looked up
     """
     try:
-        from langchain_openai import OpenAIEmbeddings
-        
-        # Get embedding for the question
-        embeddings = OpenAIEmbeddings()
-        question_embedding = embeddings.embed_query(question)
-        
-        # Build filename filter for the query
-        if filenames:
-            filenames_str = ', '.join([f'"{f}"' for f in filenames])
-            file_filter = f"AND f.filename IN [{filenames_str}]"
-        else:
-            file_filter = ""
-
-        # Use a simpler approach to ensure diversity by selecting from each file
-        chunks = safe_kg_query(f"""
-            MATCH (u:User {{user_id: '{user_id}'}})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
-            WHERE c.textEmbedding IS NOT NULL {file_filter}
-            WITH f, COLLECT(c) AS all_chunks
-            UNWIND all_chunks[0..5] AS c  // Get up to 5 chunks per file for diversity
-            RETURN c.text AS text,
-                   0.5 AS score,
-                   c.id AS chunk_id, 
-                   c.filename AS filename,
-                   c.section AS section,
-                   c.chunk_index AS chunk_index,
-                   c.user_id AS user_id
-            ORDER BY c.filename, c.chunk_index
-            LIMIT 10
-        """)
-        
+        chunks = await _retrieve_for_question(user_id, question, filenames, question_embedding, version)
+
         if not chunks:
             return {
                 "status": "success",
-                "answer": "I don't have enough information to answer that question.",
+                "answer": NO_ANSWER,
                 "question": question,
                 "sources": [],
                 "total_sources": 0
             }
-        
-        # Create context for Claude
-        context_parts = []
-        sources = []
-        
-        for chunk in chunks:
-            context_parts.append(f"Document: {chunk['text']}")
-            context_parts.append(f"Source: {chunk['filename']}")
-            context_parts.append("---")
-            
-            # Get original URL for this file
-            file_info = safe_kg_query("""
-                MATCH (f:File {filename: $filename, user_id: $user_id})
-                RETURN f.original_url AS original_url
-            """, params={'filename': chunk['filename'], 'user_id': user_id})
-            
-            original_url = file_info[0]['original_url'] if file_info else None
-            
-            sources.append({
-                'filename': chunk['filename'],
-                'user_id': chunk['user_id'],
-                'section': chunk['section'],
-                'chunk_index': chunk['chunk_index'],
-                'chunk_id': chunk.get('chunk_id', chunk.get('id', 'Unknown')),
-                'original_url': original_url
-            })
-        
-        context = "\n".join(context_parts)
-        
-        # Use Claude for the answer
-        system_prompt = """You are a helpful AI assistant that answers questions based on the provided context. 
-        Always provide detailed, accurate answers using the information from the context. 
-        If the context doesn't contain enough information to answer the question completely, 
-        say so and provide what information you can. 
-        Be conversational but informative."""
-        
-        user_prompt = f"""Based on the following context, please answer this question very precisely and briefly: {question}
 
-Context:
-{context}
+        request, sources, context_stats = _build_answer_request(question, chunks)
 
-Please provide a short answer based on the context provided."""
-        
         # Call Claude API
-        import anthropic
-        client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2000,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+        async with llm_slots or nullcontext():
+            with timed_stage("llm"):
+                message = await get_llm_client().messages.create(**request)
         
         answer = message.content[0].text
         
@@ -816,7 +991,8 @@ Please provide a short answer based on the context provided."""
             "answer": answer,
             "question": question,
             "sources": sources,
-            "total_sources": len(sources)
+            "total_sources": len(sources),
+            "context": context_stats
         }
         
     except Exception as e:
@@ -826,9 +1002,92 @@ Please provide a short answer based on the context provided."""
             "error": str(e)
         }
 
-def ask_question(user_id: str, question: str, filenames: list = None):
+async def stream_question(user_id: str, question: str, filenames: list = None):
+    """
+    Answer a question incrementally. Yields (event, data) pairs in this order:
+    'sources' once retrieval is done, 'token' for every piece of answer text as
+    Claude produces it, 'traversal' with the graph path, then 'done'.
+    Failures are reported as a single 'error' event.
+    """
+    try:
+        scope = answer_cache.scope(user_id, filenames)
+        version = await _tenant_version(user_id)
+        cached, question_embedding = await _cached_answer(scope, question, version)
+        if cached is not None:
+            yield "sources", {"question": question, "sources": cached["sources"], "total_sources": cached["total_sources"]}
+            yield "token", {"text": cached["answer"]}
+            if cached["sources"]:
+                yield "traversal", await asyncio.to_thread(get_graph_traversal_path, cached["sources"], user_id)
+            yield "done", {"status": "success", "answer": cached["answer"], "cache": cached["cache"]}
+            return
+
+        chunks = await _retrieve_for_question(user_id, question, filenames, question_embedding, version)
+        if not chunks:
+            yield "sources", {"question": question, "sources": [], "total_sources": 0}
+            yield "token", {"text": NO_ANSWER}
+            yield "done", {"status": "success", "answer": NO_ANSWER}
+            return
+
+        request, sources, context_stats = _build_answer_request(question, chunks)
+        yield "sources", {"question": question, "sources": sources, "total_sources": len(sources)}
+
+        answer_parts = []
+        with timed_stage("llm"):
+            async with get_llm_client().messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    answer_parts.append(text)
+                    yield "token", {"text": text}
+
+        answer = "".join(answer_parts)
+        if QA_CACHE_ENABLED:
+            answer_cache.set(scope, question, {
+                "status": "success",
+                "answer": answer,
+                "question": question,
+                "sources": sources,
+                "total_sources": len(sources),
+                "context": context_stats
+            }, question_embedding)
+
+        traversal_path = await asyncio.to_thread(get_graph_traversal_path, sources, user_id)
+        yield "traversal", traversal_path
+        yield "done", {"status": "success", "answer": answer, "context": context_stats}
+
+    except Exception as e:
+        yield "error", {
+            "status": "error",
+            "message": f"Error processing question: {str(e)}",
+            "error": str(e)
+        }
+
+async def _cached_answer(scope, question, version=None):
     """
-    Ask a question against user's knowledge graph
+    Look a question up in the answer cache: exact match first, then near-duplicates
+    by embedding similarity (embedded with the tenant's embedding `version`).
+    Returns:
+        tuple: (cached result or None, question embedding if one was computed)
+    """
+    if not QA_CACHE_ENABLED:
+        return None, None
+
+    cached = answer_cache.get(scope, question)
+    if cached is not None or QA_CACHE_SIMILARITY > 1:
+        return cached, None
+
+    try:
+        with timed_stage("question_embedding"):
+            embeddings = version.embeddings() if version is not None else get_embeddings()
+            question_embedding = await embeddings.aembed_query(question)
+    except Exception as e:
+        logger.error(f"Could not embed question for answer cache lookup: {e}")
+        return None, None
+    return answer_cache.get_similar(scope, question, question_embedding), question_embedding
+
+async def ask_question(user_id: str, question: str, filenames: list = None):
+    """
+    Ask a question against user's knowledge graph. Answers are cached per user, file
+    selection and file versions, so repeated (or near-identical) questions over
+    unchanged files skip retrieval and the LLM call.
     Args:
         user_id: User identifier 
         question: Question to ask
@@ -836,9 +1095,80 @@ def ask_question(user_id: str, question: str, filenames: list = None):
     Returns:
         dict: QA response with answer and source information
     """
+    # Scope is captured first: an answer computed while a file changes is stored under the old version
+    scope = answer_cache.scope(user_id, filenames)
+    version = await _tenant_version(user_id)
+    cached, question_embedding = await _cached_answer(scope, question, version)
+    if cached is not None:
+        return cached
+
+    result = await _answer_question(user_id, question, filenames, question_embedding, version=version)
+    if QA_CACHE_ENABLED and result.get("status") == "success":
+        answer_cache.set(scope, question, result, question_embedding)
+    return result
+
+async def ask_questions_batch(user_id: str, questions: list, filenames: list = None, concurrency: int = None):
+    """
+    Answer many questions over the same files. Cache hits are answered first; the
+    rest are embedded in one batched call, retrieved concurrently and answered with
+    at most `concurrency` Claude calls in flight.
+    Args:
+        user_id: User identifier
+        questions: Questions to ask
+        filenames: List of specific filenames to search in (optional)
+        concurrency: Claude calls in flight (QA_BATCH_LLM_CONCURRENCY by default)
+    Yields:
+        tuple: (position in questions, QA response) in completion order
+    """
+    scope = answer_cache.scope(user_id, filenames)
+    pending = []
+    for index, question in enumerate(questions):
+        cached = answer_cache.get(scope, question) if QA_CACHE_ENABLED else None
+        if cached is not None:
+            yield index, cached
+        else:
+            pending.append(index)
+    if not pending:
+        return
+
+    # One embeddings request for the whole batch; on failure each question embeds its own
+    version = await _tenant_version(user_id)
+    try:
+        with timed_stage("question_embedding"):
+            embeddings = await version.embeddings().aembed_documents([questions[i] for i in pending])
+    except Exception as e:
+        logger.error(f"Batch embedding of {len(pending)} questions failed: {e}")
+        embeddings = [None] * len(pending)
+
+    llm_slots = asyncio.Semaphore(concurrency or QA_BATCH_LLM_CONCURRENCY)
+
+    async def answer(index, question_embedding):
+        question = questions[index]
+        if QA_CACHE_ENABLED and question_embedding is not None and QA_CACHE_SIMILARITY <= 1:
+            cached = answer_cache.get_similar(scope, question, question_embedding)
+            if cached is not None:
+                return index, cached
+        result = await _answer_question(user_id, question, filenames, question_embedding, llm_slots, version)
+        if QA_CACHE_ENABLED and result.get("status") == "success":
+            answer_cache.set(scope, question, result, question_embedding)
+        return index, result
+
+    tasks = [asyncio.ensure_future(answer(index, embedding)) for index, embedding in zip(pending, embeddings)]
+    JOB_QUEUE_DEPTH.inc(len(tasks), queue="qa_batch")
+    for task in tasks:
+        task.add_done_callback(lambda _: JOB_QUEUE_DEPTH.dec(queue="qa_batch"))
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: stop the remaining retrievals and Claude calls
+        for task in tasks:
+            task.cancel()
+
+async def _answer_question(user_id, question, filenames=None, question_embedding=None, llm_slots=None, version=None):
     try:
         # Try diverse search first
-        return ask_question_with_diversity(user_id, question, filenames)
+        return await ask_question_with_diversity(user_id, question, filenames, question_embedding, llm_slots, version)
         
     except Exception as e:
         # Fallback to original method
@@ -847,7 +1177,7 @@ def ask_question(user_id: str, question: str, filenames: list = None):
             qa_chain = setup_qa_system(user_id, filenames)
             
             # Get response from QA chain
-            response = qa_chain.invoke({"question": question})
+            response = await qa_chain.ainvoke({"question": question})
             
             # Extract source information
             sources = []
@@ -867,7 +1197,8 @@ def ask_question(user_id: str, question: str, filenames: list = None):
                 "answer": response.get('answer', ''),
                 "question": question,
                 "sources": sources,
-                "total_sources": len(sources)
+                "total_sources": len(sources),
+                "context": response.get('context')
             }
             
         except Exception as e2:
@@ -877,140 +1208,121 @@ def ask_question(user_id: str, question: str, filenames: list = None):
                 "error": str(e2)
             }
 
+TRAVERSAL_QUERY = register_query("qa.traversal", """
+    UNWIND $chunk_ids AS chunk_id
+    MATCH (c:Chunk {id: chunk_id, user_id: $user_id})
+    OPTIONAL MATCH (f:File {user_id: $user_id})-[:HAS_CHUNK]->(c)
+    OPTIONAL MATCH (c)-[:NEXT]->(next:Chunk)
+    WITH c, f, collect(next {
+        .id, .label, .preview,
+        index: next.chunk_index,
+        text: CASE WHEN next.label IS NULL OR next.preview IS NULL THEN next.text END
+    })[0..2] AS next_chunks
+    RETURN c.id AS id,
+           c.chunk_index AS index,
+           c.section AS section,
+           c.label AS label,
+           c.preview AS preview,
+           CASE WHEN c.label IS NULL OR c.preview IS NULL THEN c.text END AS text,
+           f.filename AS filename,
+           f.total_chunks AS total_chunks,
+           next_chunks
+""")
+
+@timed_stage("traversal")
 def get_graph_traversal_path(sources, user_id):
     """
-    Generate graph traversal path showing nodes and edges that supported the answer
+    Generate graph traversal path showing nodes and edges that supported the answer.
+    All source chunks, their NEXT neighbours and File nodes are fetched in one query.
     """
     try:
         # Check if Neo4j is available
         kg_conn = get_neo4j_connection()
         if kg_conn is None:
             return {"error": "Neo4j connection not available"}
-            
-        traversal_data = {
-            "nodes": [],
-            "edges": [],
-            "metadata": {
-                "total_nodes": 0,
-                "total_edges": 0,
-                "files_involved": set()
-            }
-        }
-        
+
+        source_by_chunk = {}
         for source in sources:
-            filename = source.get('filename', 'Unknown')
-            chunk_id = source.get('chunk_id', 'Unknown')
-            section = source.get('section', 'Unknown')
-            
-            # Get the chunk node
-            chunk_result = safe_kg_query("""
-                MATCH (c:Chunk {id: $chunk_id, user_id: $user_id})
-                RETURN c.id as id, c.text as text, c.chunk_index as index, c.section as section
-            """, params={'chunk_id': chunk_id, 'user_id': user_id})
-            
-            if chunk_result:
-                chunk_data = chunk_result[0]
-                # Create a meaningful label from the text content
-                text_content = chunk_data["text"].strip()
-                if text_content:
-                    # Get last 50 characters and clean them up
-                    label_text = text_content[-50:].strip()
-                    # Remove any incomplete words at the beginning
-                    if len(label_text) == 50 and ' ' in label_text:
-                        label_text = label_text[label_text.find(' ') + 1:]
-                    # Truncate if still too long
-                    if len(label_text) > 40:
-                        label_text = label_text[-40:] + "..."
-                else:
-                    label_text = f"Chunk {chunk_data['index']}"
-                
-                traversal_data["nodes"].append({
-                    "id": chunk_data["id"],
-                    "label": label_text,
-                    "type": "chunk",
-                    "text": chunk_data["text"][:100] + "..." if len(chunk_data["text"]) > 100 else chunk_data["text"],
-                    "section": chunk_data["section"],
-                    "filename": filename
-                })
-                traversal_data["metadata"]["files_involved"].add(filename)
-            
-            # Get related chunks (NEXT relationships)
-            related_result = safe_kg_query("""
-                MATCH (c:Chunk {id: $chunk_id, user_id: $user_id})-[:NEXT]->(next:Chunk)
-                RETURN next.id as id, next.text as text, next.chunk_index as index
-                LIMIT 2
-            """, params={'chunk_id': chunk_id, 'user_id': user_id})
-            
-            for related in related_result:
-                # Create a meaningful label from the related chunk text
-                related_text_content = related["text"].strip()
-                if related_text_content:
-                    # Get last 50 characters and clean them up
-                    related_label_text = related_text_content[-50:].strip()
-                    # Remove any incomplete words at the beginning
-                    if len(related_label_text) == 50 and ' ' in related_label_text:
-                        related_label_text = related_label_text[related_label_text.find(' ') + 1:]
-                    # Truncate if still too long
-                    if len(related_label_text) > 40:
-                        related_label_text = related_label_text[-40:] + "..."
-                else:
-                    related_label_text = f"Chunk {related['index']}"
-                
-                traversal_data["nodes"].append({
-                    "id": related["id"],
-                    "label": related_label_text,
-                    "type": "related_chunk",
-                    "text": related["text"][:100] + "..." if len(related["text"]) > 100 else related["text"],
-                    "section": section,
-                    "filename": filename
+            source_by_chunk.setdefault(source.get('chunk_id', 'Unknown'), source)
+
+        rows = safe_kg_query(TRAVERSAL_QUERY, params={
+            'chunk_ids': list(source_by_chunk), 'user_id': user_id
+        })
+
+        nodes = {}
+        edges = []
+        files_involved = {}
+
+        # Source chunks first so a chunk that is also someone's NEXT keeps type "chunk"
+        for row in rows:
+            source = source_by_chunk.get(row["id"], {})
+            filename = source.get('filename', row.get("filename") or 'Unknown')
+            nodes[row["id"]] = {
+                "id": row["id"],
+                "label": row.get("label") or _chunk_label(row.get("text"), row["index"]),
+                "type": "chunk",
+                "text": row.get("preview") if row.get("preview") is not None else _chunk_preview(row.get("text")),
+                "section": row["section"],
+                "filename": filename
+            }
+            files_involved.setdefault(filename, row.get("total_chunks"))
+            if row.get("filename"):
+                edges.append({
+                    "source": f"file_{row['filename']}",
+                    "target": row["id"],
+                    "type": "HAS_CHUNK",
+                    "label": "contains"
                 })
-                
-                traversal_data["edges"].append({
-                    "source": chunk_id,
+
+        for row in rows:
+            source = source_by_chunk.get(row["id"], {})
+            filename = source.get('filename', row.get("filename") or 'Unknown')
+            for related in row.get("next_chunks") or []:
+                if related["id"] not in nodes:
+                    nodes[related["id"]] = {
+                        "id": related["id"],
+                        "label": related.get("label") or _chunk_label(related.get("text"), related["index"]),
+                        "type": "related_chunk",
+                        "text": related.get("preview") if related.get("preview") is not None else _chunk_preview(related.get("text")),
+                        "section": source.get('section', row["section"]),
+                        "filename": filename
+                    }
+                edges.append({
+                    "source": row["id"],
                     "target": related["id"],
                     "type": "NEXT",
                     "label": "follows"
                 })
-        
-        # Get file nodes
-        for filename in traversal_data["metadata"]["files_involved"]:
-            file_result = safe_kg_query("""
-                MATCH (f:File {filename: $filename, user_id: $user_id})
-                RETURN f.filename as filename, f.total_chunks as total_chunks
-            """, params={'filename': filename, 'user_id': user_id})
-            
-            if file_result:
-                file_data = file_result[0]
-                traversal_data["nodes"].append({
+
+        # File nodes (HAS_CHUNK edges were added alongside their chunks)
+        for row in rows:
+            filename = row.get("filename")
+            if filename and f"file_{filename}" not in nodes:
+                nodes[f"file_{filename}"] = {
                     "id": f"file_{filename}",
                     "label": filename,
                     "type": "file",
-                    "total_chunks": file_data["total_chunks"],
+                    "total_chunks": row.get("total_chunks"),
                     "filename": filename
-                })
-                
-                # Connect chunks to file
-                for node in traversal_data["nodes"]:
-                    if node.get("filename") == filename and node.get("type") == "chunk":
-                        traversal_data["edges"].append({
-                            "source": f"file_{filename}",
-                            "target": node["id"],
-                            "type": "HAS_CHUNK",
-                            "label": "contains"
-                        })
-        
-        traversal_data["metadata"]["total_nodes"] = len(traversal_data["nodes"])
-        traversal_data["metadata"]["total_edges"] = len(traversal_data["edges"])
-        traversal_data["metadata"]["files_involved"] = list(traversal_data["metadata"]["files_involved"])
-        
+                }
+
+        traversal_data = {
+            "nodes": list(nodes.values()),
+            "edges": edges,
+            "metadata": {
+                "total_nodes": len(nodes),
+                "total_edges": len(edges),
+                "files_involved": list(files_involved)
+            }
+        }
         return traversal_data
-        
+
     except Exception as e:
         print(f"Error generating traversal path: {e}")
         return {"error": str(e)}
 
-def create_url_knowledge_graph(user_id, filename, file_contents, original_url, content_type=None):
-    """Create knowledge graph for URL content with original URL stored as metadata"""
+def create_url_knowledge_graph(user_id, filename, file_contents, original_url, content_type=None, content_hash=None):
+    """Create knowledge graph for URL content with original URL (and the text's hash, from crawls) stored as metadata"""
     try:
         create_or_get_user(user_id)
         
@@ -1022,7 +1334,8 @@ def create_url_knowledge_graph(user_id, filename, file_contents, original_url, c
             'successful_ocr': 1,
             'failed_ocr': 0,
             'extraction_errors': 0,
-            'original_url': original_url  # Store the original URL
+            'original_url': original_url,  # Store the original URL
+            'content_hash': content_hash
         }
         
         chunks_count = _process_text_file(text, filename, user_id, metadata)
@@ -1063,7 +1376,8 @@ def create_file_knowledge_graph(user_id, filename, file_contents, content_type=N
 
         # Image
         elif filename.lower().endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')) or (content_type and 'image' in content_type.lower()):
-            text = extract_text_from_image(file_contents)
+            with timed_stage("extract"):
+                text = extract_text_from_image(file_contents)
             metadata = {
                 'pages_processed': 1,
                 'images_processed': 1,
@@ -1077,7 +1391,8 @@ def create_file_knowledge_graph(user_id, filename, file_contents, content_type=N
         # Text or other files → decode as UTF-8
         else:
             try:
-                text = file_contents.decode('utf-8')
+                with timed_stage("extract"):
+                    text = file_contents.decode('utf-8')
                 metadata = {
                     'pages_processed': 1,
                     'images_processed': 0,
@@ -0,0 +1,73 @@
+import httpx
+import anthropic
+from environment import (
+    CLAUDE_API_KEY, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES, LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_HTTP2,
+)
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Process-wide clients, created in the app lifespan (or lazily outside of it)
+_http_client = None
+_llm_client = None
+
+
+def _build_http_client():
+    http2 = LLM_HTTP2 and HTTP2_AVAILABLE
+    if LLM_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("LLM_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_http_client():
+    """Shared keep-alive HTTP client for outbound LLM calls"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+def get_llm_client():
+    """
+    Shared async Anthropic client on top of the pooled HTTP client.
+    Retries (connection errors, 429, 5xx) are handled by the SDK.
+    """
+    global _llm_client
+    if _llm_client is None or _http_client is None or _http_client.is_closed:
+        _llm_client = anthropic.AsyncAnthropic(
+            api_key=CLAUDE_API_KEY,
+            http_client=get_http_client(),
+            max_retries=LLM_MAX_RETRIES,
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+    return _llm_client
+
+
+async def startup_llm_clients():
+    """Open the connection pool when the app starts"""
+    client = get_llm_client()
+    logger.info(f"LLM client pool ready (http2={LLM_HTTP2 and HTTP2_AVAILABLE})")
+    return client
+
+
+async def shutdown_llm_clients():
+    """Close pooled connections when the app shuts down"""
+    global _http_client, _llm_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    _llm_client = None
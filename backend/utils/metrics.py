@@ -0,0 +1,257 @@
+import bisect
+import math
+import threading
+from pymongo import monitoring
+
+# In-process metrics served at /metrics in the Prometheus text format (0.0.4).
+# Recording is a tuple key lookup under a short lock, cheap enough to leave on in
+# the hot path. Values that only make sense at scrape time (connection pools) come
+# from collectors registered with register_collector().
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+_metrics = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        try:
+            if len(labels) == len(self.label_names):
+                return tuple(str(labels[name]) for name in self.label_names)
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+
+    def _labels(self, key):
+        return list(zip(self.label_names, key))
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """(suffix, labels, value) tuples in exposition order"""
+        with self._lock:
+            return [("", self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """{'count', 'sum'} for one label set"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return {'count': state[2], 'sum': state[1]} if state else {'count': 0, 'sum': 0.0}
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", labels + [("le", _format_value(float(bound)))], cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+def _register(cls, name, documentation, labels, **kwargs):
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, documentation, labels, **kwargs)
+        elif type(metric) is not cls or metric.label_names != tuple(labels):
+            raise ValueError(f"Metric '{name}' is already registered with a different type or labels")
+        return metric
+
+
+def counter(name, documentation, labels=()):
+    return _register(Counter, name, documentation, labels)
+
+
+def gauge(name, documentation, labels=()):
+    return _register(Gauge, name, documentation, labels)
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, documentation, labels, buckets=buckets)
+
+
+def register_collector(collector):
+    """
+    Register collector() -> [(name, type, help, [(labels dict, value), ...]), ...],
+    called on every scrape for values read from elsewhere (e.g. driver pools)
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for suffix, labels, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    for collector in list(_collectors):
+        try:
+            families = collector()
+        except Exception:
+            continue
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    """Clear recorded values (definitions and collectors stay registered)"""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        metric.reset()
+
+
+# --- Metrics recorded across the app ---
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "Request latency by route template (streaming responses: until headers)",
+    ("method", "route", "status"))
+STAGE_SECONDS = histogram(
+    "pipeline_stage_duration_seconds", "Ingestion and QA stage durations (extract, ocr, split, embed, retrieval, llm, ...)",
+    ("stage",))
+STAGE_ERRORS = counter("pipeline_stage_errors_total", "Stages that raised", ("stage",))
+EMBEDDING_BATCH_TEXTS = histogram(
+    "embedding_batch_texts", "Texts per embedding request", ("provider",), buckets=SIZE_BUCKETS)
+EMBEDDING_REQUEST_SECONDS = histogram("embedding_request_duration_seconds", "Embedding request latency", ("provider",))
+NEO4J_QUERY_SECONDS = histogram("neo4j_query_duration_seconds", "Cypher latency by statement name", ("statement",))
+NEO4J_QUERY_ERRORS = counter("neo4j_query_errors_total", "Cypher statements that failed", ("statement",))
+JOB_QUEUE_DEPTH = gauge("job_queue_depth", "Queued or running units of background work", ("queue",))
+MONGO_POOL_CONNECTIONS = gauge("mongo_pool_connections", "MongoDB pool connections (open, in_use)", ("address", "state"))
+MONGO_POOL_CHECKOUT_FAILURES = counter(
+    "mongo_pool_checkout_failures_total", "Failed MongoDB connection check-outs", ("address", "reason"))
+
+
+def _address(address):
+    host, port = address
+    return f"{host}:{port}"
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Pass as event_listeners=[mongo_pool_listener] to Mongo clients to export pool utilization"""
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event.address), state="open")
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event.address), state="open")
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.inc(address=_address(event.address), state="in_use")
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.dec(address=_address(event.address), state="in_use")
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc(address=_address(event.address), reason=event.reason)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+mongo_pool_listener = MongoPoolMetrics()
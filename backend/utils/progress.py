@@ -0,0 +1,226 @@
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from utils.cache import TTLCache
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+# Structured ingestion progress. Pipeline code reports through track_progress(); inside
+# track_ingestion() that publishes events (stage, done, total, rate, ETA) to the bus,
+# which clients follow over SSE. Outside an ingestion it draws a tqdm bar only when a
+# command-line entry point called enable_cli_progress(), and does nothing in the server.
+
+# Minimum seconds between two events of the same stage (first and last always go out)
+MIN_EVENT_INTERVAL = 0.25
+SUBSCRIBER_QUEUE_SIZE = 256
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+_current_ingestion = ContextVar('current_ingestion', default=None)
+_cli_progress = False
+
+
+def enable_cli_progress(enabled=True):
+    """Draw tqdm bars for progress outside tracked ingestions (scripts and CLI tools)"""
+    global _cli_progress
+    _cli_progress = enabled
+
+
+def new_ingestion_id():
+    return uuid.uuid4().hex
+
+
+def _offer(queue, event):
+    """Enqueue without blocking; a subscriber that falls behind loses its oldest events"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class ProgressBus:
+    """
+    Fan-out of progress events to asyncio subscribers. publish() may be called from
+    any thread; the latest event of each ingestion is kept so late subscribers start
+    from the current state.
+    """
+    def __init__(self, history_size=1000, history_ttl=3600):
+        self._subscribers = []  # (user_id, ingestion_id or None, loop, queue)
+        self._latest = TTLCache(maxsize=history_size, ttl=history_ttl)
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        self._latest.set(event['ingestion_id'], event)
+        with self._lock:
+            targets = [(loop, queue) for user_id, ingestion_id, loop, queue in self._subscribers
+                       if user_id == event['user_id'] and ingestion_id in (None, event['ingestion_id'])]
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                pass  # subscriber's loop has closed
+
+    def latest(self, user_id, ingestion_id):
+        """Last event of one of the user's ingestions, or None"""
+        event = self._latest.get(ingestion_id)
+        return event if event is not None and event['user_id'] == user_id else None
+
+    async def subscribe(self, user_id, ingestion_id=None, heartbeat=None):
+        """
+        Follow one ingestion (until it finishes) or all of a user's ingestions
+        Args:
+            user_id: Owner of the ingestions
+            ingestion_id: Ingestion to follow, or None for all of the user's
+            heartbeat: Yield None after this many idle seconds (keeps proxies from closing the stream)
+        Yields:
+            dict: progress events
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (user_id, ingestion_id, asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        try:
+            if ingestion_id is not None:
+                current = self.latest(user_id, ingestion_id)
+                if current is not None:
+                    yield current
+                    if current['status'] in TERMINAL_STATUSES:
+                        return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if ingestion_id is not None and event['status'] in TERMINAL_STATUSES:
+                    return
+        finally:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+
+
+progress_bus = ProgressBus()
+
+
+class IngestionTracker:
+    """Progress of one ingestion; publishes events to the bus"""
+    def __init__(self, ingestion_id, user_id, filename, bus=None):
+        self.ingestion_id = ingestion_id
+        self.user_id = user_id
+        self.filename = filename
+        self.bus = bus or progress_bus
+        self.started = time.perf_counter()
+        self.status = "running"
+        self.error = None
+
+    def emit(self, stage, done=None, total=None, rate=None, eta_seconds=None):
+        self.bus.publish({
+            'ingestion_id': self.ingestion_id,
+            'user_id': self.user_id,
+            'filename': self.filename,
+            'stage': stage,
+            'done': done,
+            'total': total,
+            'rate': round(rate, 2) if rate is not None else None,
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'elapsed_seconds': round(time.perf_counter() - self.started, 2),
+            'status': self.status,
+            'error': self.error,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        })
+
+    def fail(self, error):
+        self.status = "failed"
+        self.error = str(error)
+        self.emit("failed")
+
+    def cancel(self):
+        self.status = "cancelled"
+        self.emit("cancelled")
+
+    def finish(self):
+        if self.status == "running":
+            self.status = "done"
+            self.emit("done")
+
+
+@contextmanager
+def track_ingestion(ingestion_id, user_id, filename, bus=None):
+    """Publish progress of the work done in this context as one ingestion; ends with a done, failed or cancelled event"""
+    tracker = IngestionTracker(ingestion_id, user_id, filename, bus)
+    token = _current_ingestion.set(tracker)
+    tracker.emit("queued")
+    try:
+        yield tracker
+    except Exception as e:
+        tracker.fail(e)
+        raise
+    else:
+        tracker.finish()
+    finally:
+        _current_ingestion.reset(token)
+
+
+class _StageProgress:
+    """track_progress() inside an ingestion: throttled events for one stage"""
+    def __init__(self, tracker, stage, total):
+        self.tracker = tracker
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_event = 0.0
+        tracker.emit(stage, 0, total)
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if self.done < (self.total or 0) and now - self.last_event < MIN_EVENT_INTERVAL:
+            return
+        self.last_event = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else None
+        eta = (self.total - self.done) / rate if rate and self.total is not None else None
+        self.tracker.emit(self.stage, self.done, self.total, rate, eta)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class _NoProgress(_StageProgress):
+    def __init__(self):
+        pass
+
+    def update(self, n=1):
+        pass
+
+
+def track_progress(stage, total, desc=None, unit="it"):
+    """
+    Progress reporter for a loop over `total` items, used as a context manager with update(n)
+    Returns an event publisher inside track_ingestion(), a tqdm bar in CLI mode, otherwise a no-op
+    """
+    tracker = _current_ingestion.get()
+    if tracker is not None:
+        return _StageProgress(tracker, stage, total)
+    if _cli_progress:
+        from tqdm import tqdm
+        return tqdm(total=total, desc=desc or stage, unit=unit)
+    return _NoProgress()
+
+
+def report_stage(stage):
+    """Announce a stage without item counts (e.g. split) to the current ingestion, if any"""
+    tracker = _current_ingestion.get()
+    if tracker is not None:
+        tracker.emit(stage)
@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict
+from utils.metrics import NEO4J_QUERY_SECONDS, NEO4J_QUERY_ERRORS
+
+# Named Cypher statements. Every statement is a fixed template whose variable parts
+# are passed as $parameters, so Neo4j plans it once and reuses the cached plan.
+_statements = {}
+_names_by_text = {}
+
+_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+_stats_lock = threading.Lock()
+
+UNREGISTERED = 'unregistered'
+
+
+def register_query(name, query):
+    """Register a Cypher template under a statement name and return it unchanged"""
+    existing = _statements.get(name)
+    if existing is not None and existing != query:
+        raise ValueError(f"Statement '{name}' is already registered with different text")
+    _statements[name] = query
+    _names_by_text[query] = name
+    return query
+
+
+def statement_name(query):
+    """Name of a registered statement, or 'unregistered' for ad-hoc Cypher"""
+    return _names_by_text.get(query, UNREGISTERED)
+
+
+def get_query(name):
+    return _statements[name]
+
+
+def registered_queries():
+    return dict(_statements)
+
+
+def record_query(name, duration_ms, error=False):
+    """Record one execution of a statement"""
+    with _stats_lock:
+        stats = _stats[name]
+        stats['calls'] += 1
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+        if error:
+            stats['errors'] += 1
+    NEO4J_QUERY_SECONDS.observe(duration_ms / 1000, statement=name)
+    if error:
+        NEO4J_QUERY_ERRORS.inc(statement=name)
+
+
+def query_stats():
+    """Per-statement call counts and timings since start-up (or the last reset)"""
+    with _stats_lock:
+        return {
+            name: {**stats, 'avg_ms': stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0}
+            for name, stats in _stats.items()
+        }
+
+
+def reset_query_stats():
+    with _stats_lock:
+        _stats.clear()
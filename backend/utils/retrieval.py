@@ -0,0 +1,438 @@
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from environment import (
+    QA_TOP_K, QA_FETCH_K, QA_CANDIDATE_K, QA_DIVERSITY, QA_MMR_LAMBDA, QA_PER_FILE_QUOTA,
+    QA_RETRIEVAL_MODE, QA_RRF_K, QA_NEXT_WINDOW, QA_SEED_K,
+)
+from utils.knowledge_graph import safe_kg_query, FULLTEXT_INDEX_NAME
+from utils.embedding_versions import active_version
+from utils.query_registry import register_query
+from utils.vector_cache import cached_vector_search
+from utils.embedding_storage import index_vector, rescore
+
+logger = logging.getLogger(__name__)
+
+# Vector top-k restricted to the user's (optionally selected) files. The index is
+# global, so it is queried with $fetch_k >> k and filtered afterwards; only the best
+# $candidate_k survivors ship their embeddings back for diversification.
+# Index and embedding property names are those of the user's embedding version
+# (utils/embedding_versions.py).
+VECTOR_RETRIEVAL_QUERY = register_query("qa.vector_retrieval", """
+    CALL db.index.vector.queryNodes($index_name, $fetch_k, $embedding) YIELD node AS c, score
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c)
+    WHERE $filenames IS NULL OR f.filename IN $filenames
+    WITH c, f, score
+    ORDER BY score DESC
+    LIMIT $candidate_k
+    RETURN c.text AS text,
+           score,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url,
+           c[$embedding_property] AS embedding,
+           c[$int8_property] AS embedding_q,
+           c[$scale_property] AS embedding_scale
+""")
+
+# Exact scan over the user's chunks, used when the oversampled index query comes back
+# with fewer than k hits (small tenants in a large shared index).
+EXACT_RETRIEVAL_QUERY = register_query("qa.exact_retrieval", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c[$embedding_property] IS NOT NULL
+      AND ($filenames IS NULL OR f.filename IN $filenames)
+    WITH c, f, vector.similarity.cosine(c[$embedding_property], $embedding) AS score
+    ORDER BY score DESC
+    LIMIT $candidate_k
+    RETURN c.text AS text,
+           score,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url,
+           c[$embedding_property] AS embedding,
+           c[$int8_property] AS embedding_q,
+           c[$scale_property] AS embedding_scale
+""")
+
+# Full-text (BM25) top-k over the user's chunks
+FULLTEXT_RETRIEVAL_QUERY = register_query("qa.fulltext_retrieval", """
+    CALL db.index.fulltext.queryNodes($fulltext_index, $text_query, {limit: $fetch_k}) YIELD node AS c, score
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c)
+    WHERE $filenames IS NULL OR f.filename IN $filenames
+    WITH c, f, score
+    ORDER BY score DESC
+    LIMIT $candidate_k
+    RETURN c.text AS text,
+           score,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url,
+           c[$embedding_property] AS embedding,
+           c[$int8_property] AS embedding_q,
+           c[$scale_property] AS embedding_scale
+""")
+
+# Both ranked lists in one round trip, merged with reciprocal rank fusion:
+# score = sum over lists of 1 / ($rrf_k + rank). vector_count tells the caller
+# whether the oversampled vector side found enough of the user's chunks.
+HYBRID_RETRIEVAL_QUERY = register_query("qa.hybrid_retrieval", """
+    CALL {
+        CALL db.index.vector.queryNodes($index_name, $fetch_k, $embedding) YIELD node, score
+        MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(node)
+        WHERE $filenames IS NULL OR f.filename IN $filenames
+        WITH node, score
+        ORDER BY score DESC
+        LIMIT $candidate_k
+        RETURN collect(node) AS vector_hits
+    }
+    CALL {
+        CALL db.index.fulltext.queryNodes($fulltext_index, $text_query, {limit: $fetch_k}) YIELD node, score
+        MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(node)
+        WHERE $filenames IS NULL OR f.filename IN $filenames
+        WITH node, score
+        ORDER BY score DESC
+        LIMIT $candidate_k
+        RETURN collect(node) AS text_hits
+    }
+    WITH size(vector_hits) AS vector_count,
+         [i IN range(0, size(vector_hits) - 1) | {node: vector_hits[i], rank: i}] +
+         [i IN range(0, size(text_hits) - 1) | {node: text_hits[i], rank: i}] AS ranked
+    UNWIND ranked AS hit
+    WITH vector_count, hit.node AS c, sum(1.0 / ($rrf_k + hit.rank + 1)) AS score
+    ORDER BY score DESC
+    LIMIT $candidate_k
+    MATCH (f:File {user_id: $user_id})-[:HAS_CHUNK]->(c)
+    RETURN c.text AS text,
+           score,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url,
+           c[$embedding_property] AS embedding,
+           c[$int8_property] AS embedding_q,
+           c[$scale_property] AS embedding_scale,
+           vector_count
+""")
+
+# Neighbours of the seed chunks along NEXT, up to $window steps before and after.
+# Variable-length bounds cannot be parameters, so the pattern allows MAX_WINDOW steps
+# and the path length is filtered instead.
+MAX_WINDOW = 5
+NEIGHBOR_WINDOW_QUERY = register_query("qa.neighbor_window", f"""
+    UNWIND $seed_ids AS seed_id
+    MATCH (s:Chunk {{id: seed_id, user_id: $user_id}})
+    CALL {{
+        WITH s
+        MATCH p = (c:Chunk)-[:NEXT*1..{MAX_WINDOW}]->(s)
+        WHERE length(p) <= $window AND all(n IN nodes(p) WHERE n.user_id = $user_id)
+        RETURN c, -length(p) AS offset
+        UNION
+        WITH s
+        MATCH p = (s)-[:NEXT*1..{MAX_WINDOW}]->(c:Chunk)
+        WHERE length(p) <= $window AND all(n IN nodes(p) WHERE n.user_id = $user_id)
+        RETURN c, length(p) AS offset
+    }}
+    MATCH (f:File {{user_id: $user_id}})-[:HAS_CHUNK]->(c)
+    RETURN seed_id,
+           offset,
+           c.text AS text,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url
+""")
+
+# Previous behaviour: the first five chunks of every file with a constant score.
+# Kept only so benchmarks can compare against it.
+PREFIX_RETRIEVAL_QUERY = register_query("qa.prefix_retrieval", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c[$embedding_property] IS NOT NULL
+      AND ($filenames IS NULL OR f.filename IN $filenames)
+    WITH f, COLLECT(c) AS all_chunks
+    UNWIND all_chunks[0..5] AS c
+    RETURN c.text AS text,
+           0.5 AS score,
+           c.id AS chunk_id,
+           c.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url
+    ORDER BY c.filename, c.chunk_index
+    LIMIT $k
+""")
+
+
+def _normalize_rows(matrix):
+    import numpy as np
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def diversify(query_embedding, candidate_embeddings, filenames, k, strategy="mmr",
+              lambda_mult=0.5, per_file_quota=None, relevance=None):
+    """
+    Pick k candidate positions balancing relevance against redundancy
+    Args:
+        query_embedding: Question embedding (d,)
+        candidate_embeddings: Candidate embeddings (n, d), best-first
+        filenames: Source filename of each candidate, used for the per-file quota
+        k: Number of candidates to keep
+        strategy: "mmr" (maximal marginal relevance), "quota" (top-k with a
+                  per-file cap) or "none" (plain top-k)
+        lambda_mult: MMR trade-off, 1.0 = pure relevance, 0.0 = pure diversity
+        per_file_quota: Maximum picks per file (None = unlimited)
+        relevance: Relevance of each candidate in [0, 1] (default: cosine
+                   similarity to the question), e.g. fused hybrid scores
+    Returns:
+        list: Selected candidate positions in pick order
+    """
+    import numpy as np
+    n = len(candidate_embeddings)
+    if n == 0 or k <= 0:
+        return []
+
+    cands = _normalize_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+    if relevance is None:
+        relevance = cands @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+
+    _, file_ids = np.unique(np.asarray(filenames, dtype=object).astype(str), return_inverse=True)
+    file_counts = np.zeros(file_ids.max() + 1, dtype=np.int32)
+    quota = per_file_quota if per_file_quota and per_file_quota > 0 else n
+
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    if strategy == "mmr":
+        # Running max similarity of each candidate to anything already picked
+        max_sim = np.full(n, -np.inf, dtype=np.float32)
+        for _ in range(min(k, n)):
+            if selected:
+                mmr = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+            else:
+                mmr = relevance.copy()
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            if not np.isfinite(mmr[best]):
+                break
+            selected.append(best)
+            available[best] = False
+            file_counts[file_ids[best]] += 1
+            if file_counts[file_ids[best]] >= quota:
+                available &= file_ids != file_ids[best]
+            np.maximum(max_sim, cands @ cands[best], out=max_sim)
+    else:
+        order = np.argsort(-relevance, kind="stable")
+        for idx in order:
+            if len(selected) >= k:
+                break
+            if strategy == "quota" and file_counts[file_ids[idx]] >= quota:
+                continue
+            selected.append(int(idx))
+            file_counts[file_ids[idx]] += 1
+
+    return selected
+
+
+# Identifier-like terms: words plus inner . - / : # (part numbers, error codes, versions)
+_TERM = re.compile(r"[\w][\w.\-/:#]*")
+
+
+def lucene_query(question, max_terms=32):
+    """
+    Turn a free-text question into a full-text query. Terms are OR-ed; identifiers
+    such as "E-1043" or "ABC/12.5" become quoted phrases so they match literally
+    and their punctuation is never parsed as query syntax.
+    Returns None if the question has no searchable terms.
+    """
+    terms = []
+    for term in _TERM.findall(question or ""):
+        term = term.rstrip(".:/")
+        if len(term) < 2 or term.lower() in terms:
+            continue
+        terms.append(term.lower())
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' if re.search(r"\W", term) else term for term in terms[:max_terms])
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k=60):
+    """
+    Merge ranked candidate lists: score = sum of 1 / (rrf_k + rank) over the lists a
+    chunk appears in. The first row seen for a chunk is kept.
+    """
+    scores, rows = {}, {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked):
+            chunk_id = row['chunk_id']
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            rows.setdefault(chunk_id, row)
+    order = sorted(scores, key=lambda chunk_id: -scores[chunk_id])
+    return [{**rows[chunk_id], 'score': scores[chunk_id]} for chunk_id in order]
+
+
+def _vector_candidates(params, k, user_id):
+    candidates = safe_kg_query(VECTOR_RETRIEVAL_QUERY, params=params)
+    if len(candidates) < k:
+        logger.info(f"Vector index returned {len(candidates)} hits for user {user_id}, using exact scan")
+        candidates = safe_kg_query(EXACT_RETRIEVAL_QUERY, params=params)
+    return candidates
+
+
+def _hybrid_candidates(params, k, user_id):
+    candidates = safe_kg_query(HYBRID_RETRIEVAL_QUERY, params=params)
+    vector_count = candidates[0]['vector_count'] if candidates else 0
+    if vector_count >= k:
+        return [{key: value for key, value in c.items() if key != 'vector_count'} for c in candidates]
+
+    # Small tenant in a large shared index: exact vector scan and full-text side by side, fused here
+    logger.info(f"Vector index returned {vector_count} hits for user {user_id}, using exact scan")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        exact = pool.submit(safe_kg_query, EXACT_RETRIEVAL_QUERY, params)
+        lexical = pool.submit(safe_kg_query, FULLTEXT_RETRIEVAL_QUERY, params)
+        ranked_lists = [exact.result(), lexical.result()]
+    return reciprocal_rank_fusion(ranked_lists, params['rrf_k'])[:params['candidate_k']]
+
+
+def expand_windows(user_id, seeds, window):
+    """
+    Add the chunks up to `window` NEXT steps before and after each seed, fetched in
+    one query. Seeds keep their order and come first; neighbours follow nearest
+    first and carry their seed's score, so the context packer merges each window
+    into one contiguous passage and a tight token budget trims window edges first.
+    """
+    window = min(window, MAX_WINDOW)
+    if window <= 0 or not seeds:
+        return seeds
+
+    rows = safe_kg_query(NEIGHBOR_WINDOW_QUERY, params={
+        'user_id': user_id,
+        'seed_ids': [seed['chunk_id'] for seed in seeds],
+        'window': window,
+    })
+    neighbours = defaultdict(list)
+    for row in rows:
+        neighbours[row['seed_id']].append(row)
+
+    expanded = list(seeds)
+    seen = {seed['chunk_id'] for seed in seeds}
+    for distance in range(1, window + 1):
+        for seed in seeds:
+            for row in sorted(neighbours[seed['chunk_id']], key=lambda row: row['offset']):
+                if abs(row['offset']) != distance or row['chunk_id'] in seen:
+                    continue
+                seen.add(row['chunk_id'])
+                chunk = {key: value for key, value in row.items() if key not in ('seed_id', 'offset')}
+                expanded.append({**chunk, 'score': seed.get('score'), 'expanded_from': seed['chunk_id']})
+    return expanded
+
+
+def retrieve_chunks(user_id, question_embedding, filenames=None, k=None, fetch_k=None,
+                    candidate_k=None, strategy=None, lambda_mult=None, per_file_quota=None,
+                    question=None, mode=None, window=None, seed_k=None, version=None):
+    """
+    Retrieve the k most relevant, diversified chunks for a question
+    Args:
+        user_id: User identifier
+        question_embedding: Embedding of the question
+        filenames: List of specific filenames to search in (optional)
+        k: Number of chunks to return
+        fetch_k: Number of nearest neighbours requested from the vector index
+        candidate_k: Number of user-visible candidates considered for diversification
+        strategy: Diversification strategy, see diversify()
+        question: Question text, needed for the lexical side of hybrid retrieval
+        mode: "hybrid" (full-text + vector, rank-fused) or "vector"
+        window: Expand each retrieved chunk by this many NEXT neighbours on each
+                side (0 = off); only seed_k seeds are retrieved instead of k chunks
+        seed_k: Number of seed chunks to expand when window > 0
+        version: Embedding version the question was embedded with (the user's active one by default)
+    Returns:
+        list: Chunk dicts (text, score, chunk_id, filename, section, chunk_index,
+              user_id, original_url), seeds first when expanded
+    """
+    window = QA_NEXT_WINDOW if window is None else window
+    if window > 0:
+        k = seed_k or QA_SEED_K
+    k = k or QA_TOP_K
+    fetch_k = max(fetch_k or QA_FETCH_K, k)
+    candidate_k = max(candidate_k or QA_CANDIDATE_K, k)
+    strategy = strategy or QA_DIVERSITY
+    lambda_mult = QA_MMR_LAMBDA if lambda_mult is None else lambda_mult
+    per_file_quota = QA_PER_FILE_QUOTA if per_file_quota is None else per_file_quota
+    mode = mode or QA_RETRIEVAL_MODE
+    text_query = lucene_query(question) if mode == "hybrid" else None
+    version = version or active_version(user_id)
+
+    params = {
+        **version.params(),
+        'user_id': user_id,
+        'filenames': list(filenames) if filenames else None,
+        # Index space: possibly truncated, see utils/embedding_storage.py
+        'embedding': index_vector(question_embedding, version.index_dims()),
+        'fetch_k': fetch_k,
+        'candidate_k': candidate_k,
+    }
+    relevance = None
+    # Small tenants can be served from process memory instead of the Neo4j vector index
+    cached = cached_vector_search(user_id, params['embedding'], candidate_k, params['filenames'])
+    if text_query:
+        params.update({'fulltext_index': FULLTEXT_INDEX_NAME, 'text_query': text_query, 'rrf_k': QA_RRF_K})
+        if cached is not None:
+            lexical = safe_kg_query(FULLTEXT_RETRIEVAL_QUERY, params=params)
+            candidates = reciprocal_rank_fusion([cached, lexical], QA_RRF_K)[:candidate_k]
+        else:
+            candidates = _hybrid_candidates(params, k, user_id)
+        candidates = rescore(candidates, question_embedding, rerank=False)
+        if candidates:
+            # Fused ranks drive selection; scaled to [0, 1] to be comparable with similarities in MMR
+            top = candidates[0]['score'] or 1.0
+            relevance = [c['score'] / top for c in candidates]
+    else:
+        candidates = cached if cached is not None else _vector_candidates(params, k, user_id)
+        # Full-dimension rescoring of the top candidates when int8 vectors are stored
+        candidates = rescore(candidates, question_embedding)
+    if not candidates:
+        return []
+
+    dimensions = len(question_embedding)
+    picks = diversify(
+        question_embedding,
+        # Chunks found only lexically may not be embedded yet
+        [c['embedding'] if c['embedding'] is not None else [0.0] * dimensions for c in candidates],
+        [c['filename'] for c in candidates],
+        k,
+        strategy=strategy,
+        lambda_mult=lambda_mult,
+        per_file_quota=per_file_quota,
+        relevance=relevance,
+    )
+    chunks = [{key: value for key, value in candidates[i].items() if key != 'embedding'} for i in picks]
+    return expand_windows(user_id, chunks, window) if window > 0 else chunks
+
+
+def retrieve_prefix_chunks(user_id, filenames=None, k=10):
+    """Previous prefix-based retrieval, kept as a benchmark baseline"""
+    return safe_kg_query(PREFIX_RETRIEVAL_QUERY, params={
+        **active_version(user_id).params(),
+        'user_id': user_id,
+        'filenames': list(filenames) if filenames else None,
+        'k': k,
+    })
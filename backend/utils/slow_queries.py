@@ -0,0 +1,149 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from environment import (SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_BUFFER_SIZE, SLOW_QUERY_PROFILE,
+                         SLOW_QUERY_PROFILE_INTERVAL, SLOW_QUERY_PROFILE_WRITES)
+from utils.metrics import counter
+from utils.query_registry import UNREGISTERED
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+SLOW_QUERIES = counter("neo4j_slow_queries_total", "Cypher statements slower than SLOW_QUERY_THRESHOLD_MS", ("statement",))
+
+WRITE_CLAUSE = re.compile(r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP)\b", re.IGNORECASE)
+MAX_PARAM_CHARS = 80
+
+
+def summarize_params(params):
+    """Parameters safe to keep in memory and show to admins: lists reduced to their length, long strings cut"""
+    summary = {}
+    for key, value in (params or {}).items():
+        if isinstance(value, (list, tuple)):
+            summary[key] = f"<{len(value)} items>"
+        elif isinstance(value, str) and len(value) > MAX_PARAM_CHARS:
+            summary[key] = value[:MAX_PARAM_CHARS] + "..."
+        elif isinstance(value, dict):
+            summary[key] = f"<map of {len(value)}>"
+        else:
+            summary[key] = value
+    return summary
+
+
+def _plan(node):
+    return {
+        'operator': node.get('operatorType'),
+        'details': (node.get('args') or {}).get('Details'),
+        'rows': node.get('rows'),
+        'db_hits': node.get('dbHits'),
+        'children': [_plan(child) for child in node.get('children') or []],
+    }
+
+
+def _total_db_hits(plan):
+    return (plan['db_hits'] or 0) + sum(_total_db_hits(child) for child in plan['children'])
+
+
+def profile_query(graph, query, params):
+    """
+    Re-run a statement with PROFILE in a transaction that is always rolled back
+    Returns:
+        dict: db_hits (whole plan), rows (returned), plan tree and profile_ms
+    """
+    start = time.perf_counter()
+    with graph._driver.session(database=getattr(graph, '_database', None)) as session:
+        tx = session.begin_transaction()
+        try:
+            summary = tx.run("PROFILE " + query, params or {}).consume()
+        finally:
+            tx.rollback()
+    plan = _plan(summary.profile or {})
+    return {
+        'db_hits': _total_db_hits(plan),
+        'rows': plan['rows'],
+        'plan': plan,
+        'profile_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of statements slower than the threshold. Registered read statements
+    are profiled in a background thread, at most once per statement per interval, so
+    a slow request never waits for its own PROFILE.
+    """
+    def __init__(self, threshold_ms=SLOW_QUERY_THRESHOLD_MS, size=SLOW_QUERY_BUFFER_SIZE, profile=SLOW_QUERY_PROFILE,
+                 profile_interval=SLOW_QUERY_PROFILE_INTERVAL, profile_writes=SLOW_QUERY_PROFILE_WRITES):
+        self.threshold_ms = threshold_ms
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.profile_writes = profile_writes
+        self._entries = deque(maxlen=size)
+        self._last_profiled = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _should_profile(self, name, query, graph):
+        if not self.profile or name == UNREGISTERED or getattr(graph, '_driver', None) is None:
+            return False
+        if not self.profile_writes and WRITE_CLAUSE.search(query):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_profiled.get(name)
+            if last is not None and now - last < self.profile_interval:
+                return False
+            self._last_profiled[name] = now
+        return True
+
+    def capture(self, name, query, params, duration_ms, graph=None, error=None):
+        """Record a statement execution if it was slow; returns the entry or None"""
+        if duration_ms < self.threshold_ms:
+            return None
+        SLOW_QUERIES.inc(statement=name)
+        entry = {
+            'statement': name,
+            'duration_ms': round(duration_ms, 1),
+            'captured_at': datetime.now(timezone.utc).isoformat(),
+            'params': summarize_params(params),
+            'error': str(error) if error else None,
+            'profile': None,
+            'profile_error': None,
+        }
+        if name == UNREGISTERED:
+            entry['query'] = query.strip()[:500]
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning(f"Slow Cypher '{name}': {duration_ms:.0f} ms")
+
+        if self._should_profile(name, query, graph):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-profile")
+            self._executor.submit(self._profile, entry, graph, query, params)
+        return entry
+
+    def _profile(self, entry, graph, query, params):
+        try:
+            profile = profile_query(graph, query, params)
+            with self._lock:
+                entry['profile'] = profile
+        except Exception as e:
+            with self._lock:
+                entry['profile_error'] = str(e)
+
+    def entries(self, limit=None, statement=None):
+        """Captured statements, newest first"""
+        with self._lock:
+            entries = [dict(entry) for entry in reversed(self._entries)
+                       if statement is None or entry['statement'] == statement]
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_profiled.clear()
+
+
+slow_query_log = SlowQueryLog()
@@ -1,66 +1,109 @@
-import requests
+import asyncio
+import hashlib
 from bs4 import BeautifulSoup
-import re
 from urllib.parse import urlparse
 import logging
+from environment import URL_FETCH_MAX_MB
+from utils.http_fetch import fetch_url, max_bytes_for, ContentTooLarge
+from utils.knowledge_graph import safe_kg_query
+from utils.query_registry import register_query
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_url(url, max_size_mb=100):
+URL_FILE_LOOKUP_QUERY = register_query("url.file_lookup", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)
+    WHERE f.original_url = $original_url
+    RETURN f.filename as filename, f.total_chunks as total_chunks
+""")
+
+
+def url_to_filename(url):
+    """Name under which a URL's text is stored as a file"""
+    parsed_url = urlparse(url)
+    filename = f"url_{parsed_url.netloc}_{parsed_url.path.replace('/', '_')}"
+    if parsed_url.query or len(filename) > 100:
+        # Truncate if too long; the hash keeps pages that differ only in the query or the cut-off part apart
+        filename = f"{filename[:100]}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+    return filename + ".txt"
+
+
+def stored_url_filename(user_id, url):
+    """
+    Filename for a user's copy of a URL: the one it is already stored under, so that
+    re-fetching a URL named under an older scheme replaces that file instead of adding one
+    """
+    stored = safe_kg_query(URL_FILE_LOOKUP_QUERY, params={'user_id': user_id, 'original_url': url})
+    return stored[0]['filename'] if stored else url_to_filename(url)
+
+
+def html_to_text(content, encoding=None):
+    """
+    Visible text of an HTML page
+    Args:
+        content: raw HTML bytes
+        encoding: charset from the Content-Type header, if any
+    Returns:
+        tuple: (text, title)
+    """
+    soup = BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+    return visible_text(soup), soup.title.string if soup.title else 'No title'
+
+
+def visible_text(soup):
+    """Text of a parsed page without scripts and styles, whitespace collapsed (removes them from soup)"""
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Extract text
+    text = soup.get_text()
+
+    # Clean up text
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+async def extract_text_from_url(url, max_size_mb=URL_FETCH_MAX_MB):
     """
     Extract text content from a URL
     Args:
         url: URL to extract text from
-        max_size_mb: Maximum size in MB (default 100MB)
+        max_size_mb: Maximum decoded size in MB; the download stops once it is exceeded
     Returns:
         tuple: (extracted_text, metadata)
+    Raises:
+        ContentTooLarge: the page is over max_size_mb
+        ValueError: anything else
     """
     try:
         # Validate URL
         parsed_url = urlparse(url)
         if not parsed_url.scheme or not parsed_url.netloc:
             raise ValueError("Invalid URL format")
-        
-        # Fetch content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Check content size
-        content_size_mb = len(response.content) / (1024 * 1024)
-        if content_size_mb > max_size_mb:
-            raise ValueError(f"Content size ({content_size_mb:.1f}MB) exceeds limit ({max_size_mb}MB)")
-        
-        # Parse HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Extract text
-        text = soup.get_text()
-        
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Extract metadata
+
+        page = await fetch_url(url, max_bytes=max_bytes_for(max_size_mb))
+        content_size_mb = page['size'] / (1024 * 1024)
+
+        # Parsing is CPU-bound, keep it off the event loop
+        text, title = await asyncio.to_thread(html_to_text, page['content'], page['encoding'])
+
         metadata = {
             'url': url,
-            'title': soup.title.string if soup.title else 'No title',
+            'title': title,
             'domain': parsed_url.netloc,
-            'content_type': response.headers.get('content-type', 'text/html'),
+            'content_type': page['content_type'] or 'text/html',
             'content_size_mb': content_size_mb,
             'extraction_method': 'web_scraping'
         }
-        
+        if page['url'] != url:
+            metadata['final_url'] = page['url']
+
         return text, metadata
-        
+
+    except ContentTooLarge as e:
+        logger.error(f"Error extracting text from URL {url}: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Error extracting text from URL {url}: {str(e)}")
         raise ValueError(f"Failed to extract text from URL: {str(e)}")
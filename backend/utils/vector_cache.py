@@ -0,0 +1,212 @@
+import threading
+from collections import OrderedDict
+from environment import (
+    VECTOR_CACHE_ENABLED, VECTOR_CACHE_MAX_MB, VECTOR_CACHE_MAX_TENANT_CHUNKS, VECTOR_CACHE_HNSW_THRESHOLD,
+)
+from utils.knowledge_graph import safe_kg_query
+from utils.embedding_versions import active_version
+from utils.query_registry import register_query
+from utils.file_events import on_file_changed, user_version
+from logger import setup_logger
+logger = setup_logger(__name__)
+
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except ImportError:
+    hnswlib = None
+    HNSW_AVAILABLE = False
+
+# Vectors of the tenant's active embedding version (utils/embedding_versions.py)
+TENANT_CHUNK_COUNT_QUERY = register_query("vector_cache.tenant_chunk_count", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c[$embedding_property] IS NOT NULL
+    RETURN count(c) AS chunks
+""")
+
+TENANT_VECTORS_QUERY = register_query("vector_cache.tenant_vectors", """
+    MATCH (u:User {user_id: $user_id})-[:UPLOADED]->(f:File)-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c[$embedding_property] IS NOT NULL
+    RETURN c.text AS text,
+           c.id AS chunk_id,
+           f.filename AS filename,
+           c.section AS section,
+           c.chunk_index AS chunk_index,
+           c.user_id AS user_id,
+           f.original_url AS original_url,
+           c[$embedding_property] AS embedding,
+           c[$int8_property] AS embedding_q,
+           c[$scale_property] AS embedding_scale
+""")
+
+
+class TenantVectors:
+    """
+    One user's embedded chunks: a contiguous, L2-normalized float32 matrix plus the
+    chunk metadata retrieval returns. Large tenants also get an HNSW graph when
+    hnswlib is installed.
+    """
+    def __init__(self, rows, hnsw_threshold=VECTOR_CACHE_HNSW_THRESHOLD, version=None):
+        import numpy as np
+        self.version = version
+        self.rows = [{key: value for key, value in row.items() if key != 'embedding'} for row in rows]
+        matrix = np.ascontiguousarray([row['embedding'] for row in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+        self.filenames = np.array([row['filename'] for row in rows], dtype=object)
+
+        self.hnsw = None
+        if HNSW_AVAILABLE and len(rows) >= hnsw_threshold:
+            self.hnsw = hnswlib.Index(space='ip', dim=self.matrix.shape[1])
+            self.hnsw.init_index(max_elements=len(rows), ef_construction=200, M=16)
+            self.hnsw.add_items(self.matrix, np.arange(len(rows)))
+            self.hnsw.set_ef(128)
+
+        self.nbytes = self.matrix.nbytes + sum(len(row['text'] or '') for row in self.rows) + 512 * len(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query_embedding, k, filenames=None):
+        """
+        Top-k chunks by cosine similarity
+        Returns:
+            list: Chunk dicts shaped like the Neo4j retrieval rows, best first
+        """
+        import numpy as np
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        mask = np.isin(self.filenames, list(filenames)) if filenames else None
+        k = min(k, len(self.rows) if mask is None else int(mask.sum()))
+        if k <= 0:
+            return []
+
+        positions, scores = None, None
+        if self.hnsw is not None:
+            # Oversample so that file filtering still leaves k results
+            labels, distances = self.hnsw.knn_query(query, k=min(len(self.rows), k * 4))
+            labels, similarities = labels[0], 1.0 - distances[0]
+            if mask is not None:
+                keep = mask[labels]
+                labels, similarities = labels[keep], similarities[keep]
+            if len(labels) >= k:
+                positions, scores = labels[:k], similarities[:k]
+
+        if positions is None:
+            similarities = self.matrix @ query
+            if mask is not None:
+                similarities = np.where(mask, similarities, -np.inf)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            positions = top[np.argsort(-similarities[top], kind="stable")]
+            scores = similarities[positions]
+
+        # Same scale as Neo4j's cosine vector index: (1 + cos) / 2
+        return [{**self.rows[i], 'score': float((1.0 + s) / 2.0), 'embedding': self.matrix[i]}
+                for i, s in zip(positions, scores)]
+
+
+class VectorCache:
+    """
+    Per-tenant vector search in process memory. Tenants are loaded lazily on their
+    first question, evicted least-recently-used to stay within the memory budget,
+    and dropped whenever one of their files is ingested or deleted.
+    """
+    def __init__(self, max_bytes, max_tenant_chunks):
+        self.max_bytes = max_bytes
+        self.max_tenant_chunks = max_tenant_chunks
+        self._tenants = OrderedDict()
+        self._uncacheable = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'skipped': 0, 'evictions': 0, 'invalidations': 0}
+
+    def search(self, user_id, query_embedding, k, filenames=None):
+        """
+        Top-k over the user's chunks, or None if the tenant is not cacheable
+        (too many chunks, no embeddings yet, or larger than the whole budget)
+        """
+        tenant = self._get_or_load(user_id)
+        # A question embedded for another embedding version (tenant switched meanwhile)
+        if tenant is None or tenant.matrix.shape[1] != len(query_embedding):
+            return None
+        return tenant.search(query_embedding, k, filenames)
+
+    def _get_or_load(self, user_id):
+        embedding_version = active_version(user_id)
+        version = (user_version(user_id), embedding_version.id)
+        with self._lock:
+            tenant = self._tenants.get(user_id)
+            if tenant is not None and tenant.version == embedding_version.id:
+                self._tenants.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return tenant
+            if self._uncacheable.get(user_id) == version:
+                return None
+
+        tenant = self._load(user_id, embedding_version)
+        with self._lock:
+            if user_version(user_id) != version[0]:
+                # Files changed while loading; the next question loads fresh data
+                return tenant
+            if tenant is None or tenant.nbytes > self.max_bytes:
+                self._uncacheable[user_id] = version
+                self._stats['skipped'] += 1
+                return None
+            self._insert(user_id, tenant)
+            self._stats['loads'] += 1
+            return tenant
+
+    def _load(self, user_id, embedding_version):
+        params = {'user_id': user_id, **embedding_version.params()}
+        count = safe_kg_query(TENANT_CHUNK_COUNT_QUERY, params=params)
+        chunks = count[0]['chunks'] if count else 0
+        if chunks == 0 or chunks > self.max_tenant_chunks:
+            return None
+        rows = safe_kg_query(TENANT_VECTORS_QUERY, params=params)
+        if not rows:
+            return None
+        return TenantVectors(rows, version=embedding_version.id)
+
+    def _insert(self, user_id, tenant):
+        previous = self._tenants.pop(user_id, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._tenants[user_id] = tenant
+        self._bytes += tenant.nbytes
+        while self._bytes > self.max_bytes and len(self._tenants) > 1:
+            _, evicted = self._tenants.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._stats['evictions'] += 1
+
+    def invalidate(self, user_id, filename=None):
+        """Drop a tenant; it is reloaded on its next question"""
+        with self._lock:
+            self._uncacheable.pop(user_id, None)
+            tenant = self._tenants.pop(user_id, None)
+            if tenant is not None:
+                self._bytes -= tenant.nbytes
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+            self._uncacheable.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'tenants': len(self._tenants), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes, 'hnsw_available': HNSW_AVAILABLE}
+
+
+vector_cache = VectorCache(max_bytes=VECTOR_CACHE_MAX_MB * 1024 * 1024,
+                           max_tenant_chunks=VECTOR_CACHE_MAX_TENANT_CHUNKS)
+on_file_changed(vector_cache.invalidate)
+
+
+def cached_vector_search(user_id, query_embedding, k, filenames=None):
+    """Vector search from the in-process cache; None when disabled or the tenant is not cacheable"""
+    if not VECTOR_CACHE_ENABLED:
+        return None
+    return vector_cache.search(user_id, query_embedding, k, filenames)
@@ -151,29 +151,68 @@ Choose files and URLs from the sidebar to get started!`,
         });
       }
 
-      const response = await fetch(`${AI_CHAT_URL}?${params.toString()}`, {
+      // Streaming endpoint: sources arrive first, then the answer token by token
+      const response = await fetch(`${AI_CHAT_URL}/stream?${params.toString()}`, {
         method: "POST",
         headers: { 
           "Content-Type": "application/json",
         },
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Server error: ${response.status}`);
       }
 
-      const data = await response.json();
-      const botMessage = {
-        id: Date.now() + 1,
-        sender: "bot",
-        text: data.answer || data.reply || "I received your message but couldn't generate a response.",
-        timestamp: new Date(),
-        sources: data.sources || [],
-        traversalPath: data.traversal_path || null,
-        showGraph: false
+      const botId = Date.now() + 1;
+      const updateBotMessage = (update) => {
+        setMessages((prev) => prev.map(msg => msg.id === botId ? { ...msg, ...update(msg) } : msg));
       };
 
-      setMessages((prev) => [...prev, botMessage]);
+      const handleEvent = (event, data) => {
+        if (event === "sources") {
+          setMessages((prev) => [...prev, {
+            id: botId,
+            sender: "bot",
+            text: "",
+            timestamp: new Date(),
+            sources: data.sources || [],
+            traversalPath: null,
+            showGraph: false
+          }]);
+        } else if (event === "token") {
+          updateBotMessage(msg => ({ text: msg.text + data.text }));
+        } else if (event === "traversal") {
+          updateBotMessage(() => ({ traversalPath: data }));
+        } else if (event === "done") {
+          updateBotMessage(msg => ({
+            text: msg.text || data.answer || "I received your message but couldn't generate a response."
+          }));
+        } else if (event === "error") {
+          throw new Error(`Server error: 500 ${data.message || ""}`);
+        }
+      };
+
+      // Parse the server-sent events as they arrive
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const rawEvents = buffer.split("\n\n");
+        buffer = rawEvents.pop();
+        for (const rawEvent of rawEvents) {
+          let event = "message";
+          let data = "";
+          rawEvent.split("\n").forEach(line => {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          });
+          handleEvent(event, data ? JSON.parse(data) : {});
+        }
+      }
+
       setRetryCount(0);
     } catch (error) {
       console.error("Chat error:", error);